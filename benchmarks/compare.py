@@ -0,0 +1,71 @@
+'''
+Compare two result files written by benchmarks.graph_throughput.
+
+Cases are matched on topology, node kind, number of workers and payload size.
+Throughput that falls, or p99 latency or peak memory that rises, by more than
+the threshold is reported as a regression, and the exit status is 1.
+
+    python -m benchmarks.compare baseline.json results.json [--threshold 0.1]
+
+'''
+
+import argparse
+import json
+import sys
+
+CASE_KEYS = ('topology', 'node_kind', 'num_workers', 'payload_size')
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data['environment'], {tuple(r[k] for k in CASE_KEYS): r for r in data['results']}
+
+
+def metrics(result):
+    """ (name, value, whether higher is better) of each compared metric """
+    return (
+        ('msg/s', result['messages_per_second'], True),
+        ('p99 latency', result['latency']['p99'], False),
+        ('peak memory', result['peak_memory_bytes'], False),
+    )
+
+
+def relative_change(before, after):
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / float(before)
+
+
+def compare(baseline, results, threshold):
+    """ Yields (case, metric name, before, after, change, is_regression) """
+    for case in sorted(set(baseline) & set(results), key=str):
+        for (name, before, higher_is_better), (_, after, _) in zip(metrics(baseline[case]), metrics(results[case])):
+            change = relative_change(before, after)
+            if change is None:
+                continue
+            worse = -change if higher_is_better else change
+            yield case, name, before, after, change, worse > threshold
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('results')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative change counted as a regression (default 0.1)')
+    args = parser.parse_args()
+
+    baseline_environment, baseline = load(args.baseline)
+    results_environment, results = load(args.results)
+    print('baseline: %s' % baseline_environment['commit'])
+    print('results:  %s' % results_environment['commit'])
+
+    num_regressions = 0
+    for case, name, before, after, change, is_regression in compare(baseline, results, args.threshold):
+        num_regressions += is_regression
+        print('%-55s %-12s %14.6g %14.6g %+8.1f%% %s' % (
+            ' '.join(str(x) for x in case), name, before, after, change * 100, 'REGRESSION' if is_regression else ''))
+
+    print('%i regression(s)' % num_regressions)
+    sys.exit(1 if num_regressions else 0)
@@ -0,0 +1,291 @@
+'''
+Throughput, latency and memory of standard graph topologies.
+
+Each case builds a topology from one kind of node (sync, thread, pooled -
+thread nodes sharing one executor - or process),
+sends messages carrying a payload of the given size through it, and stops the
+graph, which drains every queue. The results are:
+
+ - messages_per_second : messages sent divided by the time until the graph has drained
+ - latency             : seconds from a message being sent to it reaching the sink
+ - peak_memory_bytes   : peak memory allocated by Python in this process, from a
+                         second pass under tracemalloc (child processes are not included)
+
+    python -m benchmarks.graph_throughput --output results.json
+    python -m benchmarks.compare baseline.json results.json
+
+'''
+
+import argparse
+import itertools
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from colony.graphs.auction_listener import AuctionListener
+from colony.metrics import summarise
+from colony.node import Graph
+from colony.observer import Observer
+from colony.utils.logging import get_logger
+
+TOPOLOGIES = ('chain', 'fan_out', 'fan_in', 'diamond', 'auction_listener')
+NODE_KINDS = ('sync', 'thread', 'pooled', 'process')
+
+CHAIN_LENGTH = 5
+# combine_fan_in takes one argument per source
+FAN_WIDTH = 4
+NUM_AUCTIONS = 100
+
+
+def passthrough(message):
+    return message
+
+
+def combine(a, b):
+    return newest(a, b)
+
+
+def combine_fan_in(a, b, c, d):
+    return newest(a, b, c, d)
+
+
+def newest(*messages):
+    """ Forward whichever input is the newest message """
+    return max((m for m in messages if m is not None), key=_sent_at)
+
+
+def _sent_at(message):
+    return message[0]
+
+
+class LatencyObserver(Observer):
+    """ Records how long each message took to reach it """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+
+    def notify(self, message):
+        received_at = time.perf_counter()
+        with self.lock:
+            self.latencies.append(received_at - message[0])
+
+
+def add_node(graph, kind, num_workers, target_func, **kwargs):
+    if kind == 'sync':
+        return graph.add_node(target_func=target_func, **kwargs)
+    elif kind == 'thread':
+        return graph.add_thread_node(target_func=target_func, num_threads=num_workers, **kwargs)
+    elif kind == 'pooled':
+        # The graph's shared executor has num_workers threads in total
+        return graph.add_thread_node(target_func=target_func, num_threads=None, **kwargs)
+    elif kind == 'process':
+        return graph.add_process_node(target_func=target_func, num_threads=num_workers, **kwargs)
+    else:
+        raise ValueError('node kind %s not recognised' % kind)
+
+
+def build_chain(graph, kind, num_workers):
+    node = source = add_node(graph, kind, num_workers, passthrough)
+    for _ in range(CHAIN_LENGTH - 1):
+        node = add_node(graph, kind, num_workers, passthrough, node_args=node)
+    return [source], [node]
+
+
+def build_fan_out(graph, kind, num_workers):
+    source = add_node(graph, kind, num_workers, passthrough)
+    sinks = [add_node(graph, kind, num_workers, passthrough, node_args=source) for _ in range(FAN_WIDTH)]
+    return [source], sinks
+
+
+def build_fan_in(graph, kind, num_workers):
+    sources = [add_node(graph, kind, num_workers, passthrough) for _ in range(FAN_WIDTH)]
+    sink = add_node(graph, kind, num_workers, combine_fan_in, node_args=sources)
+    return sources, [sink]
+
+
+def build_diamond(graph, kind, num_workers):
+    top = add_node(graph, kind, num_workers, passthrough)
+    left = add_node(graph, kind, num_workers, passthrough, node_args=top)
+    right = add_node(graph, kind, num_workers, passthrough, node_args=top)
+    bottom = add_node(graph, kind, num_workers, combine, node_args=(left, right))
+    return [top], [bottom]
+
+
+BUILDERS = {
+    'chain': build_chain,
+    'fan_out': build_fan_out,
+    'fan_in': build_fan_in,
+    'diamond': build_diamond,
+}
+
+
+def run_topology(topology, kind, num_workers, payload_size, num_messages, logger):
+    graph = Graph(name=topology, logger=logger, executor=num_workers if kind == 'pooled' else None)
+    sources, sinks = BUILDERS[topology](graph, kind, num_workers)
+    observer = LatencyObserver()
+    for sink in sinks:
+        sink.output_port.register_observer(observer)
+    graph.start()
+
+    payload = b'x' * payload_size
+    start = time.perf_counter()
+    for _ in range(num_messages):
+        for source in sources:
+            source.notify((time.perf_counter(), payload))
+    graph.stop()
+    elapsed = time.perf_counter() - start
+
+    return num_messages / elapsed, observer.latencies
+
+
+def run_auction_listener(num_messages, logger):
+    """ A price wave through the AuctionListener graph, using in-memory targets """
+    folder = tempfile.mkdtemp()
+    try:
+        graph = AuctionListener(_get_auctions, _get_prices, _save_prices, _on_close,
+                                batch_size=10, folder=folder, logger=logger)
+        graph.start()
+        graph.get_latest_auctions()
+
+        start = time.perf_counter()
+        for _ in range(num_messages):
+            graph.get_latest_prices()
+        graph.stop()
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(folder)
+    return num_messages / elapsed, []
+
+
+def _get_auctions():
+    return {str(i): {'status': 'OPEN'} for i in range(NUM_AUCTIONS)}
+
+
+def _get_prices(auction_ids):
+    return {auction_id: {'status': 'OPEN', 'price': 1.0} for auction_id in auction_ids}
+
+
+def _save_prices(prices):
+    return prices
+
+
+def _on_close(prices, auction_catalogue=None):
+    return prices
+
+
+def run_case(topology, kind, num_workers, payload_size, num_messages, logger):
+    if topology == 'auction_listener':
+        return run_auction_listener(num_messages, logger)
+    return run_topology(topology, kind, num_workers, payload_size, num_messages, logger)
+
+
+def measure_peak_memory(*args):
+    tracemalloc.start()
+    try:
+        run_case(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def iter_cases(topologies, kinds, worker_counts, payload_sizes):
+    for topology in topologies:
+        if topology == 'auction_listener':
+            # Uses its own mix of sync and thread nodes, and no payload
+            yield topology, 'mixed', None, None
+            continue
+        for kind, num_workers, payload_size in itertools.product(kinds, worker_counts, payload_sizes):
+            if kind == 'sync' and num_workers != worker_counts[0]:
+                # The number of workers makes no difference to sync nodes
+                continue
+            yield topology, kind, num_workers, payload_size
+
+
+def run(topologies, kinds, worker_counts, payload_sizes, num_messages, measure_memory=True):
+    logger = get_logger()
+    logger.setLevel('WARNING')
+
+    results = []
+    for topology, kind, num_workers, payload_size in iter_cases(topologies, kinds, worker_counts, payload_sizes):
+        case = (topology, kind, num_workers, payload_size, num_messages, logger)
+        messages_per_second, latencies = run_case(*case)
+        result = {
+            'topology': topology,
+            'node_kind': kind,
+            'num_workers': num_workers,
+            'payload_size': payload_size,
+            'num_messages': num_messages,
+            'messages_per_second': messages_per_second,
+            'latency': summarise(latencies),
+            'peak_memory_bytes': measure_peak_memory(*case) if measure_memory else None,
+        }
+        print_result(result)
+        results.append(result)
+    return results
+
+
+def print_result(result):
+    latency = result['latency']
+    print('%-17s %-7s workers=%-4s payload=%-8s %10.1f msg/s  p50=%s p99=%s  peak=%s' % (
+        result['topology'],
+        result['node_kind'],
+        result['num_workers'],
+        result['payload_size'],
+        result['messages_per_second'],
+        _format_seconds(latency['p50']),
+        _format_seconds(latency['p99']),
+        result['peak_memory_bytes']))
+    sys.stdout.flush()
+
+
+def _format_seconds(seconds):
+    return '-' if seconds is None else '%.3fms' % (seconds * 1000)
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(',')]
+
+
+def _str_list(text):
+    return text.split(',')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--topologies', type=_str_list, default=list(TOPOLOGIES))
+    parser.add_argument('--node-kinds', type=_str_list, default=list(NODE_KINDS))
+    parser.add_argument('--workers', type=_int_list, default=[1, 4])
+    parser.add_argument('--payload-sizes', type=_int_list, default=[100, 100000])
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('--output', help='Write the results to this file as JSON')
+    args = parser.parse_args()
+
+    results = run(args.topologies, args.node_kinds, args.workers, args.payload_sizes, args.messages,
+                  measure_memory=not args.no_memory)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
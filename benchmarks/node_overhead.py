@@ -0,0 +1,151 @@
+'''
+The fixed cost of nodes and ports, for graphs with thousands of small nodes.
+
+ - memory_per_node       : bytes allocated per sync node of a long chain, with its ports and worker
+ - memory_per_port       : bytes per ArgInputPort, KwargInputPort and OutputPort
+ - notify_ns_per_observer: nanoseconds for Observable.notify_observers, per no-op observer
+ - hop_us                : microseconds for a message to pass through one sync node of a chain
+ - envelope              : bytes and nanoseconds to create an Envelope, a tuple and an unslotted object
+
+    python -m benchmarks.node_overhead --output results.json
+
+'''
+
+import argparse
+import json
+import sys
+import time
+import timeit
+import tracemalloc
+
+from benchmarks.graph_throughput import environment
+from colony.node import ArgInputPort, Graph, KwargInputPort, OutputPort
+from colony.observer import Observable, Observer
+from colony.utils.logging import get_logger
+
+try:
+    from colony.envelope import Envelope
+except ImportError:
+    Envelope = None
+
+
+def passthrough(message):
+    return message
+
+
+class NullObserver(Observer):
+    def notify(self, data):
+        pass
+
+
+class PlainEnvelope(object):
+    """ An Envelope without __slots__, for comparison """
+
+    def __init__(self, value, timestamp, seq):
+        self.value = value
+        self.timestamp = timestamp
+        self.seq = seq
+
+
+def build_chain(num_nodes, logger):
+    graph = Graph(logger=logger)
+    node = source = graph.add_node(target_func=passthrough)
+    for _ in range(num_nodes - 1):
+        node = graph.add_node(target_func=passthrough, node_args=node)
+    return graph, source
+
+
+def allocated_per_item(factory, num_items):
+    """ Bytes allocated per item while building num_items items with factory, keeping them alive """
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        items = [factory() for _ in range(num_items)]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del items
+    return (after - before) / num_items
+
+
+def memory_per_node(num_nodes, logger):
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        graph, _ = build_chain(num_nodes, logger)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del graph
+    return (after - before) / num_nodes
+
+
+def memory_per_port(num_ports):
+    return {
+        'ArgInputPort': allocated_per_item(lambda: ArgInputPort(0), num_ports),
+        'KwargInputPort': allocated_per_item(lambda: KwargInputPort('x'), num_ports),
+        'OutputPort': allocated_per_item(OutputPort, num_ports),
+    }
+
+
+def notify_cost(num_observers, repeat):
+    observable = Observable()
+    for _ in range(num_observers):
+        observable.register_observer(NullObserver())
+    seconds = min(timeit.repeat(lambda: observable.notify_observers(1), number=10000, repeat=repeat)) / 10000
+    return seconds / num_observers * 1e9
+
+
+def hop_cost(num_nodes, num_messages, logger):
+    graph, source = build_chain(num_nodes, logger)
+    graph.start()
+    start = time.perf_counter()
+    for i in range(num_messages):
+        source.notify(i)
+    elapsed = time.perf_counter() - start
+    graph.stop()
+    return elapsed / num_messages / num_nodes * 1e6
+
+
+def envelope_cost(num_items, repeat):
+    now = time.time()
+    kinds = {'tuple': lambda: (1, now, 1), 'PlainEnvelope': lambda: PlainEnvelope(1, now, 1)}
+    if Envelope is not None:
+        kinds['Envelope'] = lambda: Envelope(1, now, 1)
+    return {
+        name: {
+            'bytes': allocated_per_item(factory, num_items),
+            'create_ns': min(timeit.repeat(factory, number=100000, repeat=repeat)) / 100000 * 1e9,
+        }
+        for name, factory in kinds.items()
+    }
+
+
+def run(num_nodes, num_messages, repeat):
+    logger = get_logger()
+    logger.setLevel('WARNING')
+    result = {
+        'memory_per_node': memory_per_node(num_nodes, logger),
+        'memory_per_port': memory_per_port(10000),
+        'notify_ns_per_observer': {n: notify_cost(n, repeat) for n in (1, 10, 100)},
+        'hop_us': hop_cost(min(num_nodes, 100), num_messages, logger),
+        'envelope': envelope_cost(10000, repeat),
+    }
+    json.dump(result, sys.stdout, indent=2)
+    print()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Write the results to this file as JSON')
+    args = parser.parse_args()
+
+    results = run(args.nodes, args.messages, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
@@ -0,0 +1,123 @@
+'''
+Compare the serializers available to PersistentVariable.
+
+For each payload, measures the serialised size and the time taken to save
+the value with PersistentVariable.set_value and reload it with refresh.
+
+    python -m benchmarks.serializers [--repeat 20] [--output results.json]
+
+'''
+
+import argparse
+import json
+import random
+import shutil
+import string
+import tempfile
+import time
+
+from colony.persistent_variable import PersistentVariable
+from colony.serializers import SERIALIZERS, get_serializer
+
+
+def auction_catalogue(num_auctions):
+    """ A dictionary shaped like AuctionListener.active_auctions_node """
+    random.seed(num_auctions)
+    return {
+        ''.join(random.choice(string.ascii_lowercase) for _ in range(12)): {
+            'status': random.choice(('OPEN', 'CLOSED')),
+            'price': round(random.random() * 100, 2),
+            'bids': random.randint(0, 50),
+        }
+        for _ in range(num_auctions)
+    }
+
+
+def price_series(num_prices):
+    random.seed(num_prices)
+    return [random.random() for _ in range(num_prices)]
+
+
+def build_payloads():
+    payloads = {
+        'catalogue_10': auction_catalogue(10),
+        'catalogue_10000': auction_catalogue(10000),
+        'prices_100000': price_series(100000),
+    }
+    try:
+        import numpy as np
+    except ImportError:
+        pass
+    else:
+        payloads['array_1000000'] = np.random.random(1000000)
+    return payloads
+
+
+def available_serializers():
+    result = {}
+    for name in SERIALIZERS:
+        try:
+            result[name] = get_serializer(name)
+        except ImportError:
+            pass
+    return result
+
+
+def is_supported(serializer_name, payload):
+    is_array = type(payload).__module__ == 'numpy'
+    return is_array == (serializer_name == 'numpy') or serializer_name == 'pickle'
+
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(repeat=20):
+    results = []
+    folder = tempfile.mkdtemp()
+    try:
+        for payload_name, payload in build_payloads().items():
+            for serializer_name, serializer in available_serializers().items():
+                if not is_supported(serializer_name, payload):
+                    continue
+                variable_name = '%s.%s' % (payload_name, serializer_name)
+                variable = PersistentVariable(variable_name, folder=folder, serializer=serializer)
+                results.append({
+                    'payload': payload_name,
+                    'serializer': serializer_name,
+                    'bytes': len(serializer.dumps(payload)),
+                    'save_seconds': time_call(lambda: variable.set_value(payload), repeat),
+                    'load_seconds': time_call(variable.refresh, repeat),
+                })
+    finally:
+        shutil.rmtree(folder)
+    return results
+
+
+def print_results(results):
+    print('%-18s %-10s %12s %12s %12s' % ('payload', 'serializer', 'bytes', 'save ms', 'load ms'))
+    for result in results:
+        print('%-18s %-10s %12i %12.3f %12.3f' % (result['payload'],
+                                                  result['serializer'],
+                                                  result['bytes'],
+                                                  result['save_seconds'] * 1000,
+                                                  result['load_seconds'] * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Write the results to this file as JSON')
+    args = parser.parse_args()
+
+    results = run(repeat=args.repeat)
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,181 @@
+'''
+Vectorised nodes, computing over every instrument in one call.
+
+A Node executes its target once per input, with one Python object per
+argument. For arithmetic over thousands of instruments, a ColumnarNode
+instead keeps a preallocated NumPy column per reactive input port, with one
+row per key (e.g. instrument id). Each update to a port, a mapping of
+{key: value}, is scattered into that port's column, and the target is called
+once with every column as a NumPy array:
+
+    def synthetic_price(bid, ask):
+        return (bid + ask) / 2
+
+    bids = Node(get_bids)                # returns {'AAPL': 101.2, ...}
+    asks = Node(get_asks)
+    mid = ColumnarNode(synthetic_price, node_args=(bids, asks))
+
+Rows for new keys are appended as they first appear, and hold the fill
+value (NaN for floats) until updated. Keys are never removed.
+
+The target returns an array with one value per row, which is sent
+downstream as a KeyedArray. A KeyedArray gathers values by key, and a
+downstream ColumnarNode scatters it into its column in one vectorised step.
+A scalar result, such as a sum over every row, is sent on as it is.
+
+Requires the numpy package.
+
+'''
+
+from collections.abc import Mapping
+
+from colony.node import Node
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class KeyedArray(object):
+    """ A NumPy array with one row per key, preallocated and grown as keys are added.
+
+    With num_columns set each row has that many columns, otherwise the array
+    is one dimensional. Not thread safe.
+    """
+
+    def __init__(self, keys=(), values=None, num_columns=None, dtype=float, fill=None, capacity=16):
+        if np is None:
+            raise ImportError('KeyedArray requires the numpy package')
+        self.dtype = np.dtype(dtype)
+        self.fill = _default_fill(self.dtype) if fill is None else fill
+        self.num_columns = num_columns
+
+        self.keys = []
+        self.index = {}
+        self.data = self._allocate(max(capacity, len(keys)))
+        self.positions(keys)
+        if values is not None:
+            self.values[...] = values
+
+    def __repr__(self):
+        return '<KeyedArray keys=%i dtype=%s>' % (len(self.keys), self.dtype)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __getitem__(self, key):
+        return self.data[self.index[key]]
+
+    @property
+    def values(self):
+        """ A view of the rows in use, in the order their keys were added """
+        return self.data[:len(self.keys)]
+
+    def column(self, idx):
+        return self.values[:, idx]
+
+    def positions(self, keys, add=True):
+        """ The rows of keys, as an array. New keys are added, unless add is False, when they raise KeyError """
+        index = self.index
+        try:
+            return np.fromiter((index[key] for key in keys), dtype=np.intp, count=len(keys))
+        except KeyError:
+            if not add:
+                raise
+
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = index.get(key)
+            if row is None:
+                row = self._append(key)
+            rows[i] = row
+        return rows
+
+    def scatter(self, updates, column=None):
+        """ Write updates into the rows of their keys, adding any new keys.
+
+        updates is a mapping of {key: value}, a KeyedArray, or a (keys, values)
+        pair. With column given, only that column of each row is written.
+        """
+        if isinstance(updates, KeyedArray):
+            keys, values = updates.keys, updates.values
+        elif isinstance(updates, Mapping):
+            keys, values = list(updates.keys()), list(updates.values())
+        else:
+            keys, values = updates
+
+        rows = self.positions(keys)
+        if column is None:
+            self.data[rows] = values
+        else:
+            self.data[rows, column] = values
+
+    def gather(self, keys=None, column=None):
+        """ A new array of the values of keys, or of every key. Unknown keys raise KeyError """
+        values = self.values if column is None else self.column(column)
+        if keys is None:
+            return values.copy()
+        return values[self.positions(keys, add=False)]
+
+    def to_dict(self):
+        return dict(zip(self.keys, self.values.tolist()))
+
+    def _append(self, key):
+        row = len(self.keys)
+        if row == len(self.data):
+            data = self._allocate(2 * len(self.data))
+            data[:row] = self.data
+            self.data = data
+        self.keys.append(key)
+        self.index[key] = row
+        return row
+
+    def _allocate(self, capacity):
+        shape = (capacity, ) if self.num_columns is None else (capacity, self.num_columns)
+        return np.full(shape, self.fill, dtype=self.dtype)
+
+
+class ColumnarNode(Node):
+    """ A Node whose reactive inputs are columns of a KeyedArray, see the module docstring.
+
+    keys are the rows to preallocate, for keys known up front. The target is
+    called with a copy of each column, so it may run on a worker thread while
+    later updates are scattered. Passive inputs are passed as they are.
+    """
+
+    def __init__(self, target_func=None, keys=(), dtype=float, fill=None, *args, **kwargs):
+        if np is None:
+            raise ImportError('ColumnarNode requires the numpy package')
+        super(ColumnarNode, self).__init__(target_func=target_func, *args, **kwargs)
+
+        self.table = KeyedArray(keys, num_columns=len(self.reactive_input_ports), dtype=dtype, fill=fill)
+        self.reactive_input_values = self._columns()
+        # The number of rows of every set of columns the target may have been called with
+        self.row_counts = {len(self.table)}
+
+    def _set_reactive_input(self, idx, data):
+        self.table.scatter(data, column=idx)
+        self.reactive_input_values = self._columns()
+        self.row_counts.add(len(self.table))
+
+    def _columns(self):
+        # One copy of the table, transposed so that each column is contiguous
+        return tuple(self.table.values.T.copy())
+
+    def handle_result(self, result):
+        if not isinstance(result, KeyedArray) and np.ndim(result):
+            result = np.asarray(result)
+            if len(result) not in self.row_counts:
+                raise ValueError('%s returned %i values, not one per row' % (self, len(result)))
+            # Keys are only ever appended, so the rows the target saw are a prefix of them
+            num_columns = result.shape[1] if result.ndim == 2 else None
+            result = KeyedArray(self.table.keys[:len(result)], result, num_columns=num_columns, dtype=result.dtype)
+        super(ColumnarNode, self).handle_result(result)
+
+
+def _default_fill(dtype):
+    return np.nan if dtype.kind in 'fc' else 0
@@ -0,0 +1,89 @@
+'''
+The changes made to a dictionary by one update, as emitted by DictionaryNode.
+
+A DictDelta is a read-only Mapping over the whole dictionary, so a consumer
+of the full state can use it like the dictionary itself, without a copy.
+Incremental consumers read only what changed:
+
+    added   - {key: value} for keys that were not present before
+    updated - {key: value} for keys whose value was replaced
+    removed - {key: old value} for keys that were deleted
+
+so their work is proportional to the size of the change, not the dictionary.
+
+The mapping is a live view: it shows the latest state of the dictionary,
+which may include later updates by the time a slow consumer reads it. The
+added, updated and removed dicts belong to this delta alone, and two deltas
+are equal when their changes are, so distinct_until_changed compares changes.
+
+Pickling sends a copy of the state with the changes. The json and msgpack
+serializers send the state alone, as a plain dict.
+
+'''
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+class DictDelta(Mapping):
+    def __init__(self, state, added=None, updated=None, removed=None):
+        # The dictionary itself, which must not be modified through this delta
+        self.state = state
+        self.view = MappingProxyType(state)
+        self.added = added or {}
+        self.updated = updated or {}
+        self.removed = removed or {}
+
+    @classmethod
+    def for_update(cls, state, data):
+        """ The delta of state.update(data). Call it before applying the update """
+        added = {}
+        updated = {}
+        for key, value in data.items():
+            if key in state:
+                updated[key] = value
+            else:
+                added[key] = value
+        return cls(state, added=added, updated=updated)
+
+    @classmethod
+    def for_delete(cls, state, keys):
+        """ The delta of deleting keys from state. Call it before deleting them """
+        return cls(state, removed={key: state[key] for key in keys if key in state})
+
+    def __repr__(self):
+        return '<DictDelta added=%i updated=%i removed=%i size=%i>' % (
+            len(self.added), len(self.updated), len(self.removed), len(self.view))
+
+    def __getitem__(self, key):
+        return self.view[key]
+
+    def __iter__(self):
+        return iter(self.view)
+
+    def __len__(self):
+        return len(self.view)
+
+    def __eq__(self, other):
+        if isinstance(other, DictDelta):
+            # Deltas of one dictionary share its live state, so only their changes tell them apart
+            return (self.added, self.updated, self.removed) == (other.added, other.updated, other.removed)
+        return super(DictDelta, self).__eq__(other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # MappingProxyType cannot be pickled, so send a copy of the state with the changes
+        return DictDelta, (dict(self.state), self.added, self.updated, self.removed)
+
+    @property
+    def has_changes(self):
+        return bool(self.added or self.updated or self.removed)
+
+    def apply_to(self, d):
+        """ Make the same changes to d, e.g. to keep a copy of the dictionary elsewhere in step """
+        d.update(self.added)
+        d.update(self.updated)
+        for key in self.removed:
+            d.pop(key, None)
+        return d
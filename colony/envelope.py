@@ -0,0 +1,49 @@
+'''
+A compact wrapper for messages that need a timestamp and sequence number.
+
+Graphs pass bare values between nodes. When a consumer needs to know when a
+message was produced, or to detect gaps and reordering, wrap the value:
+
+    source.notify(envelope(price))
+
+Envelopes use __slots__, so they have no per-instance __dict__ and cost
+little more than a tuple to create and store.
+
+'''
+
+import itertools
+import time
+
+_sequence = itertools.count()
+
+
+class Envelope(object):
+    __slots__ = ('value', 'timestamp', 'seq')
+
+    def __init__(self, value, timestamp, seq):
+        self.value = value
+        self.timestamp = timestamp
+        self.seq = seq
+
+    def __repr__(self):
+        return '<Envelope seq=%i timestamp=%f value=%r>' % (self.seq, self.timestamp, self.value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Envelope):
+            return NotImplemented
+        return (self.value, self.timestamp, self.seq) == (other.value, other.timestamp, other.seq)
+
+    def __hash__(self):
+        return hash((self.timestamp, self.seq))
+
+    def __reduce__(self):
+        return Envelope, (self.value, self.timestamp, self.seq)
+
+    def replace(self, value):
+        """ A new Envelope carrying value, with this one's timestamp and seq, e.g. for a node's result """
+        return Envelope(value, self.timestamp, self.seq)
+
+
+def envelope(value):
+    """ Wrap value with the current time and the next sequence number of this process """
+    return Envelope(value, time.time(), next(_sequence))
@@ -0,0 +1,153 @@
+'''
+A thread pool shared by the nodes of a graph.
+
+Rather than each ThreadNode starting its own threads, a Graph created with an
+executor runs its thread nodes on one SharedExecutor, so the number of
+threads depends on the concurrency wanted rather than the number of nodes.
+
+Each node submits its calls to its own Lane. Idle threads take calls from the
+lanes in weighted round robin order: a lane with weight 3 gets up to three
+calls run for every one of a lane with weight 1, while it has calls waiting.
+A lane with max_concurrency set never has more than that many calls running,
+so one busy node cannot take over the pool.
+
+'''
+
+import os
+from collections import deque
+from threading import Condition, Thread
+
+
+class Lane(object):
+    def __init__(self, name=None, weight=1, max_concurrency=None):
+        if weight < 1:
+            raise ValueError('weight must be at least 1')
+        self.name = name
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+
+        self.tasks = deque()
+        self.num_running = 0
+        self.credit = weight
+
+    def __repr__(self):
+        return '<Lane name="%s" weight=%i>' % (self.name, self.weight)
+
+    @property
+    def is_ready(self):
+        """ Whether a call can be started from this lane """
+        return bool(self.tasks) and (self.max_concurrency is None or self.num_running < self.max_concurrency)
+
+    @property
+    def is_idle(self):
+        return not self.tasks and not self.num_running
+
+
+class SharedExecutor(object):
+    """ A pool of num_threads threads running calls from any number of Lanes.
+
+    By default there are min(32, cpu count + 4) threads, as for
+    concurrent.futures.ThreadPoolExecutor.
+    """
+
+    def __init__(self, num_threads=None):
+        self.num_threads = num_threads or min(32, (os.cpu_count() or 1) + 4)
+
+        self.condition = Condition()
+        self.lanes = []
+        self.cursor = 0
+        self.threads = []
+        self.is_stopping = False
+
+    def add_lane(self, name=None, weight=1, max_concurrency=None):
+        lane = Lane(name, weight, max_concurrency)
+        with self.condition:
+            self.lanes.append(lane)
+        return lane
+
+    def submit(self, lane, task):
+        """ Run task(), a function of no arguments, on the pool """
+        with self.condition:
+            lane.tasks.append(task)
+            self.condition.notify()
+
+    def discard(self, lane):
+        """ Remove the calls waiting in lane, returning them """
+        with self.condition:
+            tasks = list(lane.tasks)
+            lane.tasks.clear()
+            self.condition.notify_all()
+        return tasks
+
+    def wait_idle(self, lane, timeout=None):
+        """ Wait until lane has no calls waiting or running. Returns False if timeout ran out first """
+        with self.condition:
+            return self.condition.wait_for(lambda: lane.is_idle, timeout)
+
+    @property
+    def is_running(self):
+        return bool(self.threads)
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_stopping = False
+        self.threads = [Thread(target=self._run, daemon=True) for _ in range(self.num_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """ Stop the threads once the calls already submitted have run. Returns False if timeout ran out """
+        with self.condition:
+            self.is_stopping = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        is_stopped = not any(thread.is_alive() for thread in self.threads)
+        self.threads = []
+        return is_stopped
+
+    def stats(self):
+        with self.condition:
+            return {
+                'threads': self.num_threads,
+                'waiting': sum(len(lane.tasks) for lane in self.lanes),
+                'running': sum(lane.num_running for lane in self.lanes),
+            }
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    lane = self._next_lane()
+                    if lane is not None:
+                        break
+                    if self.is_stopping and not any(lane.tasks for lane in self.lanes):
+                        return
+                    self.condition.wait()
+                task = lane.tasks.popleft()
+                lane.num_running += 1
+
+            try:
+                task()
+            finally:
+                with self.condition:
+                    lane.num_running -= 1
+                    # Wakes threads waiting for this lane's concurrency cap, and wait_idle
+                    self.condition.notify_all()
+
+    def _next_lane(self):
+        """ The lane to run a call from next, in weighted round robin order, or None """
+        for _ in range(len(self.lanes)):
+            lane = self.lanes[self.cursor]
+            if lane.is_ready:
+                lane.credit -= 1
+                if lane.credit <= 0:
+                    self._advance()
+                return lane
+            self._advance()
+        return None
+
+    def _advance(self):
+        self.lanes[self.cursor].credit = self.lanes[self.cursor].weight
+        self.cursor = (self.cursor + 1) % len(self.lanes)
@@ -1,4 +1,4 @@
-from colony.node import Graph, DictionaryNode, BatchArgInputPort
+from colony.node import Graph, DictionaryNode, JournalDictionaryNode, BatchArgInputPort
 
 
 class AuctionListener(Graph):
@@ -15,6 +15,7 @@ class AuctionListener(Graph):
                  batch_size=5,
                  filename=None,
                  folder=None,
+                 journal=False,
                  name=None,
                  logger=None
                  ):
@@ -39,7 +40,9 @@ class AuctionListener(Graph):
         self.update_node = self.add_node(update,
                                          node_args=(self.get_auctions_node,))
 
-        self.active_auctions_node = self.add(DictionaryNode,
+        # A journal saves each change rather than the whole catalogue
+        dictionary_node_class = JournalDictionaryNode if journal else DictionaryNode
+        self.active_auctions_node = self.add(dictionary_node_class,
                                              node_args=(self.update_node,),
                                              name=filename,
                                              folder=folder)
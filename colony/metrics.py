@@ -0,0 +1,139 @@
+'''
+Execution metrics and profiling for nodes.
+
+Every Worker records its calls in a NodeMetrics instance. Node.stats() and
+Graph.stats() return snapshots of them, so the bottleneck in a live graph can
+be found by comparing queue wait times, execution times and in-flight counts.
+
+'''
+
+import cProfile
+import pstats
+import threading
+import time
+from collections import deque
+
+
+class NodeMetrics(object):
+    """ Call counts, error counts and timings of a node's target.
+
+    Percentiles are calculated from the most recent max_samples calls.
+    Times are in seconds.
+    """
+
+    def __init__(self, max_samples=1000):
+        self.lock = threading.Lock()
+        self.num_calls = 0
+        self.num_errors = 0
+        self.num_in_flight = 0
+        self.total_execution_time = 0.0
+        self.total_queue_wait = 0.0
+        self.execution_times = deque(maxlen=max_samples)
+        self.queue_waits = deque(maxlen=max_samples)
+
+    def record_submitted(self, num_items=1):
+        with self.lock:
+            self.num_in_flight += num_items
+
+    def record_dropped(self, num_items=1):
+        with self.lock:
+            self.num_in_flight -= num_items
+
+    def record_call(self, started_at, finished_at, queued_at=None, is_error=False, num_items=1):
+        """ Record one call of the target, which handled num_items submitted inputs """
+        execution_time = finished_at - started_at
+        queue_wait = max(started_at - queued_at, 0.0) if queued_at else 0.0
+        with self.lock:
+            self.num_calls += 1
+            self.num_in_flight -= num_items
+            if is_error:
+                self.num_errors += 1
+            self.total_execution_time += execution_time
+            self.total_queue_wait += queue_wait
+            self.execution_times.append(execution_time)
+            self.queue_waits.append(queue_wait)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'calls': self.num_calls,
+                'errors': self.num_errors,
+                'in_flight': self.num_in_flight,
+                'total_execution_time': self.total_execution_time,
+                'total_queue_wait': self.total_queue_wait,
+                'execution_time': summarise(self.execution_times),
+                'queue_wait': summarise(self.queue_waits),
+            }
+
+
+def summarise(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {'mean': None, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    return {
+        'mean': sum(samples) / len(samples),
+        'p50': percentile(samples, 0.50),
+        'p95': percentile(samples, 0.95),
+        'p99': percentile(samples, 0.99),
+        'max': samples[-1],
+    }
+
+
+def percentile(sorted_samples, q):
+    return sorted_samples[int(round(q * (len(sorted_samples) - 1)))]
+
+
+class NodeProfiler(object):
+    """ Runs a node's target under cProfile, with one profile per worker thread.
+
+    Only one profiler can be active at a time in some Python versions, so a
+    call that cannot be profiled is run without profiling instead.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiles = {}
+
+    def call(self, func, args, kwargs):
+        profile = self._get_profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+
+    def stats(self):
+        """ The combined pstats.Stats of every thread, or None if nothing has been profiled """
+        with self.lock:
+            profiles = list(self.profiles.values())
+
+        result = None
+        for profile in profiles:
+            snapshot = _ProfileSnapshot(profile)
+            if result is None:
+                result = pstats.Stats(snapshot)
+            else:
+                result.add(snapshot)
+        return result
+
+    def _get_profile(self):
+        thread_id = threading.get_ident()
+        with self.lock:
+            if thread_id not in self.profiles:
+                self.profiles[thread_id] = cProfile.Profile(time.perf_counter)
+            return self.profiles[thread_id]
+
+
+class _ProfileSnapshot(object):
+    """ Lets pstats read a profile without disabling it, as it may be running on another thread """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.stats = None
+
+    def create_stats(self):
+        self.profile.snapshot_stats()
+        self.stats = self.profile.stats
@@ -1,23 +1,69 @@
+import asyncio
+import functools
+import inspect
 import multiprocessing
+import time
 import traceback
 from multiprocessing import Process
-from queue import Queue
-from threading import Thread
+from queue import Empty, Full, Queue
+from threading import Condition, Lock, Thread
 
+from colony.dict_delta import DictDelta
+from colony.executor import SharedExecutor
+from colony.metrics import NodeMetrics, NodeProfiler
 from colony.observer import Observer, Observable
-from colony.persistent_variable import PersistentVariable
+from colony.persistent_variable import JournalDictionary, PersistentVariable
+from colony.policies import CallPolicy, CircuitBreaker, RetryPolicy
+from colony.remote import RemoteSink, RemoteSource
+from colony.scheduler import TopologicalScheduler, topological_sort
+from colony.transport import SharedMemoryTransport
+from colony.utils.cache import LRUCache, make_key
+from colony.utils.event_loop import EventLoopThread
 from colony.utils.function_info import FunctionInfo
+from colony.utils.lane_queue import LaneQueue
 from colony.utils.logging import get_logger
 
+# What AsyncWorker.execute does when a bounded worker_queue is full
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+COALESCE = 'coalesce'
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+# ThreadNode kwargs that a PooledNode does not take
+_THREAD_NODE_ONLY_KWARGS = ('max_queue_size', 'overflow_policy', 'conflate', 'num_priorities', 'starvation_limit')
+
+# Returned by Worker._call_target in place of a result that need not be sent downstream
+_UNCHANGED = object()
+_NO_RESULT = object()
+
 
 class Graph(object):
-    def __init__(self, name=None, logger=None):
+    def __init__(self, name=None, logger=None, topological=False, executor=None):
         self.logger = logger or get_logger()
         self.nodes = []
         self.process = multiprocessing.current_process()
         self.is_alive = False
         self.name = name or ''
 
+        # When topological is True, updates propagate in waves scheduled
+        # by a TopologicalScheduler rather than by recursive notification
+        self.topological = topological
+        self.scheduler = None
+
+        # Shared by all AsyncioNodes, created by the first add_asyncio_node
+        self.event_loop_thread = None
+
+        # Connections to graphs in other processes, see colony.remote
+        self.remote_sources = []
+        self.remote_sinks = []
+
+        # If given a SharedExecutor (or its number of threads), every thread
+        # node runs on it, and num_threads caps each node's share of it
+        if isinstance(executor, int):
+            executor = SharedExecutor(executor)
+        self.executor = executor
+
     def add(self, node_class, *args, **kwargs):
         if 'logger' not in kwargs:
             kwargs['logger'] = self.logger
@@ -30,48 +76,178 @@ class Graph(object):
         return result
 
     def add_thread_node(self, *args, **kwargs):
+        # Queue policies and priority lanes need the node's own queue, so such
+        # nodes keep their own threads, as do nodes given ThreadNode's positional args
+        is_pooled = len(args) <= 1 and not any(name in kwargs for name in _THREAD_NODE_ONLY_KWARGS)
+        if self.executor is not None and is_pooled:
+            kwargs.setdefault('executor', self.executor)
+            return self.add(PooledNode, *args, **kwargs)
         result = self.add(ThreadNode, *args, **kwargs)
         return result
 
+    def add_pooled_node(self, *args, **kwargs):
+        if 'executor' not in kwargs:
+            if self.executor is None:
+                self.executor = SharedExecutor()
+            kwargs['executor'] = self.executor
+        result = self.add(PooledNode, *args, **kwargs)
+        return result
+
     def add_process_node(self, *args, **kwargs):
         result = self.add(ProcessNode, *args, **kwargs)
         return result
 
+    def add_batch_node(self, *args, **kwargs):
+        result = self.add(BatchNode, *args, **kwargs)
+        return result
+
+    def add_asyncio_node(self, *args, **kwargs):
+        if self.event_loop_thread is None:
+            self.event_loop_thread = EventLoopThread()
+        if 'event_loop_thread' not in kwargs:
+            kwargs['event_loop_thread'] = self.event_loop_thread
+        result = self.add(AsyncioNode, *args, **kwargs)
+        return result
+
+    def add_remote_source(self, address, **kwargs):
+        """ A RemoteSource receiving the messages sent to address. Use it in node_args or node_kwargs like a node """
+        kwargs.setdefault('logger', self.logger)
+        source = RemoteSource(address, **kwargs)
+        self.remote_sources.append(source)
+        return source
+
+    def add_remote_sink(self, node, address, **kwargs):
+        """ A RemoteSink sending the results of node to the RemoteSource at address """
+        kwargs.setdefault('logger', self.logger)
+        sink = RemoteSink(address, **kwargs)
+        node.output_port.register_observer(sink)
+        self.remote_sinks.append(sink)
+        return sink
+
+    def stats(self):
+        """ Snapshot of every node's execution metrics, keyed by node. See Node.stats """
+        return {node: node.stats() for node in self.nodes}
+
+    def queue_stats(self):
+        """ Snapshot of queue depths and drop counts, keyed by node """
+        return {node: node.worker.queue_stats() for node in self.nodes if hasattr(node.worker, 'queue_stats')}
+
+    def topological_order(self):
+        return topological_sort(self.nodes)
+
     def start(self):
         self.logger.info('Graph "%s" starting', self.name)
+        if self.topological:
+            self.scheduler = TopologicalScheduler(self.nodes)
+            for node in self.nodes:
+                node.scheduler = self.scheduler
+
+        if self.event_loop_thread:
+            self.event_loop_thread.start()
+
+        if self.executor is not None:
+            self.executor.start()
+
+        for sink in self.remote_sinks:
+            sink.start()
+
         for node in self.nodes:
             if hasattr(node, 'start'):
                 node.start()
+
+        # Only accept remote messages once the nodes are ready for them
+        for source in self.remote_sources:
+            source.start()
         self.is_alive = True
 
-    def stop(self):
+    def stop(self, drain=True, timeout=None):
+        """ Stop every node, upstream nodes first.
+
+        With drain=True each node executes its queued inputs before it stops,
+        and their results flow on to the downstream nodes, which are still
+        running. With drain=False queued inputs are dropped, and only inputs
+        that are already executing are waited for.
+
+        If timeout (in seconds) runs out, the remaining nodes stop without
+        waiting: their queued inputs are dropped, worker processes are
+        terminated and worker threads are abandoned.
+
+        Remote sources stop before the nodes and remote sinks after them.
+
+        Returns a report:
+            dropped   - {node: number of inputs dropped}, for nodes (and remote sinks) that dropped any
+            timed_out - nodes that did not stop in time
+            elapsed   - seconds taken
+        """
         self.logger.info('Graph "%s" received stop signal', self.name)
         self.is_alive = False
-        for node in self.nodes:
-            if isinstance(node.worker, AsyncWorker):
-                node.stop()
-
-        for node in self.nodes:
-            if isinstance(node.worker, SyncWorker):
-                node.stop()
+        started_at = time.time()
+        deadline = _deadline(timeout)
+
+        # SyncWorker nodes stop last, so that they still pass on the results
+        # of asynchronous nodes that are draining, including around cycles
+        order = topological_sort(self.nodes)
+        order = [n for n in order if not isinstance(n.worker, SyncWorker)] + \
+                [n for n in order if isinstance(n.worker, SyncWorker)]
+
+        # Remote sources stop first, so that nothing new arrives while the
+        # nodes drain, and remote sinks last, so that they send every result
+        report = {'dropped': {}, 'timed_out': [], 'elapsed': None}
+        if self.scheduler is not None and drain:
+            # Let a wave drained by another thread submit its inputs first
+            self.scheduler.wait_until_idle(_remaining(deadline))
+        for node in self.remote_sources + order + self.remote_sinks:
+            node_report = node.stop(drain=drain, timeout=_remaining(deadline))
+            if node_report['dropped']:
+                report['dropped'][node] = node_report['dropped']
+            if node_report['timed_out']:
+                report['timed_out'].append(node)
+
+        if self.event_loop_thread:
+            self.event_loop_thread.stop()
+
+        if self.executor is not None:
+            self.executor.stop(_remaining(deadline))
+
+        report['elapsed'] = time.time() - started_at
+        if report['dropped'] or report['timed_out']:
+            self.logger.warning('Graph "%s" stopped, dropping %i inputs. Timed out: %s',
+                                self.name, sum(report['dropped'].values()), report['timed_out'])
+        return report
 
 
 class OutputPort(Observable):
+    __slots__ = ('node', )
+
     def __init__(self):
         super(OutputPort, self).__init__()
 
     def connect_to(self, node):
         self.node = node
 
-    def notify(self, data):
-        self.notify_observers(data)
+    # The same method, saving a call per message
+    notify = Observable.notify_observers
 
 
 class PoisonPill(object):
     pass
 
 
+class _StreamedItem(object):
+    """ An item of a generator target's output, passed from a worker thread to the result thread """
+
+    def __init__(self, item):
+        self.item = item
+
+
+class _EndOfStream(object):
+    """ Sent by a ProcessWorker child after the items of a generator target """
+    pass
+
+
 class InputPort(Observer):
+    __slots__ = ('node', )
+
     def __init__(self, node=None):
         self.node = node
 
@@ -83,21 +259,38 @@ class InputPort(Observer):
 
 
 class ArgInputPort(InputPort):
-    def __init__(self, idx=None, node=None):
+    """ Passes data to the node's idx-th argument.
+
+    Inputs arriving on a port with a priority are queued in that lane by a
+    ThreadNode with num_priorities set, 0 being the most urgent. Pass
+    priority to notify to override it for one message.
+    """
+
+    __slots__ = ('idx', 'priority')
+
+    def __init__(self, idx=None, node=None, priority=None):
         super(ArgInputPort, self).__init__(node=node)
         self.idx = idx
+        self.priority = priority
 
-    def notify(self, data):
-        self.node.handle_input(data, idx=self.idx)
+    def notify(self, data, priority=None):
+        self.node.handle_input(data, idx=self.idx, priority=self._priority(priority))
+
+    def _priority(self, priority):
+        return self.priority if priority is None else priority
 
 
 class MappingArgInputPort(ArgInputPort):
-    def notify(self, data):
+    __slots__ = ()
+
+    def notify(self, data, priority=None):
         for x in data:
-            self.node.handle_input(x, idx=self.idx)
+            self.node.handle_input(x, idx=self.idx, conflate=False, priority=self._priority(priority))
 
 
 class KwargInputPort(InputPort):
+    __slots__ = ('kwarg', )
+
     def __init__(self, kwarg):
         super(KwargInputPort, self).__init__()
         self.kwarg = kwarg
@@ -107,13 +300,15 @@ class KwargInputPort(InputPort):
 
 
 class BatchArgInputPort(ArgInputPort):
-    def __init__(self, batch_size=1, idx=None, node=None):
-        super(BatchArgInputPort, self).__init__(idx=idx, node=node)
+    __slots__ = ('batch_size', )
+
+    def __init__(self, batch_size=1, idx=None, node=None, priority=None):
+        super(BatchArgInputPort, self).__init__(idx=idx, node=node, priority=priority)
         self.batch_size = batch_size
 
-    def notify(self, data):
+    def notify(self, data, priority=None):
         for batch in self.chunks(data):
-            self.node.handle_input(batch, idx=self.idx)
+            self.node.handle_input(batch, idx=self.idx, conflate=False, priority=self._priority(priority))
 
     def chunks(self, payload):
         """ Yield successive n-sized chunks from l.
@@ -123,6 +318,10 @@ class BatchArgInputPort(ArgInputPort):
 
 
 class Worker(object):
+    __slots__ = ('node', 'target_class', 'target_class_args', 'target_class_kwargs', 'metrics', 'profiler', 'policy',
+                 'cache', 'cache_key', 'suppress_unchanged', 'last_key', 'distinct_until_changed', 'distinct_lock',
+                 'last_result_key', 'num_unchanged')
+
     def __init__(self, node):
         self.node = node
 
@@ -131,17 +330,135 @@ class Worker(object):
         self.target_class_args = node.target_class_args
         self.target_class_kwargs = node.target_class_kwargs
 
+        self.metrics = NodeMetrics()
+        self.profiler = None
+        # A CallPolicy applying the node's timeout, retry and circuit_breaker
+        self.policy = None
+
+        # Memoization, see Node.set_cache
+        self.cache = None
+        self.cache_key = make_key
+        self.suppress_unchanged = False
+        self.last_key = None
+
+        # True, or a key function, to skip results equal to the previous one
+        self.distinct_until_changed = node.distinct_until_changed
+        self.distinct_lock = Lock()
+        self.last_result_key = _NO_RESULT
+        self.num_unchanged = 0
+
     def execute(self, *args, **kwargs):
         raise NotImplemented()
 
+    def submit(self, args, kwargs, priority=None):
+        """ Execute with the given priority. Only workers with priority lanes use it """
+        self.execute(*args, **kwargs)
+
+    def stats(self):
+        result = self.metrics.snapshot()
+        if self.policy:
+            result['policy'] = self.policy.stats()
+        if self.cache is not None:
+            result['cache'] = self.cache.stats()
+        if self.distinct_until_changed:
+            result['unchanged'] = self.num_unchanged
+        return result
+
+    def _call_target(self, target, args, kwargs, queued_at=None, num_items=1):
+        """ Call the target under the node's policies, recording its metrics, and profiling it if enabled.
+
+        Returns the cached result instead if memoization is enabled and the
+        inputs have been seen before, or _UNCHANGED if they are the same as
+        the last inputs and suppress_unchanged is set.
+
+        A generator target's items are streamed rather than returned together:
+        the call is recorded once the returned generator is exhausted, and is
+        never cached. Policies apply to creating the generator, not to its items.
+        """
+        started_at = time.time()
+        key = self.cache_key(args, kwargs) if self.cache is not None else None
+        if key is not None:
+            is_cached, result = self.cache.get(key)
+            if is_cached:
+                self.metrics.record_call(started_at, time.time(), queued_at, num_items=num_items)
+                is_unchanged = self.suppress_unchanged and key == self.last_key
+                self.last_key = key
+                return _UNCHANGED if is_unchanged else result
+
+        try:
+            if self.policy:
+                result = self.policy.call(self._invoke_target, target, args, kwargs)
+            else:
+                result = self._invoke_target(target, args, kwargs)
+        except Exception:
+            self.metrics.record_call(started_at, time.time(), queued_at, is_error=True, num_items=num_items)
+            raise
+        if inspect.isgenerator(result):
+            return self._timed_stream(result, started_at, queued_at, num_items)
+        self.metrics.record_call(started_at, time.time(), queued_at, num_items=num_items)
+        if key is not None:
+            self.cache.put(key, result)
+            self.last_key = key
+        return result
+
+    def _timed_stream(self, stream, started_at, queued_at, num_items):
+        is_error = True
+        try:
+            for item in stream:
+                yield item
+            is_error = False
+        finally:
+            self.metrics.record_call(started_at, time.time(), queued_at, is_error=is_error, num_items=num_items)
+
+    def _invoke_target(self, target, args, kwargs):
+        if self.profiler:
+            return self.profiler.call(target, args, kwargs)
+        return target(*args, **kwargs)
+
     def _handle_result(self, result):
-        self.node.set_value(result)
-        self.node.output_port.notify(result)
+        if inspect.isgenerator(result):
+            if self.node.scheduler is not None:
+                # Each item is an update of its own, not to be conflated with the others
+                with self.node.scheduler.separate():
+                    self._handle_items(result)
+            else:
+                self._handle_items(result)
+            return
+        if result is _UNCHANGED or not self._has_changed(result):
+            return
+        self.node.handle_result(result)
+
+    def _handle_items(self, result):
+        # Pass on each item as it is produced, so the value ends as the last item
+        for item in result:
+            self._handle_result(item)
+
+    def _has_changed(self, result):
+        if not self.distinct_until_changed:
+            return True
+        if self.distinct_until_changed is True:
+            key = result
+        else:
+            key = self.distinct_until_changed(result)
+
+        with self.distinct_lock:
+            if self.last_result_key is not _NO_RESULT:
+                try:
+                    is_unchanged = bool(key == self.last_result_key)
+                except ValueError:
+                    # e.g. NumPy arrays, which compare element-wise
+                    is_unchanged = False
+                if is_unchanged:
+                    self.num_unchanged += 1
+                    return False
+            self.last_result_key = key
+        return True
 
     def start(self):
         raise NotImplemented()
 
-    def stop(self):
+    def stop(self, drain=True, timeout=None):
+        """ Returns {'dropped': number of inputs dropped, 'timed_out': bool}. See Graph.stop """
         raise NotImplemented()
 
     def _get_target_func(self):
@@ -154,6 +471,8 @@ class Worker(object):
 
 
 class SyncWorker(Worker):
+    __slots__ = ('target', 'isStarted')
+
     def __init__(self, *args, **kwargs):
         super(SyncWorker, self).__init__(*args, **kwargs)
         self.target = None
@@ -162,7 +481,8 @@ class SyncWorker(Worker):
     def execute(self, *args, **kwargs):
         try:
             if self.isStarted:
-                result = self.target(*args, **kwargs)
+                self.metrics.record_submitted()
+                result = self._call_target(self.target, args, kwargs)
                 self._handle_result(result)
             else:
                 raise Exception('SyncWorker.execute called, even though it is not started.')
@@ -176,17 +496,61 @@ class SyncWorker(Worker):
         self.target = self._get_target_func()
         self.isStarted = True
 
-    def stop(self):
+    def stop(self, drain=True, timeout=None):
         self.target = None
         self.isStarted = False
+        return {'dropped': 0, 'timed_out': False}
 
 
 class AsyncWorker(Worker):
-    def __init__(self, node, async_class=Thread, num_threads=10):
+    """ Executes the target on a pool of threads (or processes).
+
+    With max_queue_size > 0 the worker_queue and result_queue are bounded.
+    When the worker_queue is full, overflow_policy decides what execute does:
+
+        BLOCK       - wait for space, pushing back on the upstream caller
+        DROP_OLDEST - discard the oldest queued input to make room
+        DROP_NEWEST - discard the new input
+        COALESCE    - discard every queued input, so only the latest remains
+
+    A full result_queue always blocks the workers.
+
+    With conflate=True the node executes one input at a time. Inputs that
+    arrive while it is busy replace each other, and when it finishes it runs
+    once more on the latest of them. Since the node's inputs hold the latest
+    value of each port, that run sees the freshest value of every port, and
+    the backlog never grows beyond one input under a bursty feed.
+
+    With num_priorities set, thread workers queue inputs in that many lanes
+    of a LaneQueue, so that urgent inputs jump ahead of bulk traffic. The
+    priority comes from the input port (see ArgInputPort), and inputs without
+    one go in the last lane. A lane passed over starvation_limit times in a
+    row is served next, so low priority inputs are delayed but never starved.
+    Only BLOCK and DROP_NEWEST are supported with priorities, since the other
+    policies would discard the most urgent inputs first.
+    """
+
+    __slots__ = ('num_threads', 'async_class', 'max_queue_size', 'overflow_policy', 'queue_class', 'worker_queue',
+                 'result_queue', 'worker_threads', 'result_thread', 'stats_lock', 'num_enqueued', 'num_dropped',
+                 'max_queue_depth', 'conflate', 'conflate_condition', 'is_busy', 'latest_payload', 'num_conflated',
+                 'num_priorities', 'starvation_limit')
+
+    def __init__(self, node, async_class=Thread, num_threads=10, max_queue_size=0, overflow_policy=BLOCK,
+                 conflate=False, num_priorities=None, starvation_limit=10):
         super(AsyncWorker, self).__init__(node)
 
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError('overflow_policy %s not recognised' % overflow_policy)
+        if num_priorities is not None:
+            if async_class != Thread:
+                raise ValueError('num_priorities is only supported by thread workers')
+            if overflow_policy not in (BLOCK, DROP_NEWEST):
+                raise ValueError('overflow_policy %s is not supported with num_priorities' % overflow_policy)
+
         self.num_threads = num_threads
         self.async_class = async_class
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
 
         self.queue_class = None
         self.worker_queue = None
@@ -194,37 +558,224 @@ class AsyncWorker(Worker):
         self.worker_threads = None
         self.result_thread = None
 
+        self.stats_lock = Lock()
+        self.num_enqueued = 0
+        self.num_dropped = 0
+        self.max_queue_depth = 0
+
+        self.conflate = conflate
+        self.conflate_condition = Condition()
+        self.is_busy = False
+        self.latest_payload = None
+        self.num_conflated = 0
+
+        self.num_priorities = num_priorities
+        self.starvation_limit = starvation_limit
+
     def start(self):
 
         queue_class = _get_queue_class(self.async_class)
-        self.worker_queue = queue_class()
-        self.result_queue = queue_class()
-        self.worker_threads = [self.async_class(target=self._worker) for _ in range(self.num_threads)]
+        if self.num_priorities is None:
+            self.worker_queue = queue_class(self.max_queue_size)
+        else:
+            self.worker_queue = LaneQueue(self.max_queue_size, num_lanes=self.num_priorities,
+                                          starvation_limit=self.starvation_limit, lane_of=self._lane_of)
+        self.result_queue = queue_class(self.max_queue_size)
+        # Daemon threads, so that a stuck target cannot stop the interpreter exiting
+        self.worker_threads = [self.async_class(target=self._worker, daemon=True) for _ in range(self.num_threads)]
         for thread in self.worker_threads:
             thread.start()
 
-        self.result_thread = Thread(target=self._result_handler)
+        self.result_thread = Thread(target=self._result_handler, daemon=True)
         self.result_thread.start()
 
-    def stop(self):
+    def stop(self, drain=True, timeout=None):
+        deadline = _deadline(timeout)
+        num_dropped = self.num_dropped
+
+        if self.conflate:
+            self._stop_conflating(drain, deadline)
+        if not drain:
+            self._discard_all()
+
         # It's important to let the worker threads stop first,
         # so that they have put their results onto result_queue
         # before this method adds the poison pill to it
-        for _ in self.worker_threads:
-            self.worker_queue.put(PoisonPill())
-
-        for thread in self.worker_threads:
-            thread.join()
+        try:
+            for _ in self.worker_threads:
+                self.worker_queue.put(PoisonPill(), timeout=_remaining(deadline))
+        except Full:
+            pass
+        timed_out = not _join_all(self.worker_threads, deadline)
+        if timed_out:
+            self._discard_all()
+            self._abandon_workers()
 
-        self.result_queue.put(PoisonPill())
-        self.result_thread.join()
+        try:
+            self.result_queue.put(PoisonPill(), timeout=_remaining(deadline))
+        except Full:
+            timed_out = True
+        if not _join_all([self.result_thread], deadline):
+            timed_out = True
+
+        if timed_out:
+            self.node.logger.warning('%s did not stop within the timeout', self.node)
+        return {'dropped': self.num_dropped - num_dropped, 'timed_out': timed_out}
+
+    def _stop_conflating(self, drain, deadline):
+        with self.conflate_condition:
+            if drain:
+                # Let the latest conflated input run before stopping the workers
+                self.conflate_condition.wait_for(lambda: not self.is_busy, _remaining(deadline))
+            if self.latest_payload is not None:
+                self._on_discarded(self.latest_payload)
+                self.latest_payload = None
+                self._record_dropped(1)
+
+    def _abandon_workers(self):
+        """ Called when the workers have not stopped in time. Threads cannot be killed, so are left to finish """
+        pass
 
     def join(self):
         self.worker_queue.join()
         self.result_queue.join()
 
     def execute(self, *args, **kwargs):
-        self.worker_queue.put((args, kwargs))
+        self.submit(args, kwargs)
+
+    def submit(self, args, kwargs, priority=None):
+        self.metrics.record_submitted()
+        if self.num_priorities is None:
+            self._submit((args, kwargs, time.time()))
+        else:
+            self._submit((args, kwargs, time.time(), priority))
+
+    def _lane_of(self, payload):
+        """ The worker_queue lane of a payload: its priority, the last lane by default, or None for PoisonPills """
+        if isinstance(payload, PoisonPill):
+            return None
+        priority = payload[3]
+        return self.num_priorities - 1 if priority is None else priority
+
+    def stats(self):
+        result = super(AsyncWorker, self).stats()
+        result['queue'] = self.queue_stats()
+        return result
+
+    def queue_stats(self):
+        result = {
+            'queue_depth': _queue_size(self.worker_queue),
+            'result_queue_depth': _queue_size(self.result_queue),
+            'max_queue_depth': self.max_queue_depth,
+            'max_queue_size': self.max_queue_size,
+            'enqueued': self.num_enqueued,
+            'dropped': self.num_dropped,
+            'conflated': self.num_conflated,
+        }
+        if isinstance(self.worker_queue, LaneQueue):
+            result['lane_depths'] = self.worker_queue.lane_sizes()
+        return result
+
+    def _submit(self, payload):
+        if self.conflate:
+            with self.conflate_condition:
+                if self.is_busy:
+                    if self.latest_payload is not None:
+                        self._record_conflated(self.latest_payload)
+                    self.latest_payload = payload
+                    return
+                self.is_busy = True
+        self._put(payload)
+
+    def _finished(self):
+        """ Called when an input has been executed. Queues the latest conflated input, if any """
+        if not self.conflate:
+            return
+        with self.conflate_condition:
+            payload, self.latest_payload = self.latest_payload, None
+            if payload is None:
+                self.is_busy = False
+                self.conflate_condition.notify_all()
+                return
+        self._put(payload)
+
+    def _record_conflated(self, payload):
+        self._on_discarded(payload)
+        self.metrics.record_dropped()
+        with self.stats_lock:
+            self.num_conflated += 1
+
+    def _put(self, payload):
+        if self.max_queue_size <= 0 or self.overflow_policy == BLOCK:
+            self.worker_queue.put(payload)
+        elif self.overflow_policy == DROP_NEWEST:
+            try:
+                self.worker_queue.put_nowait(payload)
+            except Full:
+                self._on_discarded(payload)
+                self._record_dropped(1)
+                return
+        else:
+            while True:
+                try:
+                    self.worker_queue.put_nowait(payload)
+                    break
+                except Full:
+                    max_items = 1 if self.overflow_policy == DROP_OLDEST else None
+                    if not self._discard_queued(max_items):
+                        # Shutting down, so wait for the workers to make room
+                        self.worker_queue.put(payload)
+                        break
+
+        depth = _queue_size(self.worker_queue) or 0
+        with self.stats_lock:
+            self.num_enqueued += 1
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def _discard_queued(self, max_items=None):
+        """ Drop up to max_items queued inputs. Returns False if a PoisonPill was found """
+        num_discarded = 0
+        try:
+            while max_items is None or num_discarded < max_items:
+                payload = self.worker_queue.get_nowait()
+                self.worker_queue.task_done()
+                if isinstance(payload, PoisonPill):
+                    self.worker_queue.put(payload)
+                    return False
+                self._on_discarded(payload)
+                num_discarded += 1
+        except Empty:
+            pass
+        finally:
+            self._record_dropped(num_discarded)
+        return True
+
+    def _discard_all(self):
+        """ Drop every queued input, keeping any PoisonPills in the queue """
+        pills = []
+        num_discarded = 0
+        try:
+            while True:
+                payload = self.worker_queue.get_nowait()
+                self.worker_queue.task_done()
+                if isinstance(payload, PoisonPill):
+                    pills.append(payload)
+                else:
+                    self._on_discarded(payload)
+                    num_discarded += 1
+        except Empty:
+            pass
+        for pill in pills:
+            self.worker_queue.put(pill)
+        self._record_dropped(num_discarded)
+
+    def _on_discarded(self, payload):
+        pass
+
+    def _record_dropped(self, num_dropped):
+        self.metrics.record_dropped(num_dropped)
+        with self.stats_lock:
+            self.num_dropped += num_dropped
 
     def _worker(self):
         target = self._get_target_func()
@@ -234,14 +785,23 @@ class AsyncWorker(Worker):
                 self.worker_queue.task_done()
                 return
             else:
-                args, kwargs = payload
+                # Payloads have a fourth item, the priority, when num_priorities is set
+                args, kwargs, queued_at = payload[:3]
                 try:
-                    result = target(*args, **kwargs)
+                    result = self._call_target(target, args, kwargs, queued_at)
+                    if inspect.isgenerator(result):
+                        # Produce the items on this thread, and let the result thread pass them on as they come.
+                        # A bounded result_queue holds the generator back until downstream catches up
+                        for item in result:
+                            self.result_queue.put(_StreamedItem(item))
+                        result = _UNCHANGED
                 except Exception as e:
-                    self.node.logger.error('AsyncWorker failed to execute target %s:'%str(target), str(e))
+                    self.node.logger.error('AsyncWorker failed to execute target %s: %s', str(target), str(e))
                     self.node.logger.error(traceback.format_exc())
+                    self._finished()
                 else:
                     self.result_queue.put(result)
+                finally:
                     self.worker_queue.task_done()
 
     def _result_handler(self):
@@ -250,11 +810,459 @@ class AsyncWorker(Worker):
             if isinstance(payload, PoisonPill):
                 self.result_queue.task_done()
                 return
+            elif isinstance(payload, _StreamedItem):
+                self._handle_result(payload.item)
+                self.result_queue.task_done()
             else:
                 result = payload
                 self._handle_result(result)
+                self._finished()
+                self.result_queue.task_done()
+
+
+class BatchWorker(AsyncWorker):
+    """ Groups queued inputs into batches and calls the target once per batch.
+
+    A worker thread takes up to max_batch_size inputs from worker_queue,
+    waiting at most max_batch_wait seconds after the first one arrives.
+    The target is called with one list per reactive argument, e.g. a target
+    f(xs, ys) receives the x values and the y values of the whole batch.
+    Passive (keyword) arguments are taken from the newest input in the batch.
+
+    The target must return one result per input, in order. Each result is
+    handled, and sent to the output port, individually.
+    """
+
+    __slots__ = ('max_batch_size', 'max_batch_wait')
+
+    def __init__(self, node, num_threads=1, max_batch_size=100, max_batch_wait=0.01,
+                 max_queue_size=0, overflow_policy=BLOCK):
+        super(BatchWorker, self).__init__(node,
+                                          async_class=Thread,
+                                          num_threads=num_threads,
+                                          max_queue_size=max_queue_size,
+                                          overflow_policy=overflow_policy)
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+
+    def _worker(self):
+        target = self._get_target_func()
+        while True:
+            payloads, is_stopping = self._next_batch()
+            if payloads:
+                try:
+                    self._execute_batch(target, payloads)
+                finally:
+                    for _ in payloads:
+                        self.worker_queue.task_done()
+            if is_stopping:
+                return
+
+    def _next_batch(self):
+        """ Returns the payloads of the next batch, and whether a PoisonPill was received """
+        payloads = []
+        payload = self.worker_queue.get()
+        deadline = time.time() + self.max_batch_wait
+        while True:
+            if isinstance(payload, PoisonPill):
+                self.worker_queue.task_done()
+                return payloads, True
+
+            payloads.append(payload)
+            timeout = deadline - time.time()
+            if len(payloads) >= self.max_batch_size or timeout <= 0:
+                return payloads, False
+
+            try:
+                payload = self.worker_queue.get(timeout=timeout)
+            except Empty:
+                return payloads, False
+
+    def _execute_batch(self, target, payloads):
+        columns = [list(column) for column in zip(*(args for args, _, _ in payloads))]
+        _, kwargs, _ = payloads[-1]
+        queued_at = min(queued_at for _, _, queued_at in payloads)
+        try:
+            results = list(self._call_target(target, columns, kwargs, queued_at, num_items=len(payloads)))
+        except Exception as e:
+            self.node.logger.error('BatchWorker failed to execute target %s: %s', str(target), str(e))
+            self.node.logger.error(traceback.format_exc())
+            return
+
+        if len(results) != len(payloads):
+            self.node.logger.error('BatchWorker target %s returned %i results for a batch of %i inputs',
+                                   str(target), len(results), len(payloads))
+            return
+
+        for result in results:
+            self.result_queue.put(result)
+
+
+class ProcessWorker(AsyncWorker):
+    """ Runs the target in a pool of worker processes.
+
+    Only the target and the (args, kwargs) of each call are sent to the
+    child processes. Results come back over result_queue and are handled
+    by a thread in the parent, so downstream nodes run in the parent process.
+    The target (or target_class) must be picklable.
+
+    If shared_memory_threshold is set, bytes, bytearray, memoryview and NumPy
+    arguments and results of at least that many bytes are passed through
+    shared memory rather than pickled. See colony.transport.
+
+    Execution times are measured in the child processes, but targets are
+    not profiled there.
+    """
+
+    __slots__ = ('target_func', 'shared_memory_threshold', 'transport')
+
+    def __init__(self, node, num_processes=10, max_queue_size=0, overflow_policy=BLOCK, shared_memory_threshold=None,
+                 conflate=False):
+        super(ProcessWorker, self).__init__(node,
+                                            async_class=Process,
+                                            num_threads=num_processes,
+                                            max_queue_size=max_queue_size,
+                                            overflow_policy=overflow_policy,
+                                            conflate=conflate)
+        self.target_func = node.target_func
+        self.shared_memory_threshold = shared_memory_threshold
+        self.transport = None
+        if shared_memory_threshold is not None:
+            self.transport = SharedMemoryTransport(shared_memory_threshold)
+
+    def start(self):
+        self.worker_queue = multiprocessing.JoinableQueue(self.max_queue_size)
+        self.result_queue = multiprocessing.JoinableQueue(self.max_queue_size)
+        target_spec = (self.target_func, self.target_class, self.target_class_args, self.target_class_kwargs)
+        self.worker_threads = [
+            Process(target=_process_worker, args=(self.worker_queue,
+                                                  self.result_queue,
+                                                  target_spec,
+                                                  self.node.logger,
+                                                  self.shared_memory_threshold))
+            for _ in range(self.num_threads)
+        ]
+        for process in self.worker_threads:
+            process.start()
+
+        self.result_thread = Thread(target=self._result_handler, daemon=True)
+        self.result_thread.start()
+
+    def _result_handler(self):
+        while True:
+            payload = self.result_queue.get()
+            if isinstance(payload, PoisonPill):
+                self.result_queue.task_done()
+                return
+            else:
+                is_ok, result, released, timings = payload
+                if self.transport:
+                    self.transport.free(released)
+                if isinstance(result, _EndOfStream):
+                    pass
+                elif is_ok:
+                    if self.transport:
+                        result = self.transport.unpack_result(result)
+                    self._handle_result(result)
+                else:
+                    self.node.logger.error('ProcessWorker failed to execute target: %s', result)
+                # Items streamed from a generator target come without timings, ahead of the end of the call
+                if timings is not None:
+                    self.metrics.record_call(*timings, is_error=not is_ok)
+                    self._finished()
                 self.result_queue.task_done()
 
+    def submit(self, args, kwargs, priority=None):
+        if self.transport:
+            args, kwargs = self.transport.pack_call(args, kwargs)
+        super(ProcessWorker, self).submit(args, kwargs, priority)
+
+    def stop(self, drain=True, timeout=None):
+        report = super(ProcessWorker, self).stop(drain=drain, timeout=timeout)
+        if self.transport:
+            self.transport.free_all()
+        return report
+
+    def _abandon_workers(self):
+        for process in self.worker_threads:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    def _on_discarded(self, payload):
+        if self.transport:
+            args, kwargs, _ = payload
+            for value in args + tuple(kwargs.values()):
+                self.transport.free_value(value)
+
+
+def _process_worker(worker_queue, result_queue, target_spec, logger, shared_memory_threshold=None):
+    """ Entry point of the ProcessWorker child processes """
+    target_func, target_class, target_class_args, target_class_kwargs = target_spec
+    if target_func:
+        target = target_func
+    else:
+        target_instance = target_class(*target_class_args, **target_class_kwargs.copy())
+        target_instance.logger = logger
+        target = target_instance.execute
+
+    transport = None
+    if shared_memory_threshold is not None:
+        transport = SharedMemoryTransport(shared_memory_threshold)
+
+    while True:
+        payload = worker_queue.get()
+        if isinstance(payload, PoisonPill):
+            worker_queue.task_done()
+            return
+        else:
+            started_at = time.time()
+            is_ok, result = _call_in_child(target, payload, transport)
+            if is_ok and inspect.isgenerator(result):
+                is_ok, result = _stream_from_child(result, result_queue, transport)
+            timings = (started_at, time.time(), payload[2])
+            released = ()
+            if transport:
+                # Acknowledge the argument blocks, so that the parent can free them
+                released = transport.release()
+                if is_ok:
+                    try:
+                        result = transport.pack_result(result)
+                    except Exception:
+                        is_ok, result = False, traceback.format_exc()
+            result_queue.put((is_ok, result, released, timings))
+            worker_queue.task_done()
+
+
+def _stream_from_child(stream, result_queue, transport):
+    """ Send each item of a generator target to the parent. Returns (is_ok, the result ending the call) """
+    try:
+        for item in stream:
+            if transport:
+                item = transport.pack_result(item)
+            result_queue.put((True, item, (), None))
+    except Exception:
+        return False, traceback.format_exc()
+    return True, _EndOfStream()
+
+
+def _call_in_child(target, payload, transport):
+    args, kwargs, _ = payload
+    if transport:
+        args, kwargs = transport.unpack_call(args, kwargs)
+    try:
+        return True, target(*args, **kwargs)
+    except Exception:
+        return False, traceback.format_exc()
+
+
+class PooledWorker(Worker):
+    """ Executes the target on a SharedExecutor, which other nodes share.
+
+    At most max_concurrency calls of this node run at once (no limit if None),
+    and weight sets its share of the executor's threads when nodes compete
+    for them. Results are handled one at a time, in the order the calls finish.
+    A target_class is instantiated once and shared by the concurrent calls.
+    """
+
+    __slots__ = ('executor', 'lane', 'target', 'result_lock', 'num_dropped')
+
+    def __init__(self, node, executor, max_concurrency=None, weight=1):
+        super(PooledWorker, self).__init__(node)
+        self.executor = executor
+        self.lane = executor.add_lane(name=node.name, weight=weight, max_concurrency=max_concurrency)
+        self.target = None
+        self.result_lock = Lock()
+        self.num_dropped = 0
+
+    def start(self):
+        self.target = self._get_target_func()
+        # Normally started by the Graph, before its nodes
+        self.executor.start()
+
+    def stop(self, drain=True, timeout=None):
+        num_dropped = 0
+        if not drain:
+            num_dropped += self._discard()
+        timed_out = not self.executor.wait_idle(self.lane, timeout)
+        if timed_out:
+            num_dropped += self._discard()
+            self.node.logger.warning('%s did not stop within the timeout', self.node)
+        return {'dropped': num_dropped, 'timed_out': timed_out}
+
+    def join(self):
+        self.executor.wait_idle(self.lane)
+
+    def execute(self, *args, **kwargs):
+        self.metrics.record_submitted()
+        self.executor.submit(self.lane, functools.partial(self._run, args, kwargs, time.time()))
+
+    def queue_stats(self):
+        return {
+            'queue_depth': len(self.lane.tasks),
+            'running': self.lane.num_running,
+            'max_concurrency': self.lane.max_concurrency,
+            'dropped': self.num_dropped,
+        }
+
+    def _run(self, args, kwargs, queued_at):
+        try:
+            result = self._call_target(self.target, args, kwargs, queued_at)
+        except Exception as e:
+            self.node.logger.error('PooledWorker failed to execute target %s: %s', str(self.target), str(e))
+            self.node.logger.error(traceback.format_exc())
+            return
+        if not inspect.isgenerator(result):
+            result = (result, )
+        try:
+            # A generator target produces its items outside the lock, so other calls can pass on their results
+            for item in result:
+                with self.result_lock:
+                    self._handle_result(item)
+        except Exception as e:
+            self.node.logger.error('PooledWorker failed to stream from target %s: %s', str(self.target), str(e))
+            self.node.logger.error(traceback.format_exc())
+
+    def _discard(self):
+        num_discarded = len(self.executor.discard(self.lane))
+        self.metrics.record_dropped(num_discarded)
+        self.num_dropped += num_discarded
+        return num_discarded
+
+
+class AsyncioWorker(Worker):
+    """ Runs the target as a task on an asyncio event loop.
+
+    The target may be a coroutine function, which is awaited on the loop, or a
+    plain function, which is run in the loop's default executor. At most
+    max_concurrency calls are in progress at once. Results are handled on the
+    event loop thread. Targets are timed, but not profiled.
+
+    An async generator target is iterated on the loop, and a generator target
+    in the executor, passing on each item as it is produced.
+
+    If no event_loop_thread is given, the worker starts and stops its own.
+    """
+
+    __slots__ = ('max_concurrency', 'event_loop_thread', 'owns_event_loop_thread', 'target', 'semaphore', 'num_pending',
+                 'futures', 'pending_condition')
+
+    def __init__(self, node, max_concurrency=100, event_loop_thread=None):
+        super(AsyncioWorker, self).__init__(node)
+
+        self.max_concurrency = max_concurrency
+        self.event_loop_thread = event_loop_thread
+        self.owns_event_loop_thread = event_loop_thread is None
+
+        self.target = None
+        self.semaphore = None
+        self.num_pending = 0
+        self.futures = set()
+        self.pending_condition = Condition()
+
+    def start(self):
+        if self.owns_event_loop_thread:
+            self.event_loop_thread = EventLoopThread()
+        self.event_loop_thread.start()
+        self.target = self._get_target_func()
+
+    def stop(self, drain=True, timeout=None):
+        num_dropped = 0
+        if not drain:
+            num_dropped += self._cancel_pending()
+        timed_out = not self.join(timeout)
+        if timed_out:
+            num_dropped += self._cancel_pending()
+            self.node.logger.warning('%s did not stop within the timeout', self.node)
+        if self.owns_event_loop_thread:
+            self.event_loop_thread.stop()
+        return {'dropped': num_dropped, 'timed_out': timed_out}
+
+    def join(self, timeout=None):
+        """ Wait for the pending calls to finish. Returns False if timeout ran out first """
+        with self.pending_condition:
+            return self.pending_condition.wait_for(lambda: not self.num_pending, timeout)
+
+    def execute(self, *args, **kwargs):
+        # Counted before submitting, since the call may finish before submit returns
+        with self.pending_condition:
+            self.num_pending += 1
+        coro = self._run(args, kwargs, time.time())
+        try:
+            future = self.event_loop_thread.submit(coro)
+        except BaseException:
+            # e.g. the worker has not been started
+            coro.close()
+            with self.pending_condition:
+                self.num_pending -= 1
+                self.pending_condition.notify_all()
+            raise
+        self.metrics.record_submitted()
+        with self.pending_condition:
+            self.futures.add(future)
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        if future.cancelled():
+            self.metrics.record_dropped()
+        with self.pending_condition:
+            self.futures.discard(future)
+            self.num_pending -= 1
+            self.pending_condition.notify_all()
+
+    def _cancel_pending(self):
+        with self.pending_condition:
+            futures = list(self.futures)
+        return sum(1 for future in futures if future.cancel())
+
+    async def _run(self, args, kwargs, queued_at):
+        # Created lazily so that it belongs to the running loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        try:
+            async with self.semaphore:
+                started_at = time.time()
+                try:
+                    result = await self._await_target(args, kwargs)
+                    if inspect.isasyncgen(result) or inspect.isgenerator(result):
+                        await self._stream(result)
+                        result = _UNCHANGED
+                except Exception:
+                    self.metrics.record_call(started_at, time.time(), queued_at, is_error=True)
+                    raise
+                self.metrics.record_call(started_at, time.time(), queued_at)
+            self._handle_result(result)
+        except Exception as e:
+            self.node.logger.error('AsyncioWorker failed to execute target %s: %s', str(self.target), str(e))
+            self.node.logger.error(traceback.format_exc())
+
+    async def _await_target(self, args, kwargs):
+        if asyncio.iscoroutinefunction(self.target):
+            return await self.target(*args, **kwargs)
+        if inspect.isasyncgenfunction(self.target):
+            return self.target(*args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, functools.partial(self.target, *args, **kwargs))
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _stream(self, stream):
+        if inspect.isasyncgen(stream):
+            async for item in stream:
+                self._handle_result(item)
+            return
+
+        # Iterating a plain generator runs its code, so do it in the executor rather than blocking the loop
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await loop.run_in_executor(None, next, stream, _NO_RESULT)
+            if item is _NO_RESULT:
+                return
+            self._handle_result(item)
+
 
 class Node(object):
     def __init__(self,
@@ -270,6 +1278,16 @@ class Node(object):
                  node_worker_class=None,
                  node_worker_class_args=None,
                  node_worker_class_kwargs=None,
+                 timeout=None,
+                 retry=None,
+                 circuit_breaker=None,
+                 memoize=False,
+                 cache_size=1000,
+                 cache_ttl=None,
+                 cache_key=None,
+                 suppress_unchanged=False,
+                 distinct_until_changed=False,
+                 lazy=False,
                  logger=None):
 
         self.target_func = target_func
@@ -279,6 +1297,19 @@ class Node(object):
         self.target_instance = None
         self.logger = logger or get_logger()
 
+        # When set, results equal to the previous result are not sent downstream.
+        # True compares results with ==, or pass a function returning the key to compare
+        self.distinct_until_changed = distinct_until_changed
+
+        # A lazy node only marks itself dirty when its inputs change, and
+        # computes when its value is read. See refresh
+        self.lazy = lazy
+        self.is_dirty = False
+        self.dirty_sources = set()
+        self.lazy_consumers = []
+        self.computes_eagerly = True
+        self.refresh_lock = Lock()
+
         if target_func and target_class is None:
             target_info = FunctionInfo(target_func)
             num_reactive_input_ports = target_info.num_args
@@ -305,13 +1336,18 @@ class Node(object):
                 rip = ArgInputPort(i, self)
                 self.reactive_input_ports.append(rip)
 
+        # Inputs may arrive from several threads at once. The values are never
+        # modified in place: each update swaps in a new tuple (or dict) under
+        # input_lock, so an execution sees a consistent snapshot of them.
+        self.input_lock = Lock()
         if default_reactive_input_values:
-            self.reactive_input_values = default_reactive_input_values
+            self.reactive_input_values = tuple(default_reactive_input_values)
         else:
-            self.reactive_input_values = [None] * len(self.reactive_input_ports)
+            self.reactive_input_values = (None, ) * len(self.reactive_input_ports)
 
         if node_args:
-            if isinstance(node_args, Node):
+            if hasattr(node_args, 'output_port'):
+                # A single Node, or anything else with an output port, such as a RemoteSource
                 node_args = [node_args]
             for i, node_arg in enumerate(node_args):
                 try:
@@ -344,7 +1380,52 @@ class Node(object):
                     raise
 
         self._value = None
+        self.scheduler = None
         self.worker = self._build_node_worker(node_worker_class, node_worker_class_args, node_worker_class_kwargs)
+        if lazy and not isinstance(self.worker, SyncWorker):
+            raise ValueError('lazy is only supported by nodes with a SyncWorker')
+        if timeout is not None or retry is not None or circuit_breaker is not None:
+            self.set_policy(timeout=timeout, retry=retry, circuit_breaker=circuit_breaker)
+        if memoize:
+            self.set_cache(cache_size=cache_size, cache_ttl=cache_ttl, cache_key=cache_key,
+                           suppress_unchanged=suppress_unchanged)
+
+    def set_policy(self, timeout=None, retry=None, circuit_breaker=None):
+        """ Protect the node from a slow or failing target.
+
+        timeout         - seconds after which a call fails with CallTimeoutError
+        retry           - a RetryPolicy, or the maximum number of attempts
+        circuit_breaker - a CircuitBreaker, or True for the default one
+
+        Supported by sync, thread and batch workers. See colony.policies
+        """
+        if isinstance(self.worker, (ProcessWorker, AsyncioWorker)):
+            raise ValueError('%s does not support timeout, retry or circuit_breaker' % type(self.worker).__name__)
+        if isinstance(retry, int):
+            retry = RetryPolicy(max_attempts=retry)
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        self.worker.policy = CallPolicy(timeout=timeout, retry=retry, circuit_breaker=circuit_breaker)
+
+    def set_cache(self, cache_size=1000, cache_ttl=None, cache_key=None, suppress_unchanged=False):
+        """ Memoize the target, which must be a pure function of its inputs.
+
+        Results are cached by the reactive and passive input values, keeping
+        the cache_size most recently used, each for at most cache_ttl seconds.
+        Calls with unhashable inputs are not cached, unless cache_key is given:
+        a function of (args, kwargs) returning a hashable key, or None to skip
+        the cache. With suppress_unchanged, a cache hit for the same inputs as
+        the previous call is not sent downstream, since nothing has changed.
+
+        Supported by sync and thread workers. Batch workers call the target
+        with a batch of inputs at a time, so are not. Hit and miss counts are
+        in Node.stats()['cache']
+        """
+        if isinstance(self.worker, (ProcessWorker, AsyncioWorker, BatchWorker)):
+            raise ValueError('%s does not support memoize' % type(self.worker).__name__)
+        self.worker.cache = LRUCache(max_size=cache_size, ttl=cache_ttl)
+        self.worker.cache_key = cache_key or make_key
+        self.worker.suppress_unchanged = suppress_unchanged
 
     def _build_node_worker(self, node_worker_class, node_worker_class_args, node_worker_class_kwargs):
         node_worker_class = node_worker_class or SyncWorker
@@ -359,34 +1440,114 @@ class Node(object):
         else:
             return '<%s>' % class_name
 
-    def notify(self, data=None, port_idx=0):
+    def notify(self, data=None, port_idx=0, priority=None):
         if data is None:
-            self.handle_input(data, None, None)
+            self.handle_input(data, None, None, priority=priority)
         else:
-            self.reactive_input_ports[port_idx].notify(data)
+            self.reactive_input_ports[port_idx].notify(data, priority=priority)
 
-    def notify_items(self, lst, port_idx=0):
+    def notify_items(self, lst, port_idx=0, priority=None):
         port = self.reactive_input_ports[port_idx]
         for data in lst:
-            port.notify(data)
+            port.notify(data, priority=priority)
 
     def get_value(self):
+        self.refresh()
         return self._value
 
     def set_value(self, value):
         self._value = value
 
-    def handle_input(self, data=None, idx=None, kwarg=None):
+    def refresh(self):
+        """ If this lazy node is dirty, compute it on its latest inputs, refreshing its dirty sources first.
 
-        if kwarg is not None:
-            self.passive_input_values[kwarg] = data
+        A lazy node with an eager consumer downstream, such as an eager node
+        or any other observer, computes on every input as usual, since that
+        consumer needs every value. Otherwise an input only marks the node,
+        and the lazy nodes downstream of it, dirty. Reading the value of a
+        dirty node pulls the values of the lazy nodes upstream of it, then
+        computes it once on the latest inputs, skipping intermediate ones.
+        Which nodes compute eagerly is decided when they start.
+        """
+        if not self.is_dirty:
+            return
+        with self.refresh_lock:
+            if not self.is_dirty:
+                return
+            for source in list(self.dirty_sources):
+                source.refresh()
+            # Cleared after pulling the sources, whose new values mark this node dirty,
+            # but before computing, so that an input arriving meanwhile marks it dirty again
+            self.is_dirty = False
+            self.dirty_sources = set()
+            self.execute()
+
+    def _mark_dirty(self, source=None):
+        if source is not None:
+            self.dirty_sources.add(source)
+        if self.is_dirty:
+            # The lazy consumers were marked when this node became dirty
             return
+        self.is_dirty = True
+        for node in self.lazy_consumers:
+            node._mark_dirty(self)
+
+    def _consumers(self):
+        """ The nodes observing the output port, with None for any other kind of observer """
+        return [observer.node if isinstance(observer, InputPort) else None for observer in self.output_port.observers]
+
+    def _has_eager_consumer(self, visited):
+        for node in self._consumers():
+            if node is None or not node.lazy:
+                return True
+            if node not in visited:
+                visited.add(node)
+                if node._has_eager_consumer(visited):
+                    return True
+        return False
+
+    def handle_input(self, data=None, idx=None, kwarg=None, conflate=True, priority=None):
+
+        with self.input_lock:
+            if kwarg is not None:
+                passive_input_values = dict(self.passive_input_values)
+                passive_input_values[kwarg] = data
+                self.passive_input_values = passive_input_values
+                return
+
+            if idx is not None:
+                self._set_reactive_input(idx, data)
+
+            inputs = (self.reactive_input_values, self.passive_input_values)
+
+        if not self.computes_eagerly:
+            self._mark_dirty()
+        elif self.scheduler is None:
+            self.execute(inputs, priority)
+        elif conflate:
+            self.scheduler.schedule(self)
+        else:
+            # Every item from a mapping or batching port must run,
+            # so keep the snapshot of the inputs for this execution
+            self.scheduler.schedule(self, inputs)
 
-        if idx is not None:
-            self.reactive_input_values[idx] = data
+    def _set_reactive_input(self, idx, data):
+        """ Store data as the value of reactive input idx. Called with input_lock held """
+        values = self.reactive_input_values
+        self.reactive_input_values = values[:idx] + (data, ) + values[idx + 1:]
+
+    def input_snapshot(self):
+        """ The current (reactive_input_values, passive_input_values), taken together """
+        with self.input_lock:
+            return self.reactive_input_values, self.passive_input_values
+
+    def execute(self, inputs=None, priority=None):
+        if inputs is None:
+            inputs = self.input_snapshot()
+        args, kwargs = inputs
 
         try:
-            self.worker.execute(*self.reactive_input_values, **self.passive_input_values)
+            self.worker.submit(args, kwargs, priority)
         except Exception as e:
             self.logger.error('Failed to execute worker: %s', str(e))
             self.logger.error(traceback.format_exc())
@@ -395,23 +1556,66 @@ class Node(object):
         self.set_value(result)
         self.output_port.notify(result)
 
+    def stats(self):
+        """ Call and error counts, in-flight count, and execution and queue wait time percentiles """
+        return self.worker.stats()
+
+    def enable_profiling(self):
+        """ Run the target under cProfile from now on. See profile_stats """
+        if self.worker.profiler is None:
+            self.worker.profiler = NodeProfiler()
+
+    def disable_profiling(self):
+        self.worker.profiler = None
+
+    def profile_stats(self):
+        """ The pstats.Stats collected since profiling was enabled, or None """
+        if self.worker.profiler is None:
+            return None
+        return self.worker.profiler.stats()
+
     def start(self):
+        if self.lazy:
+            self.computes_eagerly = self._has_eager_consumer(set())
+            self.lazy_consumers = [node for node in self._consumers() if node is not None and node.lazy]
         self.worker.start()
 
-    def stop(self):
-        self.worker.stop()
+    def stop(self, drain=True, timeout=None):
+        """ Returns {'dropped': number of inputs dropped, 'timed_out': bool}. See Graph.stop """
+        return self.worker.stop(drain=drain, timeout=timeout)
 
 
 class PersistentNode(Node):
-    """ This Node's value will persist between different instance lifetimes """
+    """ This Node's value will persist between different instance lifetimes
 
-    def __init__(self, folder=None, *args, **kwargs):
+    Pass write_behind=True to save the value from a background thread instead
+    of on every update. See PersistentVariable for flush_interval, flush_threshold
+    and the choice of serializer.
+    """
+
+    def __init__(self, folder=None, write_behind=False, flush_interval=1.0, flush_threshold=None,
+                 serializer=None, *args, **kwargs):
         super(PersistentNode, self).__init__(*args, **kwargs)
         variable_name = self.name or get_temporary_filename()
-        self.persistent_value = PersistentVariable(variable_name, folder=folder)
+        self.persistent_value = self._build_persistent_value(variable_name,
+                                                             folder=folder,
+                                                             write_behind=write_behind,
+                                                             flush_interval=flush_interval,
+                                                             flush_threshold=flush_threshold,
+                                                             serializer=serializer,
+                                                             logger=self.logger)
         self.persistent_value.refresh()
 
+    def _build_persistent_value(self, variable_name, **kwargs):
+        return PersistentVariable(variable_name, **kwargs)
+
+    def stop(self, drain=True, timeout=None):
+        report = super(PersistentNode, self).stop(drain=drain, timeout=timeout)
+        self.persistent_value.close()
+        return report
+
     def get_value(self):
+        self.refresh()
         return self.persistent_value.get_value()
 
     def set_value(self, value):
@@ -419,70 +1623,216 @@ class PersistentNode(Node):
 
 
 class DictionaryNode(PersistentNode):
+    """ Remembers a dictionary, changed by ('update', {key: value}) and ('delete', keys) inputs
+
+    Each change is sent downstream as a DictDelta: a read-only view of the
+    whole dictionary, with the keys added, updated and removed by the change.
+    """
+
     def __init__(self, *args, **kwargs):
         super(DictionaryNode, self).__init__(target_func=self.remember_dict, *args, **kwargs)
         value = self.get_value()
         if not value:
-            print('Setting to empty dict')
+            self.logger.debug('Setting %s to empty dict', self)
             self.set_value(dict())
         else:
-            print('Value had existing value of %s' % value)
+            self.logger.debug('%s has %i existing items', self, len(value))
+
+    def set_value(self, value):
+        if isinstance(value, DictDelta):
+            value = value.state
+        super(DictionaryNode, self).set_value(value)
 
     def remember_dict(self, payload):
         action, data = payload
         if action == 'update':
             value = self.get_value()
-            print('Updating %s with %s' % (value, data))
+            self.logger.debug('Updating %s with %i items', self, len(data))
+            delta = DictDelta.for_update(value, data)
             value.update(data)
-            return value
+            return delta
         elif action == 'delete':
             value = self.get_value()
             if not isinstance(data, (list, tuple, set)):
                 data = (data,)
-            for x in data:
-                if x in value:
-                    value.pop(x)
-            return value
+            delta = DictDelta.for_delete(value, data)
+            for x in delta.removed:
+                value.pop(x)
+            return delta
+        else:
+            raise ValueError('action %s not recognised' % action)
+
+
+class JournalDictionaryNode(DictionaryNode):
+    """ A DictionaryNode that saves each update or delete to an append-only journal
+
+    Unlike DictionaryNode, which rewrites the whole dictionary on every change,
+    the cost of a change is proportional to its size. The journal is compacted
+    into a snapshot every compact_threshold changes.
+    """
+
+    def __init__(self, compact_threshold=1000, *args, **kwargs):
+        self.compact_threshold = compact_threshold
+        super(JournalDictionaryNode, self).__init__(*args, **kwargs)
+
+    def _build_persistent_value(self, variable_name, folder=None, serializer=None, logger=None, **kwargs):
+        return JournalDictionary(variable_name,
+                                 folder=folder,
+                                 compact_threshold=self.compact_threshold,
+                                 serializer=serializer,
+                                 logger=logger)
+
+    def set_value(self, value):
+        if isinstance(value, DictDelta):
+            value = value.state
+        # remember_dict has already journaled changes to the stored dict
+        if value is not self.persistent_value.get_value():
+            self.persistent_value.set_value(value)
+
+    def remember_dict(self, payload):
+        action, data = payload
+        value = self.get_value()
+        if action == 'update':
+            delta = DictDelta.for_update(value, data)
+            self.persistent_value.update(data)
+        elif action == 'delete':
+            if not isinstance(data, (list, tuple, set)):
+                data = (data,)
+            delta = DictDelta.for_delete(value, data)
+            self.persistent_value.delete(data)
         else:
             raise ValueError('action %s not recognised' % action)
+        return delta
 
 
 class AsyncNode(Node):
-    def __init__(self, target_func=None, async_class=Thread, num_threads=10, *args, **kwargs):
+    def __init__(self, target_func=None, async_class=Thread, num_threads=10, max_queue_size=0,
+                 overflow_policy=BLOCK, conflate=False, *args, **kwargs):
+        node_worker_class_kwargs = {'max_queue_size': max_queue_size,
+                                    'overflow_policy': overflow_policy,
+                                    'conflate': conflate}
+        if async_class == Process:
+            node_worker_class = ProcessWorker
+            node_worker_class_args = ()
+            node_worker_class_kwargs['num_processes'] = num_threads
+        else:
+            node_worker_class = AsyncWorker
+            node_worker_class_args = (async_class,)
+            node_worker_class_kwargs['num_threads'] = num_threads
+
         super(AsyncNode, self).__init__(
             target_func=target_func,
-            node_worker_class=AsyncWorker,
-            node_worker_class_args=(async_class,),
-            node_worker_class_kwargs={'num_threads': num_threads},
+            node_worker_class=node_worker_class,
+            node_worker_class_args=node_worker_class_args,
+            node_worker_class_kwargs=node_worker_class_kwargs,
             *args,
             **kwargs
         )
 
 
 class ProcessNode(Node):
-    def __init__(self, target_func=None, num_threads=10, *args, **kwargs):
+    def __init__(self, target_func=None, num_threads=10, max_queue_size=0, overflow_policy=BLOCK,
+                 shared_memory_threshold=None, conflate=False, *args, **kwargs):
         super(ProcessNode, self).__init__(
             target_func=target_func,
-            node_worker_class=AsyncWorker,
-            node_worker_class_args=(Process,),
-            node_worker_class_kwargs={'num_threads': num_threads},
+            node_worker_class=ProcessWorker,
+            node_worker_class_kwargs={'num_processes': num_threads,
+                                      'max_queue_size': max_queue_size,
+                                      'overflow_policy': overflow_policy,
+                                      'shared_memory_threshold': shared_memory_threshold,
+                                      'conflate': conflate},
+            *args,
+            **kwargs
+        )
+
+
+class BatchNode(Node):
+    def __init__(self, target_func=None, num_threads=1, max_batch_size=100, max_batch_wait=0.01,
+                 max_queue_size=0, overflow_policy=BLOCK, *args, **kwargs):
+        super(BatchNode, self).__init__(
+            target_func=target_func,
+            node_worker_class=BatchWorker,
+            node_worker_class_kwargs={'num_threads': num_threads,
+                                      'max_batch_size': max_batch_size,
+                                      'max_batch_wait': max_batch_wait,
+                                      'max_queue_size': max_queue_size,
+                                      'overflow_policy': overflow_policy},
+            *args,
+            **kwargs
+        )
+
+
+class PooledNode(Node):
+    """ A node whose target runs on a SharedExecutor. See PooledWorker """
+
+    def __init__(self, target_func=None, executor=None, num_threads=None, weight=1, *args, **kwargs):
+        super(PooledNode, self).__init__(
+            target_func=target_func,
+            node_worker_class=PooledWorker,
+            node_worker_class_kwargs={'executor': executor,
+                                      'max_concurrency': num_threads,
+                                      'weight': weight},
+            *args,
+            **kwargs
+        )
+
+
+class AsyncioNode(Node):
+    def __init__(self, target_func=None, max_concurrency=100, event_loop_thread=None, *args, **kwargs):
+        super(AsyncioNode, self).__init__(
+            target_func=target_func,
+            node_worker_class=AsyncioWorker,
+            node_worker_class_kwargs={'max_concurrency': max_concurrency,
+                                      'event_loop_thread': event_loop_thread},
             *args,
             **kwargs
         )
 
 
 class ThreadNode(Node):
-    def __init__(self, target_func=None, num_threads=10, *args, **kwargs):
+    def __init__(self, target_func=None, num_threads=10, max_queue_size=0, overflow_policy=BLOCK, conflate=False,
+                 num_priorities=None, starvation_limit=10, *args, **kwargs):
         super(ThreadNode, self).__init__(
             target_func=target_func,
             node_worker_class=AsyncWorker,
             node_worker_class_args=(Thread,),
-            node_worker_class_kwargs={'num_threads': num_threads},
+            node_worker_class_kwargs={'num_threads': num_threads,
+                                      'max_queue_size': max_queue_size,
+                                      'overflow_policy': overflow_policy,
+                                      'conflate': conflate,
+                                      'num_priorities': num_priorities,
+                                      'starvation_limit': starvation_limit},
             *args,
             **kwargs
         )
 
 
+def _deadline(timeout):
+    return None if timeout is None else time.time() + timeout
+
+
+def _remaining(deadline):
+    """ Seconds until deadline, or None to wait indefinitely """
+    return None if deadline is None else max(deadline - time.time(), 0)
+
+
+def _join_all(threads, deadline):
+    """ Join threads (or processes) until deadline. Returns True if they all stopped """
+    for thread in threads:
+        thread.join(_remaining(deadline))
+    return not any(thread.is_alive() for thread in threads)
+
+
+def _queue_size(queue):
+    if queue is None:
+        return 0
+    try:
+        return queue.qsize()
+    except NotImplementedError:
+        # multiprocessing queues do not support qsize on macOS
+        return None
+
+
 def _get_queue_class(async_class):
     if async_class == Thread:
         return Queue
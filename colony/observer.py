@@ -9,16 +9,24 @@ from threading import Thread
 
 
 class Observable(object):
+    """ Notifies its observers in the order they registered.
+
+    The observers are kept in a tuple, replaced whenever one registers, so
+    notifying iterates a tuple without taking a lock or copying.
+    """
+
+    __slots__ = ('_observers', )
 
     def __init__(self):
-        self._observers = set()
+        self._observers = ()
 
     @property
     def observers(self):
         return self._observers
 
     def register_observer(self, observer):
-        self._observers.add(observer)
+        if observer not in self._observers:
+            self._observers = self._observers + (observer, )
 
     def notify_observers(self, event=None):
         for obs in self._observers:
@@ -26,6 +34,7 @@ class Observable(object):
 
 
 class Observer(object):
+    __slots__ = ()
 
     def notify(self, event):
         raise NotImplementedError()
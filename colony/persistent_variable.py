@@ -1,34 +1,294 @@
-import json
+import atexit
 import os
+import struct
 import tempfile
+from threading import Condition, Lock, Thread
+
+from colony.serializers import SerializationError, get_serializer
+from colony.utils.logging import get_logger
 
 DEFAULT_FOLDER = tempfile.gettempdir()
 
+# The length of each journal record of a binary serializer
+_RECORD_HEADER = struct.Struct('>I')
+
+# Write-behind variables that still need a final flush when the interpreter exits
+_open_write_behind_variables = set()
+
 
 class PersistentVariable(object):
-    def __init__(self, name, folder):
+    """ A value that is saved to a file, and reloaded from it by later instances.
+
+    By default every set_value rewrites the file. With write_behind=True the
+    value is kept in memory and a background thread writes it out every
+    flush_interval seconds, or as soon as flush_threshold updates are
+    pending, so intermediate values are coalesced. Call close() to write
+    the final value.
+
+    Files are written to a temporary file, which is synced to disk before it
+    is renamed into place, and the rename is then synced too. So neither a
+    crash nor a power loss leaves an empty or partially written file behind:
+    the file holds either the previous value or the new one.
+
+    serializer is a Serializer or one of 'json' (the default), 'pickle',
+    'msgpack' or 'numpy'. See colony.serializers.
+    """
+
+    def __init__(self, name, folder, write_behind=False, flush_interval=1.0, flush_threshold=None,
+                 serializer=None, logger=None):
         self.name = name
         self.folder = folder or DEFAULT_FOLDER
         self.path = os.path.join(self.folder, name)
         self.value = None
+        self.serializer = get_serializer(serializer)
+        self.logger = logger or get_logger()
+
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.num_dirty = 0
+        self.is_closing = False
+        self.lock = Lock()
+        self.write_lock = Lock()
+        self.flush_condition = Condition(self.lock)
+        self.flush_thread = None
+
         self.refresh()
 
+        if write_behind:
+            self.flush_thread = Thread(target=self._flush_loop, daemon=True)
+            self.flush_thread.start()
+            _open_write_behind_variables.add(self)
+
     def refresh(self):
         if os.path.isfile(self.path):
-            with open(self.path) as f:
-                try:
-                    self.value = json.load(f)
-                except json.decoder.JSONDecodeError as e:
-                    print('Could not decode %s' % self.path)
+            try:
+                self.value = self.serializer.load(self.path)
+            except SerializationError as e:
+                self.logger.error('Could not decode %s: %s', self.path, str(e))
 
     def set_value(self, value):
-        self.value = value
-        with open(self.path, 'w') as f:
-            json.dump(value, f)
+        if not self.write_behind:
+            self.value = value
+            with self.write_lock:
+                self._write(self.serializer.dumps(value))
+            return
+
+        with self.flush_condition:
+            self.value = value
+            self.num_dirty += 1
+            if self.flush_threshold and self.num_dirty >= self.flush_threshold:
+                self.flush_condition.notify()
 
     def get_value(self):
         return self.value
 
+    def flush(self):
+        """ Write the latest value, if it has changed since the last write """
+        with self.write_lock:
+            with self.lock:
+                if not self.num_dirty:
+                    return
+                try:
+                    data = self.serializer.dumps(self.value)
+                except RuntimeError:
+                    # The value was mutated while being serialised, so try again next time
+                    return
+                self.num_dirty = 0
+            self._write(data)
+
+    def close(self):
+        """ Stop the write-behind thread, writing any pending value """
+        if self.flush_thread is None:
+            return
+        with self.flush_condition:
+            self.is_closing = True
+            self.flush_condition.notify()
+        self.flush_thread.join()
+        self.flush_thread = None
+        self.flush()
+        _open_write_behind_variables.discard(self)
+
+    def _flush_loop(self):
+        while True:
+            with self.flush_condition:
+                if not self.is_closing:
+                    self.flush_condition.wait(self.flush_interval)
+                is_closing = self.is_closing
+            self.flush()
+            if is_closing:
+                return
+
+    def _write(self, data):
+        fd, temporary_path = tempfile.mkstemp(prefix='.%s.' % self.name, dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as f:
+                f.write(data)
+                f.flush()
+                # Otherwise the rename may reach the disk before the data
+                os.fsync(f.fileno())
+            os.replace(temporary_path, self.path)
+        except Exception:
+            os.remove(temporary_path)
+            raise
+        _fsync_directory(self.folder)
+
+
+class JournalDictionary(PersistentVariable):
+    """ A persistent dictionary that saves changes to an append-only journal.
+
+    update and delete append one record to name.journal instead of rewriting
+    the whole dictionary, so the cost of a change is proportional to its size.
+    On startup the snapshot file is loaded and the journal replayed on top of it.
+    After compact_threshold records the journal is compacted into a new snapshot.
+
+    Journal records use the same serializer as snapshots, so both round-trip
+    the same types. Records of a text serializer are written one per line,
+    and those of a binary serializer are each prefixed by their length.
+    """
+
+    def __init__(self, name, folder, compact_threshold=1000, serializer=None, logger=None):
+        self.journal_path = os.path.join(folder or DEFAULT_FOLDER, name + '.journal')
+        self.journal_file = None
+        self.num_records = 0
+        # The length of the complete records at the start of the journal
+        self.journal_size = 0
+        self.compact_threshold = compact_threshold
+        super(JournalDictionary, self).__init__(name, folder, serializer=serializer, logger=logger)
+
+    def refresh(self):
+        super(JournalDictionary, self).refresh()
+        self.num_records = 0
+        self.journal_size = 0
+        if os.path.isfile(self.journal_path):
+            for action, data in self._read_journal():
+                self._apply(action, data)
+                self.num_records += 1
+
+    def update(self, data):
+        self._append('update', data)
+
+    def delete(self, keys):
+        if not isinstance(keys, (list, tuple, set)):
+            keys = (keys,)
+        self._append('delete', list(keys))
+
+    def set_value(self, value):
+        """ Replace the whole dictionary, writing a new snapshot """
+        with self.write_lock:
+            self._write(self.serializer.dumps(value))
+            self.value = value
+            self._truncate_journal()
+
+    def compact(self):
+        """ Write the current dictionary as a snapshot and empty the journal """
+        self.set_value(self.value)
+
+    def close(self):
+        with self.write_lock:
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+
+    def _append(self, action, data):
+        with self.write_lock:
+            if self.journal_file is None:
+                self._open_journal()
+            record = self._encode_record(action, data)
+            self.journal_file.write(record)
+            self.journal_file.flush()
+            self.journal_size += len(record)
+            self._apply(action, data)
+            self.num_records += 1
+
+        if self.compact_threshold and self.num_records >= self.compact_threshold:
+            self.compact()
+
+    def _apply(self, action, data):
+        if self.value is None:
+            self.value = {}
+        if action == 'update':
+            self.value.update(data)
+        elif action == 'delete':
+            for key in data:
+                self.value.pop(key, None)
+        else:
+            raise ValueError('action %s not recognised' % action)
+
+    def _read_journal(self):
+        if not self.serializer.binary:
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        yield self.serializer.loads(line)
+                    except SerializationError:
+                        # A torn record from a crash part way through an append
+                        continue
+            return
+
+        with open(self.journal_path, 'rb') as f:
+            journal = f.read()
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(journal):
+            size, = _RECORD_HEADER.unpack_from(journal, offset)
+            end = offset + _RECORD_HEADER.size + size
+            if end > len(journal):
+                # A torn record from a crash part way through an append
+                break
+            try:
+                record = self.serializer.loads(journal[offset + _RECORD_HEADER.size:end])
+            except SerializationError as e:
+                self.logger.error('Could not decode a record of %s: %s', self.journal_path, str(e))
+                break
+            offset = self.journal_size = end
+            yield record
+
+    def _encode_record(self, action, data):
+        record = self.serializer.dumps((action, data))
+        if self.serializer.binary:
+            return _RECORD_HEADER.pack(len(record)) + record
+        return record + '\n'
+
+    def _open_journal(self):
+        if self.serializer.binary:
+            self.journal_file = open(self.journal_path, 'ab')
+            if self.journal_file.tell() > self.journal_size:
+                # Drop a torn record, which would hide the records after it
+                self.journal_file.truncate(self.journal_size)
+            return
+
+        self.journal_file = open(self.journal_path, 'a')
+        if self.journal_file.tell():
+            with open(self.journal_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    # Start a new line after a torn record
+                    self.journal_file.write('\n')
+
+    def _truncate_journal(self):
+        if self.journal_file is not None:
+            self.journal_file.close()
+        self.journal_file = open(self.journal_path, 'wb' if self.serializer.binary else 'w')
+        self.num_records = 0
+        self.journal_size = 0
+
+
+def _fsync_directory(path):
+    """ Sync the entries of a directory, such as a rename, to disk. Directories cannot be opened on Windows """
+    if os.name != 'posix':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@atexit.register
+def _close_write_behind_variables():
+    for variable in list(_open_write_behind_variables):
+        variable.close()
+
 
 if __name__ == '__main__':
     p = PersistentVariable('hello')
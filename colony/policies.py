@@ -0,0 +1,242 @@
+'''
+Policies that protect a node from a slow or failing target.
+
+    CallPolicy     - applies the policies below to each call of a target
+    RetryPolicy    - retries a failed call, with exponential backoff and jitter
+    CircuitBreaker - fails calls immediately while the target keeps failing
+    AbandonedCalls - caps the calls that timed out but are still running
+    call_with_timeout
+
+Nodes take them as the timeout, retry and circuit_breaker kwargs.
+
+'''
+
+import random
+import time
+from threading import Lock, Thread
+
+
+# The default cap on calls that timed out but are still running
+MAX_ABANDONED_CALLS = 16
+
+
+class CallTimeoutError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class RetryPolicy(object):
+    """ Retry a call up to max_attempts times in total.
+
+    The delay before retry n is initial_delay * multiplier ** (n - 1), at most
+    max_delay, randomly varied by up to +/- jitter (a fraction of the delay) so
+    that workers retrying together do not stay in step. Only exceptions that
+    are instances of retry_on are retried.
+    """
+
+    def __init__(self, max_attempts=3, initial_delay=0.1, max_delay=10.0, multiplier=2.0, jitter=0.5,
+                 retry_on=(Exception, )):
+        self.max_attempts = max_attempts
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_on = retry_on
+
+    def should_retry(self, attempt, exception):
+        """ Whether to retry after the given attempt (counting from 1) failed with exception """
+        if isinstance(exception, CircuitOpenError):
+            return False
+        return attempt < self.max_attempts and isinstance(exception, self.retry_on)
+
+    def delay(self, attempt):
+        """ Seconds to wait after the given attempt failed """
+        delay = min(self.initial_delay * self.multiplier ** (attempt - 1), self.max_delay)
+        return max(delay * (1 + random.uniform(-self.jitter, self.jitter)), 0)
+
+
+class CircuitBreaker(object):
+    """ Stops calling a target that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens, and calls
+    raise CircuitOpenError without reaching the target. After reset_timeout
+    seconds it is half open: one trial call is let through, which closes the
+    circuit if it succeeds and opens it again if it fails.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.lock = Lock()
+        self.num_failures = 0
+        self.opened_at = None
+        self.is_trial_running = False
+        self.num_rejected = 0
+
+    @property
+    def state(self):
+        with self.lock:
+            return self._state()
+
+    def before_call(self):
+        """ Raises CircuitOpenError if the call should not go ahead """
+        with self.lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self.is_trial_running:
+                self.is_trial_running = True
+                return
+            self.num_rejected += 1
+        raise CircuitOpenError('Circuit is open after %i failures' % self.num_failures)
+
+    def record_success(self):
+        with self.lock:
+            self.num_failures = 0
+            self.opened_at = None
+            self.is_trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.num_failures += 1
+            if self.is_trial_running or self.num_failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self.is_trial_running = False
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.time() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+
+class AbandonedCalls(object):
+    """ Counts the calls that timed out but are still running on their helper threads.
+
+    Once max_calls of them are running, further calls fail immediately rather
+    than starting yet another thread, so a target that hangs cannot leak
+    threads without bound.
+    """
+
+    def __init__(self, max_calls=MAX_ABANDONED_CALLS):
+        self.max_calls = max_calls
+
+        self.lock = Lock()
+        self.num_calls = 0
+
+    def check(self):
+        """ Raises CallTimeoutError if no more calls may be abandoned """
+        with self.lock:
+            if self.num_calls >= self.max_calls:
+                raise CallTimeoutError('%i calls that timed out are still running' % self.num_calls)
+
+
+class CallPolicy(object):
+    """ Calls a target with an optional timeout, RetryPolicy and CircuitBreaker.
+
+    At most max_abandoned calls that timed out may still be running at once,
+    see AbandonedCalls.
+    """
+
+    def __init__(self, timeout=None, retry=None, circuit_breaker=None, max_abandoned=MAX_ABANDONED_CALLS):
+        self.timeout = timeout
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.abandoned = AbandonedCalls(max_abandoned)
+
+        self.lock = Lock()
+        self.num_retries = 0
+        self.num_timeouts = 0
+
+    def call(self, func, *args):
+        attempt = 1
+        while True:
+            try:
+                return self._attempt(func, args)
+            except Exception as e:
+                if self.retry is None or not self.retry.should_retry(attempt, e):
+                    raise
+                with self.lock:
+                    self.num_retries += 1
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+
+    def stats(self):
+        result = {'retries': self.num_retries, 'timeouts': self.num_timeouts}
+        if self.timeout is not None:
+            result['abandoned'] = self.abandoned.num_calls
+        if self.circuit_breaker:
+            result['circuit'] = self.circuit_breaker.state
+            result['rejected'] = self.circuit_breaker.num_rejected
+        return result
+
+    def _attempt(self, func, args):
+        if self.circuit_breaker:
+            self.circuit_breaker.before_call()
+        try:
+            if self.timeout is None:
+                result = func(*args)
+            else:
+                result = call_with_timeout(func, args, self.timeout, self.abandoned)
+        except Exception as e:
+            if isinstance(e, CallTimeoutError):
+                with self.lock:
+                    self.num_timeouts += 1
+            if self.circuit_breaker:
+                self.circuit_breaker.record_failure()
+            raise
+        if self.circuit_breaker:
+            self.circuit_breaker.record_success()
+        return result
+
+
+def call_with_timeout(func, args, timeout, abandoned=None):
+    """ Call func(*args), raising CallTimeoutError if it takes longer than timeout seconds.
+
+    The call runs on a daemon helper thread. Python cannot interrupt a thread,
+    so a call that times out keeps running in the background, but the caller
+    (e.g. a worker thread) is free to carry on. Such calls are counted by
+    abandoned, an AbandonedCalls shared by the whole process by default, and
+    once it is full calls raise CallTimeoutError without being started.
+    """
+    if abandoned is None:
+        abandoned = _abandoned_calls
+    abandoned.check()
+
+    outcome = []
+    is_abandoned = []
+
+    def run():
+        try:
+            result = (True, func(*args))
+        except BaseException as e:
+            result = (False, e)
+        with abandoned.lock:
+            outcome.append(result)
+            if is_abandoned:
+                abandoned.num_calls -= 1
+
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    with abandoned.lock:
+        if not outcome:
+            is_abandoned.append(True)
+            abandoned.num_calls += 1
+            raise CallTimeoutError('Call did not finish within %s seconds' % timeout)
+
+    is_ok, value = outcome[0]
+    if not is_ok:
+        raise value
+    return value
+
+
+_abandoned_calls = AbandonedCalls()
@@ -0,0 +1,359 @@
+'''
+Connecting graphs that run in different processes or on different machines.
+
+A RemoteSink observes a node's output port and sends each result over a
+socket. A RemoteSource listens on a socket and notifies its output_port with
+each message it receives, so it can be used in node_args and node_kwargs
+like a node. A subgraph is placed on another host by building it there
+between a RemoteSource and a RemoteSink:
+
+    host A:  prices -> RemoteSink(B)            RemoteSource(A) -> save
+    host B:            RemoteSource(B) -> train -> RemoteSink(A)
+
+Addresses are (host, port) tuples for TCP, or paths for Unix sockets.
+
+Messages are sent in batches, one batch per frame. A frame is a 4 byte
+big-endian length followed by the batch, encoded with a Serializer. The
+default is 'json', which is safe to decode from anyone but sends only
+JSON-like values (tuples arrive as lists). serializer='pickle' sends any
+picklable value, but unpickling data from the network can run arbitrary
+code, so only opt in to it when every peer that can connect is trusted.
+
+A RemoteSink reconnects, with exponential backoff, when the connection
+drops. There are no acknowledgements: messages in transit when a connection
+is lost may be lost too.
+
+'''
+
+import os
+import pickle
+import socket
+import struct
+import time
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+
+from colony.observer import Observable, Observer
+from colony.serializers import SerializationError, get_serializer
+from colony.utils.logging import get_logger
+
+_HEADER = struct.Struct('!I')
+
+# Raised by serializers for values they cannot encode
+_ENCODE_ERRORS = (TypeError, ValueError, SerializationError, pickle.PicklingError)
+
+# Seconds to wait for the sending thread to give up, once a stop has timed out
+ABORT_TIMEOUT = 1.0
+
+
+class RemoteSink(Observer):
+    """ Sends everything it is notified of to the RemoteSource at address.
+
+    Messages are queued and sent by a background thread, in batches of up to
+    max_batch_size collected over at most max_batch_wait seconds. With
+    max_queue_size > 0, notify blocks while that many messages are unsent.
+    """
+
+    def __init__(self, address, serializer='json', max_batch_size=100, max_batch_wait=0.005,
+                 max_queue_size=0, reconnect_delay=0.05, max_reconnect_delay=5.0, logger=None):
+        self.address = address
+        self.serializer = get_serializer(serializer)
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.logger = logger or get_logger()
+
+        self.queue = Queue(max_queue_size)
+        self.abort_event = Event()
+        self.sock = None
+        self.thread = None
+        self.num_sent = 0
+        self.num_dropped = 0
+        self.num_reconnects = 0
+
+    def __repr__(self):
+        return '<RemoteSink address=%s>' % str(self.address)
+
+    def notify(self, data):
+        self.queue.put(data)
+
+    def start(self):
+        self.abort_event.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, drain=True, timeout=None):
+        """ Stop sending. Returns {'dropped': number of messages not sent, 'timed_out': bool}
+
+        With drain=True, queued messages are sent first, waiting at most timeout
+        seconds. Messages that cannot be sent by then are dropped, and the
+        connection is shut down, in case a send is blocked on a peer that has
+        stopped reading. The thread is then given at most ABORT_TIMEOUT seconds.
+        """
+        num_dropped = self.num_dropped
+        if not drain:
+            self.abort_event.set()
+        self.queue.put(_Stop())
+        self.thread.join(timeout)
+        timed_out = self.thread.is_alive()
+        if timed_out:
+            self.abort_event.set()
+            self._shutdown()
+            self.thread.join(ABORT_TIMEOUT)
+        return {'dropped': self.num_dropped - num_dropped, 'timed_out': timed_out}
+
+    def stats(self):
+        return {'sent': self.num_sent, 'dropped': self.num_dropped, 'reconnects': self.num_reconnects,
+                'queue_depth': self.queue.qsize()}
+
+    def _run(self):
+        try:
+            while True:
+                messages, is_stopping = self._next_batch()
+                if messages:
+                    if self.abort_event.is_set():
+                        self.num_dropped += len(messages)
+                    else:
+                        self._send(messages)
+                if is_stopping:
+                    return
+        finally:
+            self._disconnect()
+
+    def _next_batch(self):
+        """ Returns the messages of the next batch, and whether stop was called """
+        messages = []
+        message = self.queue.get()
+        deadline = time.time() + self.max_batch_wait
+        while True:
+            if isinstance(message, _Stop):
+                return messages, True
+
+            messages.append(message)
+            timeout = deadline - time.time()
+            if len(messages) >= self.max_batch_size or timeout <= 0:
+                return messages, False
+
+            try:
+                message = self.queue.get(timeout=timeout)
+            except Empty:
+                return messages, False
+
+    def _send(self, messages):
+        frame, messages = self._encode(messages)
+        if not messages:
+            return
+        delay = self.reconnect_delay
+        while True:
+            try:
+                if self.sock is None:
+                    self.sock = connect(self.address)
+                send_frame(self.sock, frame)
+                self.num_sent += len(messages)
+                return
+            except OSError as e:
+                self.logger.warning('%s failed to send: %s. Retrying in %.2fs', self, str(e), delay)
+                self._disconnect()
+
+            # Waits for the delay, unless stop gives up on the messages first
+            if self.abort_event.wait(delay):
+                self.logger.error('%s dropped %i unsent messages', self, len(messages))
+                self.num_dropped += len(messages)
+                return
+            delay = min(delay * 2, self.max_reconnect_delay)
+            self.num_reconnects += 1
+
+    def _encode(self, messages):
+        """ Returns the frame of messages, and the messages in it, leaving out any that cannot be encoded """
+        try:
+            return encode(self.serializer, messages), messages
+        except _ENCODE_ERRORS:
+            pass
+
+        # Encode each message on its own, to find the ones at fault
+        encodable = []
+        for message in messages:
+            try:
+                self.serializer.dumps([message])
+            except _ENCODE_ERRORS as e:
+                self.logger.error('%s dropped a message it could not encode: %s', self, str(e))
+                self.num_dropped += 1
+            else:
+                encodable.append(message)
+        if not encodable:
+            return None, encodable
+        return encode(self.serializer, encodable), encodable
+
+    def _shutdown(self):
+        # Wakes a send that is blocked, which then fails and gives up as aborted
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class RemoteSource(object):
+    """ Listens on address, and notifies output_port with every message sent by a RemoteSink.
+
+    Any number of RemoteSinks may connect. Messages from one sink arrive in
+    order, and are passed on one at a time. Pass port 0 to listen on any free
+    port; address is updated with the actual port once started.
+    """
+
+    def __init__(self, address, serializer='json', logger=None):
+        self.address = address
+        self.serializer = get_serializer(serializer)
+        self.logger = logger or get_logger()
+        self.output_port = Observable()
+
+        self.notify_lock = Lock()
+        self.server = None
+        self.accept_thread = None
+        self.connections = {}
+        self.connections_lock = Lock()
+        self.num_received = 0
+
+    def __repr__(self):
+        return '<RemoteSource address=%s>' % str(self.address)
+
+    def start(self):
+        self.server = listen(self.address)
+        if not isinstance(self.address, str):
+            self.address = self.server.getsockname()[:2]
+        self.accept_thread = Thread(target=self._accept_loop, daemon=True)
+        self.accept_thread.start()
+
+    def stop(self, drain=True, timeout=None):
+        """ Stop listening and close every connection. Returns {'dropped': 0, 'timed_out': bool} """
+        _shutdown(self.server)
+        self.accept_thread.join(timeout)
+        if isinstance(self.address, str):
+            try:
+                os.unlink(self.address)
+            except FileNotFoundError:
+                pass
+
+        with self.connections_lock:
+            connections = list(self.connections.items())
+        for conn, thread in connections:
+            _shutdown(conn)
+        for conn, thread in connections:
+            thread.join(timeout)
+
+        timed_out = self.accept_thread.is_alive() or any(thread.is_alive() for _, thread in connections)
+        return {'dropped': 0, 'timed_out': timed_out}
+
+    def stats(self):
+        return {'received': self.num_received, 'connections': len(self.connections)}
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                # The server socket was closed by stop
+                return
+            thread = Thread(target=self._read_loop, args=(conn, ), daemon=True)
+            with self.connections_lock:
+                self.connections[conn] = thread
+            thread.start()
+
+    def _read_loop(self, conn):
+        try:
+            while True:
+                frame = recv_frame(conn)
+                if frame is None:
+                    return
+                messages = decode(self.serializer, frame)
+                with self.notify_lock:
+                    self.num_received += len(messages)
+                    for message in messages:
+                        self.output_port.notify_observers(message)
+        except (OSError, SerializationError) as e:
+            self.logger.warning('%s lost a connection: %s', self, str(e))
+        finally:
+            conn.close()
+            with self.connections_lock:
+                self.connections.pop(conn, None)
+
+
+class _Stop(object):
+    pass
+
+
+def encode(serializer, messages):
+    data = serializer.dumps(messages)
+    return data if serializer.binary else data.encode('utf-8')
+
+
+def decode(serializer, frame):
+    return serializer.loads(frame if serializer.binary else frame.decode('utf-8'))
+
+
+def send_frame(sock, data):
+    sock.sendall(_HEADER.pack(len(data)))
+    sock.sendall(data)
+
+
+def recv_frame(sock):
+    """ Returns the next frame, or None if the connection was closed between frames """
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    size, = _HEADER.unpack(header)
+    data = _recv_exactly(sock, size)
+    if data is None:
+        raise ConnectionError('Connection closed in the middle of a frame')
+    return data
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1024 * 1024))
+        if not chunk:
+            if buf:
+                raise ConnectionError('Connection closed in the middle of a frame')
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def connect(address):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def listen(address):
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(address)
+        sock.listen()
+        return sock
+    return socket.create_server(address)
+
+
+def _shutdown(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
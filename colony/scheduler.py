@@ -0,0 +1,172 @@
+'''
+Scheduling of node executions in topological order.
+
+Rather than letting each update recurse down the graph on the caller's stack,
+the TopologicalScheduler collects the nodes affected by an update into a
+"wave" and runs them one after another, lowest topological rank first.
+
+'''
+
+import heapq
+from contextlib import contextmanager
+from threading import Condition, get_ident
+
+
+def topological_sort(nodes):
+    """ Return the nodes ordered so that upstream nodes come before downstream nodes.
+
+    Edges are taken from each node's output port observers. Ties are broken by
+    the order of the input list, and nodes that sit on a cycle are appended in
+    their input order once the acyclic part of the graph has been emitted.
+    """
+    position = {node: i for i, node in enumerate(nodes)}
+    downstream = {node: [] for node in nodes}
+    in_degree = {node: 0 for node in nodes}
+
+    for node in nodes:
+        for target in _downstream_nodes(node):
+            if target in position and target not in downstream[node]:
+                downstream[node].append(target)
+                in_degree[target] += 1
+
+    ready = [position[node] for node in nodes if in_degree[node] == 0]
+    heapq.heapify(ready)
+    result = []
+    while ready:
+        node = nodes[heapq.heappop(ready)]
+        result.append(node)
+        for target in downstream[node]:
+            in_degree[target] -= 1
+            if in_degree[target] == 0:
+                heapq.heappush(ready, position[target])
+
+    if len(result) < len(nodes):
+        emitted = set(result)
+        result.extend(node for node in nodes if node not in emitted)
+
+    return result
+
+
+def _downstream_nodes(node):
+    for observer in node.output_port.observers:
+        target = getattr(observer, 'node', None)
+        if target is not None:
+            yield target
+
+
+class TopologicalScheduler(object):
+    """ Runs the nodes of a Graph in waves.
+
+    Each call to schedule adds a node to the current wave. The first caller
+    drains the wave, executing pending nodes in topological order, so every
+    node executes at most once per wave regardless of how many upstream edges
+    updated it. A node scheduled again after it has already run in the current
+    wave (i.e. via a cycle) is deferred to the next wave.
+
+    Nodes scheduled from another thread while a wave is in progress are
+    picked up by the thread that is draining the wave. Such an update is
+    independent of the wave, so it runs on a snapshot of the node's inputs
+    taken when it was scheduled, rather than being merged with the wave's.
+    Likewise the updates made by a run on a snapshot are themselves run on
+    snapshots, so independent updates stay separate all the way downstream.
+    """
+
+    def __init__(self, nodes):
+        self.order = topological_sort(nodes)
+        self.rank = {node: i for i, node in enumerate(self.order)}
+
+        self._lock = Condition()
+        self._heap = []
+        self._pending = {}
+        self._deferred = {}
+        self._executed = set()
+        self._is_running = False
+        self._draining_thread = None
+        # Whether the draining thread is running a node on a snapshot of its inputs
+        self._is_separate = False
+
+    def schedule(self, node, inputs=None):
+        """ Add node to the current wave.
+
+        By default, a node that is already pending runs once with its latest
+        inputs. Pass inputs (a snapshot from Node.handle_input) to queue a
+        separate execution instead, as mapping and batching ports require.
+        """
+        with self._lock:
+            if inputs is None and self._is_running and (self._is_separate or self._draining_thread != get_ident()):
+                inputs = node.input_snapshot()
+            if node in self._executed:
+                _add_pending(self._deferred, node, inputs)
+            else:
+                if node not in self._pending:
+                    heapq.heappush(self._heap, (self.rank.get(node, len(self.order)), id(node), node))
+                _add_pending(self._pending, node, inputs)
+
+            if self._is_running:
+                return
+            self._is_running = True
+            self._draining_thread = get_ident()
+
+        self._run()
+
+    @contextmanager
+    def separate(self):
+        """ Run the updates made within the block on snapshots, as separate executions.
+
+        For updates that must not be conflated, e.g. the items streamed by a
+        generator target, which the draining thread would otherwise merge.
+        Updates from other threads are run on snapshots anyway.
+        """
+        if self._draining_thread != get_ident():
+            yield
+            return
+        was_separate, self._is_separate = self._is_separate, True
+        try:
+            yield
+        finally:
+            self._is_separate = was_separate
+
+    def wait_until_idle(self, timeout=None):
+        """ Wait for a wave that another thread is draining to finish. Returns False if timeout ran out """
+        with self._lock:
+            if self._draining_thread == get_ident():
+                return True
+            return self._lock.wait_for(lambda: not self._is_running, timeout)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._heap:
+                    self._start_next_wave()
+                if not self._heap:
+                    self._is_running = False
+                    self._draining_thread = None
+                    self._lock.notify_all()
+                    return
+                _, _, node = heapq.heappop(self._heap)
+                executions = self._pending.pop(node)
+                self._executed.add(node)
+
+            for inputs in executions:
+                self._is_separate = inputs is not None
+                try:
+                    node.execute(inputs)
+                finally:
+                    self._is_separate = False
+
+    def _start_next_wave(self):
+        self._executed = set()
+        deferred, self._deferred = self._deferred, {}
+        for node, executions in deferred.items():
+            heapq.heappush(self._heap, (self.rank.get(node, len(self.order)), id(node), node))
+            self._pending[node] = executions
+
+
+def _add_pending(pending, node, inputs):
+    executions = pending.setdefault(node, [])
+    if inputs is None:
+        # Conflate with any other pending run that reads the latest inputs
+        if None not in executions:
+            executions.append(None)
+    else:
+        executions.append(inputs)
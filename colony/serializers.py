@@ -0,0 +1,151 @@
+'''
+Serializers used by PersistentVariable to save values to disk.
+
+Each serializer converts a value to and from str (text serializers) or bytes
+(binary serializers). get_serializer accepts either a Serializer instance or
+one of the names in SERIALIZERS.
+
+'''
+
+import io
+import json
+import pickle
+from collections.abc import Mapping
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class SerializationError(Exception):
+    pass
+
+
+class Serializer(object):
+    # Whether dumps returns bytes rather than str
+    binary = False
+
+    def dumps(self, value):
+        raise NotImplementedError()
+
+    def loads(self, data):
+        raise NotImplementedError()
+
+    def load(self, path):
+        mode = 'rb' if self.binary else 'r'
+        with open(path, mode) as f:
+            return self.loads(f.read())
+
+
+class JsonSerializer(Serializer):
+    """ Human readable, but limited to dicts, lists, strings, numbers, booleans and None.
+
+    Other Mappings, such as a DictDelta, are written as plain dicts.
+    """
+
+    def dumps(self, value):
+        return json.dumps(value, default=_as_dict)
+
+    def loads(self, data):
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise SerializationError(str(e))
+
+
+class PickleSerializer(Serializer):
+    """ Stores any picklable value, using the highest pickle protocol """
+    binary = True
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def dumps(self, value):
+        return pickle.dumps(value, protocol=self.protocol)
+
+    def loads(self, data):
+        try:
+            return pickle.loads(data)
+        except (pickle.UnpicklingError, EOFError, ValueError) as e:
+            raise SerializationError(str(e))
+
+
+class MsgpackSerializer(Serializer):
+    """ Compact binary encoding of JSON-like values, writing other Mappings as dicts. Requires the msgpack package """
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError('MsgpackSerializer requires the msgpack package')
+
+    def dumps(self, value):
+        return msgpack.packb(value, use_bin_type=True, default=_as_dict)
+
+    def loads(self, data):
+        try:
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        except (msgpack.UnpackException, ValueError) as e:
+            raise SerializationError(str(e))
+
+
+class NumpySerializer(Serializer):
+    """ Stores a NumPy array in .npy format. Requires the numpy package
+
+    By default arrays are loaded as read-only memory maps of the file, so
+    large arrays are paged in on demand rather than read up front.
+    """
+    binary = True
+
+    def __init__(self, mmap_mode='r'):
+        if np is None:
+            raise ImportError('NumpySerializer requires the numpy package')
+        self.mmap_mode = mmap_mode
+
+    def dumps(self, value):
+        f = io.BytesIO()
+        np.save(f, value, allow_pickle=False)
+        return f.getvalue()
+
+    def loads(self, data):
+        try:
+            return np.load(io.BytesIO(data), allow_pickle=False)
+        except ValueError as e:
+            raise SerializationError(str(e))
+
+    def load(self, path):
+        try:
+            return np.load(path, mmap_mode=self.mmap_mode, allow_pickle=False)
+        except ValueError as e:
+            raise SerializationError(str(e))
+
+
+def _as_dict(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError('Object of type %s is not serializable' % type(value).__name__)
+
+
+SERIALIZERS = {
+    'json': JsonSerializer,
+    'pickle': PickleSerializer,
+    'msgpack': MsgpackSerializer,
+    'numpy': NumpySerializer,
+}
+
+
+def get_serializer(serializer=None):
+    """ Returns a Serializer, given an instance, a name from SERIALIZERS or None for json """
+    if serializer is None:
+        return JsonSerializer()
+    elif isinstance(serializer, Serializer):
+        return serializer
+    elif serializer in SERIALIZERS:
+        return SERIALIZERS[serializer]()
+    else:
+        raise ValueError('serializer %s not recognised' % serializer)
@@ -0,0 +1,110 @@
+import time
+import unittest
+
+from colony.node import BatchNode, Graph, ProcessNode
+from colony.observer import RememberingObserver
+from colony.utils.cache import LRUCache, make_key
+
+
+class CountingTarget(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, x, scale=1):
+        self.calls.append((x, scale))
+        return x * scale
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertEqual((True, 1), cache.get('a'))
+        self.assertEqual((False, None), cache.get('b'))
+        self.assertEqual({'size': 2, 'hits': 2, 'misses': 1, 'evictions': 1}, cache.stats())
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=0.05)
+        cache.put('a', 1)
+        self.assertEqual((True, 1), cache.get('a'))
+
+        time.sleep(0.1)
+        self.assertEqual((False, None), cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+    def test_make_key(self):
+        self.assertEqual(make_key((1, ), {'b': 2, 'a': 1}), make_key((1, ), {'a': 1, 'b': 2}))
+        self.assertIsNone(make_key(([1], ), {}))
+
+
+class NodeMemoizeTests(unittest.TestCase):
+    def test_repeated_inputs_are_not_recomputed(self):
+        target = CountingTarget()
+        obs = RememberingObserver()
+        col = Graph()
+        node = col.add_node(target_func=target, memoize=True)
+        node.output_port.register_observer(obs)
+        col.start()
+
+        node.notify_items([1, 2, 1, 2])
+        node.passive_input_ports['scale'].notify(10)
+        node.notify(1)
+        col.stop()
+
+        self.assertEqual([(1, 1), (2, 1), (1, 10)], target.calls)
+        self.assertEqual([1, 2, 1, 2, 10], obs.calls)
+        self.assertEqual(2, node.stats()['cache']['hits'])
+
+    def test_suppress_unchanged(self):
+        target = CountingTarget()
+        obs = RememberingObserver()
+        col = Graph()
+        node = col.add_thread_node(target_func=target, num_threads=1, memoize=True, suppress_unchanged=True)
+        node.output_port.register_observer(obs)
+        col.start()
+
+        for x in [1, 1, 1, 2, 1]:
+            node.notify(x)
+            node.worker.join()
+        col.stop()
+
+        self.assertEqual([(1, 1), (2, 1)], target.calls)
+        self.assertEqual([1, 2, 1], obs.calls)
+
+    def test_unhashable_inputs_bypass_the_cache(self):
+        target = CountingTarget()
+        node = Graph().add_node(target_func=target, memoize=True)
+        node.start()
+
+        node.notify([1])
+        node.notify([1])
+
+        self.assertEqual(2, len(target.calls))
+        self.assertEqual({'size': 0, 'hits': 0, 'misses': 0, 'evictions': 0}, node.stats()['cache'])
+
+    def test_cache_key(self):
+        target = CountingTarget()
+        node = Graph().add_node(target_func=target, memoize=True,
+                                cache_key=lambda args, kwargs: tuple(args[0]))
+        node.start()
+
+        node.notify([1])
+        node.notify([1])
+
+        self.assertEqual(1, len(target.calls))
+
+    def test_process_node_is_not_supported(self):
+        self.assertRaises(ValueError, ProcessNode, target_func=abs, memoize=True)
+
+    def test_batch_node_is_not_supported(self):
+        self.assertRaises(ValueError, BatchNode, target_func=abs, memoize=True)
+        self.assertRaises(ValueError, BatchNode, target_func=abs, memoize=True, cache_key=lambda args, kwargs: 1,
+                          suppress_unchanged=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+
+from colony.columnar import ColumnarNode, KeyedArray, np
+from colony.node import AsyncWorker, Graph
+from colony.observer import RememberingObserver
+
+
+def _mid(bid, ask):
+    return (bid + ask) / 2
+
+
+def _double(x):
+    return 2 * x
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class KeyedArrayTests(unittest.TestCase):
+    def test_scatter_and_gather(self):
+        prices = KeyedArray(['a', 'b'], capacity=2)
+        prices.scatter({'b': 2.0, 'c': 3.0})
+        prices.scatter((['a'], [1.0]))
+
+        self.assertEqual(['a', 'b', 'c'], prices.keys)
+        self.assertEqual([3.0, 1.0], prices.gather(['c', 'a']).tolist())
+        self.assertEqual({'a': 1.0, 'b': 2.0, 'c': 3.0}, prices.to_dict())
+        self.assertRaises(KeyError, prices.gather, ['d'])
+
+    def test_unset_rows_hold_the_fill_value(self):
+        prices = KeyedArray(['a', 'b'])
+        prices.scatter({'b': 2.0})
+        self.assertTrue(np.isnan(prices['a']))
+
+        counts = KeyedArray(['a'], dtype=int)
+        self.assertEqual(0, counts['a'])
+
+    def test_columns(self):
+        table = KeyedArray(num_columns=2)
+        table.scatter({'a': 1.0, 'b': 2.0}, column=0)
+        table.scatter(KeyedArray(['b', 'a'], [20.0, 10.0]), column=1)
+
+        self.assertEqual([[1.0, 10.0], [2.0, 20.0]], table.values.tolist())
+        self.assertEqual([20.0], table.gather(['b'], column=1).tolist())
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class ColumnarNodeTests(unittest.TestCase):
+    def test_one_call_for_every_key(self):
+        obs = RememberingObserver()
+        col = Graph()
+        bids = col.add_node(target_func=lambda x: x)
+        asks = col.add_node(target_func=lambda x: x)
+        mid = col.add(ColumnarNode, target_func=_mid, keys=['a', 'b'], node_args=(bids, asks))
+        double = col.add(ColumnarNode, target_func=_double, node_args=mid)
+        double.output_port.register_observer(obs)
+        col.start()
+
+        bids.notify({'a': 1.0, 'b': 2.0})
+        asks.notify({'b': 4.0, 'a': 3.0, 'c': 5.0})
+        col.stop()
+
+        result = obs.calls[-1]
+        self.assertIsInstance(result, KeyedArray)
+        self.assertEqual({'a': 4.0, 'b': 6.0}, {k: v for k, v in result.to_dict().items() if k != 'c'})
+        self.assertTrue(np.isnan(result['c']))
+        self.assertEqual(2, mid.stats()['calls'])
+
+    def test_plain_node_downstream(self):
+        col = Graph()
+        mid = col.add(ColumnarNode, target_func=_mid)
+        total = col.add_node(target_func=lambda prices: float(prices.values.sum()), node_args=mid)
+        col.start()
+
+        mid.notify({'a': 1.0, 'b': 3.0}, port_idx=0)
+        mid.notify({'a': 1.0, 'b': 3.0}, port_idx=1)
+        col.stop()
+
+        self.assertEqual(4.0, total.get_value())
+
+    def test_scalar_result_is_not_keyed(self):
+        obs = RememberingObserver()
+        node = ColumnarNode(target_func=np.sum, keys=['a', 'b'])
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify({'a': 1.0, 'b': 2.0})
+        node.stop()
+
+        self.assertEqual([3.0], obs.calls)
+        self.assertNotIsInstance(obs.calls[0], KeyedArray)
+
+    def test_rejects_result_without_one_value_per_row(self):
+        node = ColumnarNode(target_func=_double, keys=['a', 'b'])
+        node.start()
+        node.notify({'c': 1.0})
+        node.stop()
+
+        # Two rows before 'c' was added, or three after
+        self.assertRaises(ValueError, node.handle_result, np.array([1.0]))
+        node.handle_result(np.array([1.0, 2.0]))
+        self.assertEqual({'a': 1.0, 'b': 2.0}, node.get_value().to_dict())
+
+    def test_thread_worker_sees_a_snapshot(self):
+        obs = RememberingObserver()
+        node = ColumnarNode(target_func=_double, node_worker_class=AsyncWorker,
+                            node_worker_class_kwargs={'num_threads': 1})
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify({'a': 1.0})
+        node.notify({'a': 2.0})
+        node.stop()
+
+        self.assertEqual([{'a': 2.0}, {'a': 4.0}], [result.to_dict() for result in obs.calls])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import pickle
+import unittest
+
+from colony.dict_delta import DictDelta
+from colony.serializers import get_serializer
+
+
+class DictDeltaTests(unittest.TestCase):
+    def test_for_update(self):
+        state = {'red': 1}
+        delta = DictDelta.for_update(state, {'red': 2, 'blue': 3})
+        state.update({'red': 2, 'blue': 3})
+
+        self.assertEqual({'blue': 3}, delta.added)
+        self.assertEqual({'red': 2}, delta.updated)
+        self.assertEqual({'red': 2, 'blue': 3}, delta)
+        self.assertTrue(delta.has_changes)
+
+    def test_for_delete_ignores_missing_keys(self):
+        delta = DictDelta.for_delete({'red': 1}, ['red', 'blue'])
+        self.assertEqual({'red': 1}, delta.removed)
+        self.assertFalse(DictDelta.for_delete({}, ['blue']).has_changes)
+
+    def test_apply_to_keeps_a_copy_in_step(self):
+        state = {'red': 1, 'green': 2}
+        copy = dict(state)
+        for data in [{'red': 5, 'blue': 3}]:
+            delta = DictDelta.for_update(state, data)
+            state.update(data)
+            delta.apply_to(copy)
+        delta = DictDelta.for_delete(state, ['green'])
+        state.pop('green')
+        delta.apply_to(copy)
+
+        self.assertEqual(state, copy)
+
+    def test_deltas_with_different_changes_differ(self):
+        state = {'red': 1}
+        added = DictDelta(state, added={'blue': 3})
+        removed = DictDelta(state, removed={'red': 1})
+
+        self.assertNotEqual(added, removed)
+        self.assertEqual(added, DictDelta(state, added={'blue': 3}))
+        self.assertEqual({'red': 1}, added)
+
+    def test_json(self):
+        delta = DictDelta({'red': 1}, added={'red': 1})
+        self.assertEqual({'red': 1}, json.loads(get_serializer('json').dumps([delta]))[0])
+
+    def test_pickle(self):
+        delta = pickle.loads(pickle.dumps(DictDelta({'red': 1}, added={'red': 1})))
+        self.assertEqual({'red': 1}, delta)
+        self.assertEqual({'red': 1}, delta.added)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import pickle
+import unittest
+
+from colony.envelope import Envelope, envelope
+from colony.node import Graph
+from colony.observer import RememberingObserver
+
+
+def _double_price(message):
+    return message.replace(2 * message.value)
+
+
+class EnvelopeTests(unittest.TestCase):
+    def test_sequence_numbers_increase(self):
+        first, second = envelope('a'), envelope('b')
+        self.assertEqual(first.seq + 1, second.seq)
+        self.assertLessEqual(first.timestamp, second.timestamp)
+
+    def test_has_no_dict(self):
+        self.assertFalse(hasattr(envelope(1), '__dict__'))
+
+    def test_pickle(self):
+        message = Envelope('a', 1.5, 3)
+        self.assertEqual(message, pickle.loads(pickle.dumps(message)))
+
+    def test_through_a_graph(self):
+        obs = RememberingObserver()
+        col = Graph()
+        source = col.add_node(target_func=lambda message: message)
+        doubled = col.add_node(target_func=_double_price, node_args=source)
+        doubled.output_port.register_observer(obs)
+        col.start()
+
+        message = envelope(1.5)
+        source.notify(message)
+        col.stop()
+
+        self.assertEqual(Envelope(3.0, message.timestamp, message.seq), obs.calls[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import threading
+import time
+import unittest
+
+from colony.executor import SharedExecutor
+from colony.node import DROP_OLDEST, Graph, PooledNode, PooledWorker, ThreadNode
+from colony.observer import RememberingObserver
+
+
+def _x_squared(x):
+    return x * x
+
+
+def _x_plus_one(x):
+    return x + 1
+
+
+class ConcurrencyCounter(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, x):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return x
+
+
+class SharedExecutorTests(unittest.TestCase):
+    def test_weighted_round_robin(self):
+        executor = SharedExecutor(num_threads=1)
+        a = executor.add_lane('a', weight=2)
+        b = executor.add_lane('b', weight=1)
+        order = []
+        for _ in range(4):
+            executor.submit(a, lambda: order.append('a'))
+            executor.submit(b, lambda: order.append('b'))
+
+        executor.start()
+        executor.stop()
+
+        self.assertEqual(['a', 'a', 'b', 'a', 'a', 'b', 'b', 'b'], order)
+
+    def test_max_concurrency(self):
+        executor = SharedExecutor(num_threads=8)
+        lane = executor.add_lane(max_concurrency=2)
+        counter = ConcurrencyCounter()
+        executor.start()
+
+        for x in range(10):
+            executor.submit(lane, lambda: counter(x))
+        executor.wait_idle(lane)
+        executor.stop()
+
+        self.assertEqual(2, counter.max_running)
+
+    def test_capped_lane_does_not_block_others(self):
+        executor = SharedExecutor(num_threads=2)
+        slow = executor.add_lane(max_concurrency=1)
+        fast = executor.add_lane()
+        release = threading.Event()
+        done = threading.Event()
+        executor.start()
+
+        for _ in range(5):
+            executor.submit(slow, release.wait)
+        executor.submit(fast, done.set)
+
+        self.assertTrue(done.wait(2))
+        release.set()
+        executor.stop()
+
+
+class PooledNodeTests(unittest.TestCase):
+    def test_graph_shares_executor_between_thread_nodes(self):
+        obs = RememberingObserver()
+        col = Graph(executor=4)
+        node = first = col.add_thread_node(target_func=_x_plus_one)
+        for _ in range(19):
+            node = col.add_thread_node(target_func=_x_plus_one, node_args=node)
+        node.output_port.register_observer(obs)
+
+        num_threads = threading.active_count()
+        col.start()
+        self.assertEqual(num_threads + 4, threading.active_count())
+
+        first.notify_items(range(10))
+        report = col.stop()
+
+        self.assertIsInstance(node.worker, PooledWorker)
+        self.assertEqual(set(range(20, 30)), obs.call_set)
+        self.assertEqual({}, report['dropped'])
+        self.assertEqual(num_threads, threading.active_count())
+
+    def test_thread_node_kwargs_keep_a_thread_node(self):
+        col = Graph(executor=2)
+        bounded = col.add_thread_node(target_func=_x_plus_one, max_queue_size=2, overflow_policy=DROP_OLDEST)
+        conflated = col.add_thread_node(target_func=_x_plus_one, conflate=True)
+        prioritised = col.add_thread_node(target_func=_x_plus_one, num_priorities=2)
+        defaulted = col.add_thread_node(target_func=_x_plus_one, num_priorities=None)
+        pooled = col.add_thread_node(target_func=_x_plus_one, num_threads=2)
+
+        for node in (bounded, conflated, prioritised, defaulted):
+            self.assertIs(type(node), ThreadNode)
+        self.assertIsInstance(pooled, PooledNode)
+
+    def test_num_threads_caps_node_concurrency(self):
+        counter = ConcurrencyCounter()
+        col = Graph(executor=8)
+        node = col.add_thread_node(target_func=counter, num_threads=3)
+        col.start()
+
+        node.notify_items(range(20))
+        col.stop()
+
+        self.assertEqual(3, counter.max_running)
+        self.assertEqual(20, node.stats()['calls'])
+
+    def test_fast_abort_drops_waiting_calls(self):
+        release = threading.Event()
+
+        def wait(x):
+            release.wait()
+            return x
+
+        executor = SharedExecutor(num_threads=1)
+        node = PooledNode(target_func=wait, executor=executor)
+        node.start()
+        node.notify_items(range(4))
+        time.sleep(0.05)
+        threading.Timer(0.1, release.set).start()
+
+        report = node.stop(drain=False)
+        executor.stop()
+
+        self.assertEqual({'dropped': 3, 'timed_out': False}, report)
+        self.assertEqual(0, node.stats()['in_flight'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import tempfile
 import unittest
 
 from colony.graphs.auction_listener import AuctionListener
@@ -68,6 +69,21 @@ class MyTestCase(unittest.TestCase):
         print(graph.active_auctions_node.get_value())
         self.assertEqual(expected, graph.active_auctions_node.get_value())
 
+    def test_get_prices_notify_journal(self):
+        folder = tempfile.mkdtemp()
+        graph = AuctionListener(get_auctions, get_prices, save_prices, on_close, folder=folder, journal=True)
+        graph.start()
+
+        graph.get_auctions_node.notify('widgets')
+        graph.get_latest_prices()
+
+        graph.stop()
+
+        expected = {'red': {'status': 'OPEN'},
+                    'green': {'status': 'OPEN'}}
+        self.assertEqual(expected, graph.active_auctions_node.get_value())
+        self.assertEqual(2, graph.active_auctions_node.persistent_value.num_records)
+
 
 if __name__ == '__main__':
     unittest.main()
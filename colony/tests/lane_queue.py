@@ -0,0 +1,40 @@
+import unittest
+from queue import Full
+
+from colony.utils.lane_queue import LaneQueue
+
+
+class LaneQueueTests(unittest.TestCase):
+    def test_lanes_are_served_in_priority_order(self):
+        queue = LaneQueue(num_lanes=3)
+        for item in [(2, 'c'), (1, 'b'), (None, 'stop'), (0, 'a'), (1, 'b2')]:
+            queue.put(item)
+
+        self.assertEqual(5, queue.qsize())
+        self.assertEqual([1, 2, 1], queue.lane_sizes())
+        self.assertEqual(['a', 'b', 'b2', 'c', 'stop'], [queue.get()[1] for _ in range(5)])
+
+    def test_starvation_limit(self):
+        queue = LaneQueue(num_lanes=2, starvation_limit=3)
+        queue.put((1, 'low'))
+        for i in range(5):
+            queue.put((0, i))
+
+        self.assertEqual([0, 1, 2, 'low', 3, 4], [queue.get()[1] for _ in range(6)])
+
+    def test_lane_of_and_clamping(self):
+        queue = LaneQueue(num_lanes=2, lane_of=lambda x: x % 10 if x >= 0 else None)
+        for item in [5, -1, 0, 1]:
+            queue.put(item)
+
+        self.assertEqual([0, 5, 1, -1], [queue.get() for _ in range(4)])
+
+    def test_maxsize(self):
+        queue = LaneQueue(maxsize=1)
+        queue.put((0, 'a'))
+        with self.assertRaises(Full):
+            queue.put_nowait((1, 'b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
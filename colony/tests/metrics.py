@@ -0,0 +1,112 @@
+import io
+import time
+import unittest
+
+from colony.metrics import NodeMetrics, summarise
+from colony.node import Graph, Node, ThreadNode, ProcessNode
+
+
+def _x_squared(x):
+    if x < 0:
+        raise ValueError('Intentional')
+    return x * x
+
+
+def _sleepy_x_squared(x):
+    time.sleep(0.02)
+    return x * x
+
+
+class NodeMetricsTests(unittest.TestCase):
+    def test_summarise(self):
+        summary = summarise([float(x) for x in range(101)])
+
+        self.assertEqual(50.0, summary['mean'])
+        self.assertEqual(50.0, summary['p50'])
+        self.assertEqual(95.0, summary['p95'])
+        self.assertEqual(99.0, summary['p99'])
+        self.assertEqual(100.0, summary['max'])
+
+    def test_record_call(self):
+        metrics = NodeMetrics()
+        metrics.record_submitted(3)
+        metrics.record_call(10.0, 10.5, queued_at=9.0)
+        metrics.record_call(11.0, 11.5, is_error=True)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(2, snapshot['calls'])
+        self.assertEqual(1, snapshot['errors'])
+        self.assertEqual(1, snapshot['in_flight'])
+        self.assertEqual(1.0, snapshot['total_execution_time'])
+        self.assertEqual(1.0, snapshot['total_queue_wait'])
+
+
+class NodeStatsTests(unittest.TestCase):
+    def test_sync_node(self):
+        node = Node(target_func=_x_squared)
+        node.start()
+        node.notify(1)
+        node.notify(-1)
+        node.notify(2)
+
+        stats = node.stats()
+        self.assertEqual(3, stats['calls'])
+        self.assertEqual(1, stats['errors'])
+        self.assertEqual(0, stats['in_flight'])
+
+    def test_thread_node_queue_wait(self):
+        node = ThreadNode(target_func=_sleepy_x_squared, num_threads=1)
+        node.start()
+        node.notify_items(range(5))
+        node.stop()
+
+        stats = node.stats()
+        self.assertEqual(5, stats['calls'])
+        self.assertEqual(0, stats['in_flight'])
+        self.assertGreaterEqual(stats['execution_time']['p50'], 0.02)
+        # The last input waited for the four before it
+        self.assertGreaterEqual(stats['queue_wait']['max'], 0.07)
+        self.assertEqual(5, stats['queue']['enqueued'])
+
+    def test_process_node(self):
+        node = ProcessNode(target_func=_x_squared, num_threads=1)
+        node.start()
+        node.notify(1)
+        node.notify(-1)
+        node.stop()
+
+        stats = node.stats()
+        self.assertEqual(2, stats['calls'])
+        self.assertEqual(1, stats['errors'])
+        self.assertEqual(0, stats['in_flight'])
+
+    def test_graph_stats(self):
+        col = Graph()
+        node1 = col.add_node(target_func=_x_squared)
+        node2 = col.add_thread_node(target_func=_x_squared, node_args=node1)
+        col.start()
+        node1.notify(2)
+        col.stop()
+
+        stats = col.stats()
+        self.assertEqual({node1, node2}, set(stats))
+        self.assertEqual(1, stats[node2]['calls'])
+
+    def test_profiling(self):
+        node = ThreadNode(target_func=_sleepy_x_squared, num_threads=2)
+        self.assertIsNone(node.profile_stats())
+
+        node.enable_profiling()
+        node.start()
+        node.notify_items(range(4))
+        node.stop()
+
+        out = io.StringIO()
+        stats = node.profile_stats()
+        stats.stream = out
+        stats.print_stats()
+        self.assertIn('_sleepy_x_squared', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
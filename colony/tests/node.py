@@ -1,14 +1,22 @@
+import asyncio
 import os
 import tempfile
+import time
 import unittest
 from multiprocessing import Process
-from threading import Thread
+from threading import Event, Thread, Timer
 
 from colony.node import DictionaryNode
-from colony.node import Graph, Node, MappingArgInputPort, BatchArgInputPort, AsyncNode, AsyncWorker
+from colony.node import Graph, Node, ArgInputPort, MappingArgInputPort, BatchArgInputPort, AsyncNode, AsyncWorker
+from colony.node import ProcessNode, AsyncioNode, ThreadNode, BatchNode
+from colony.node import BLOCK, DROP_OLDEST, DROP_NEWEST, COALESCE
 from colony.observer import RememberingObserver, ProcessSafeRememberingObserver
 
 
+def _identity(x):
+    return x
+
+
 def _x_squared(x):
     return x * x
 
@@ -25,6 +33,22 @@ def _x_squared_elements(lst):
     return tuple(x * x for x in lst)
 
 
+def _pid_and_x_squared(x):
+    if x < 0:
+        raise ValueError('Intentional')
+    return os.getpid(), x * x
+
+
+def _count_to(n):
+    for i in range(n):
+        yield i
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
 class NodeTests(unittest.TestCase):
     def test_calls_observer(self):
         obs = RememberingObserver()
@@ -66,6 +90,216 @@ class NodeTests(unittest.TestCase):
         n.notify(3)
         self.assertEqual({0, 1, 2, 3}, n.get_value())
 
+    def test_input_snapshot_is_not_modified_by_later_inputs(self):
+        node = Node(target_func=_ax)
+        node.start()
+        node.notify(1)
+
+        snapshot = node.input_snapshot()
+        node.passive_input_ports['a'].notify(3)
+        node.notify(2)
+
+        self.assertEqual(((1, ), {'a': 1}), snapshot)
+        self.assertEqual(((2, ), {'a': 3}), node.input_snapshot())
+        self.assertEqual(6, node.get_value())
+
+    def test_concurrent_inputs_are_not_lost(self):
+        node = Node(target_func=lambda a, b, c, d: None)
+        node.start()
+
+        def send(idx):
+            for i in range(1000):
+                node.reactive_input_ports[idx].notify(i)
+
+        threads = [Thread(target=send, args=(idx, )) for idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual((999, 999, 999, 999), node.reactive_input_values)
+
+
+class DistinctUntilChangedTests(unittest.TestCase):
+    def test_unchanged_results_are_not_sent_downstream(self):
+        obs = RememberingObserver()
+        col = Graph()
+        source = col.add_node(target_func=_identity)
+        rounded = col.add_node(target_func=round, node_args=source, distinct_until_changed=True)
+        downstream = col.add_node(target_func=_x_squared, node_args=rounded)
+        downstream.output_port.register_observer(obs)
+        col.start()
+
+        source.notify_items([1.1, 1.2, 0.9, 2.2, 1.8, 1.0])
+        col.stop()
+
+        self.assertEqual([1, 4, 1], obs.calls)
+        self.assertEqual(3, rounded.stats()['unchanged'])
+        self.assertEqual(3, downstream.stats()['calls'])
+
+    def test_key_function(self):
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=_identity, num_threads=1,
+                          distinct_until_changed=lambda price: price['bid'])
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify_items([{'bid': 1, 'time': 0}, {'bid': 1, 'time': 1}, {'bid': 2, 'time': 2}])
+        node.stop()
+
+        self.assertEqual([{'bid': 1, 'time': 0}, {'bid': 2, 'time': 2}], obs.calls)
+        self.assertEqual({'bid': 2, 'time': 2}, node.get_value())
+
+
+class SlotsTests(unittest.TestCase):
+    def test_ports_and_workers_have_no_dict(self):
+        node = Node(target_func=_ax)
+        for obj in [node.reactive_input_ports[0], node.passive_input_ports['a'], node.output_port, node.worker,
+                    ThreadNode(target_func=_identity).worker]:
+            self.assertFalse(hasattr(obj, '__dict__'), obj)
+
+    def test_observers_are_notified_in_registration_order(self):
+        node = Node(target_func=_identity)
+        observers = [RememberingObserver() for _ in range(5)]
+        for obs in observers + observers:
+            node.output_port.register_observer(obs)
+        node.start()
+        node.notify(1)
+
+        self.assertEqual(tuple(observers), node.output_port.observers)
+        self.assertEqual([[1]] * 5, [obs.calls for obs in observers])
+
+
+class LazyNodeTests(unittest.TestCase):
+    def test_computes_only_when_read(self):
+        col = Graph()
+        source = col.add_node(target_func=_identity)
+        lazy = col.add_node(target_func=_x_squared, node_args=source, lazy=True)
+        col.start()
+
+        source.notify_items([1, 2, 3])
+        self.assertEqual(0, lazy.stats()['calls'])
+        self.assertEqual(9, lazy.get_value())
+        self.assertEqual(9, lazy.get_value())
+        col.stop()
+
+        self.assertEqual(1, lazy.stats()['calls'])
+
+    def test_pulls_dirty_lazy_sources(self):
+        col = Graph()
+        source = col.add_node(target_func=_identity)
+        squared = col.add_node(target_func=_x_squared, node_args=source, lazy=True)
+        plus_one = col.add_node(target_func=_x_plus_one, node_args=squared, lazy=True)
+        scaled = col.add_node(target_func=_ax, node_args=source, node_kwargs={'a': squared}, lazy=True)
+        col.start()
+
+        source.notify_items([1, 2])
+        self.assertTrue(plus_one.is_dirty)
+        for _ in range(2):
+            self.assertEqual(5, plus_one.get_value())
+            self.assertEqual(8, scaled.get_value())
+        self.assertFalse(plus_one.is_dirty)
+        self.assertEqual(1, squared.stats()['calls'])
+        self.assertEqual(1, plus_one.stats()['calls'])
+        self.assertEqual(1, scaled.stats()['calls'])
+
+        source.notify(3)
+        self.assertEqual(27, scaled.get_value())
+        col.stop()
+
+        self.assertEqual(2, squared.stats()['calls'])
+        self.assertEqual(1, plus_one.stats()['calls'])
+        self.assertEqual(2, scaled.stats()['calls'])
+
+    def test_computes_eagerly_for_eager_consumers(self):
+        obs = RememberingObserver()
+        col = Graph()
+        source = col.add_node(target_func=_identity)
+        squared = col.add_node(target_func=_x_squared, node_args=source, lazy=True)
+        plus_one = col.add_node(target_func=_x_plus_one, node_args=squared, lazy=True)
+        plus_one.output_port.register_observer(obs)
+        col.start()
+
+        source.notify_items([1, 2])
+        col.stop()
+
+        self.assertEqual([2, 5], obs.calls)
+        self.assertFalse(squared.is_dirty)
+
+    def test_sync_workers_only(self):
+        with self.assertRaises(ValueError):
+            ThreadNode(target_func=_identity, lazy=True)
+
+
+class TopologicalGraphTests(unittest.TestCase):
+    def test_diamond_executes_each_node_once_per_wave(self):
+        calls = []
+
+        def _sum(x, y):
+            calls.append((x, y))
+            return x + y
+
+        col = Graph(topological=True)
+        top = col.add_node(target_func=_x_plus_one)
+        left = col.add_node(target_func=_x_squared, node_args=top)
+        right = col.add_node(target_func=_x_plus_one, node_args=top)
+        bottom = col.add_node(target_func=_sum, node_args=(left, right))
+        col.start()
+
+        top.notify(1)
+
+        self.assertEqual([(4, 3)], calls)
+        self.assertEqual(7, bottom.get_value())
+
+    def test_topological_order(self):
+        col = Graph()
+        c = col.add_node(target_func=_x_plus_one)
+        a = col.add_node(target_func=_x_plus_one)
+        b = col.add_node(target_func=_x_plus_one, node_args=a)
+        b.output_port.register_observer(c.reactive_input_ports[0])
+
+        self.assertEqual([a, b, c], col.topological_order())
+
+    def test_deep_chain_does_not_recurse(self):
+        col = Graph(topological=True)
+        node = first = col.add_node(target_func=_x_plus_one)
+        for _ in range(5000):
+            node = col.add_node(target_func=_x_plus_one, node_args=node)
+        col.start()
+
+        first.notify(0)
+
+        self.assertEqual(5001, node.get_value())
+
+    def test_mapping_port_executes_every_item(self):
+        obs = RememberingObserver()
+        col = Graph(topological=True)
+        source = col.add_node(target_func=_identity)
+        map_node = col.add_node(target_func=_x_squared,
+                                reactive_input_ports=MappingArgInputPort(),
+                                node_args=source)
+        map_node.output_port.register_observer(obs)
+        col.start()
+
+        source.notify((1, 2, 3))
+
+        self.assertEqual([1, 4, 9], obs.calls)
+
+    def test_updates_from_other_threads_are_not_merged(self):
+        obs = RememberingObserver()
+        col = Graph(topological=True)
+        source = col.add_thread_node(target_func=_identity, num_threads=4)
+        squared = col.add_node(target_func=_x_squared, node_args=source)
+        plus_one = col.add_node(target_func=_x_plus_one, node_args=squared)
+        plus_one.output_port.register_observer(obs)
+        col.start()
+
+        source.notify_items(range(2000))
+        col.stop()
+
+        self.assertEqual({x * x + 1 for x in range(2000)}, obs.call_set)
+        self.assertEqual(2000, len(obs.calls))
+
 
 class DictionaryNodeTests(unittest.TestCase):
     def setUp(self):
@@ -87,6 +321,21 @@ class DictionaryNodeTests(unittest.TestCase):
 
         self.assertEqual({}, self.dictionary_node.get_value())
 
+    def test_emits_deltas(self):
+        obs = RememberingObserver()
+        self.dictionary_node.output_port.register_observer(obs)
+        self.dictionary_node.notify(('update', {'hello': 'world', 'red': 1}))
+        self.dictionary_node.notify(('update', {'red': 2, 'green': 3}))
+        self.dictionary_node.notify(('delete', ('hello', 'blue')))
+
+        added, updated, deleted = obs.calls
+        self.assertEqual({'hello': 'world', 'red': 1}, added.added)
+        self.assertEqual(({'green': 3}, {'red': 2}), (updated.added, updated.updated))
+        self.assertEqual({'hello': 'world'}, deleted.removed)
+        self.assertEqual({'red': 2, 'green': 3}, deleted)
+        with self.assertRaises(TypeError):
+            deleted['red'] = 4
+
     def test_notify_and_get_value_recovers(self):
         self.dictionary_node.notify(('update', {'hello': 'world'}))
 
@@ -259,5 +508,582 @@ class AsyncNodeTests(unittest.TestCase):
         self.assertEqual({2, 6}, obs.call_set)
 
 
+class BoundedQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.started = Event()
+        self.release = Event()
+
+    def _gated_identity(self, x):
+        self.started.set()
+        self.release.wait()
+        return x
+
+    def _build_busy_node(self, overflow_policy):
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=self._gated_identity,
+                          num_threads=1,
+                          max_queue_size=2,
+                          overflow_policy=overflow_policy)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        # Occupy the only worker thread, so that later inputs queue up
+        node.notify(0)
+        self.started.wait()
+        return node, obs
+
+    def test_drop_newest(self):
+        node, obs = self._build_busy_node(DROP_NEWEST)
+        node.notify_items(range(1, 6))
+        self.release.set()
+        node.stop()
+
+        self.assertEqual([0, 1, 2], obs.calls)
+        self.assertEqual(3, node.worker.queue_stats()['dropped'])
+
+    def test_drop_oldest(self):
+        node, obs = self._build_busy_node(DROP_OLDEST)
+        node.notify_items(range(1, 6))
+        self.release.set()
+        node.stop()
+
+        self.assertEqual([0, 4, 5], obs.calls)
+        self.assertEqual(3, node.worker.queue_stats()['dropped'])
+
+    def test_coalesce(self):
+        node, obs = self._build_busy_node(COALESCE)
+        node.notify_items(range(1, 6))
+        self.release.set()
+        node.stop()
+
+        self.assertEqual(5, obs.calls[-1])
+        self.assertNotIn(3, obs.calls)
+
+    def test_block(self):
+        node, obs = self._build_busy_node(BLOCK)
+        producer = Thread(target=node.notify_items, args=(range(1, 6),))
+        producer.start()
+        producer.join(0.2)
+
+        self.assertTrue(producer.is_alive())
+        self.assertEqual(2, node.worker.queue_stats()['max_queue_depth'])
+
+        self.release.set()
+        producer.join()
+        node.stop()
+
+        self.assertEqual([0, 1, 2, 3, 4, 5], obs.calls)
+        self.assertEqual(0, node.worker.queue_stats()['dropped'])
+
+    def test_graph_queue_stats(self):
+        col = Graph()
+        node = col.add_thread_node(target_func=_x_squared, max_queue_size=10, overflow_policy=DROP_NEWEST)
+        col.add_node(target_func=_x_plus_one, node_args=node)
+        col.start()
+        node.notify(2)
+        col.stop()
+
+        stats = col.queue_stats()
+        self.assertEqual([node], list(stats))
+        self.assertEqual(1, stats[node]['enqueued'])
+        self.assertEqual(10, stats[node]['max_queue_size'])
+
+    def test_invalid_overflow_policy(self):
+        self.assertRaises(ValueError, ThreadNode, target_func=_x_squared, overflow_policy='explode')
+
+
+class ConflationTests(unittest.TestCase):
+    def setUp(self):
+        self.started = Event()
+        self.release = Event()
+
+    def _gated_sum(self, x, y):
+        self.started.set()
+        self.release.wait()
+        return x + y
+
+    def test_busy_node_runs_once_on_latest_inputs(self):
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=self._gated_sum, num_threads=4, conflate=True,
+                          default_reactive_input_values=(0, 0))
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify(1)
+        self.started.wait()
+        node.notify_items(range(2, 6))
+        node.notify(10, port_idx=1)
+        self.release.set()
+        node.stop()
+
+        self.assertEqual([1, 15], obs.calls)
+        self.assertEqual(4, node.worker.queue_stats()['conflated'])
+        self.assertEqual(0, node.stats()['in_flight'])
+
+    def test_idle_node_runs_every_input(self):
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=_identity, num_threads=1, conflate=True)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        for i in range(3):
+            node.notify(i)
+            node.worker.join()
+        node.stop()
+
+        self.assertEqual([0, 1, 2], obs.calls)
+        self.assertEqual(0, node.worker.queue_stats()['conflated'])
+
+    def test_process_node(self):
+        obs = RememberingObserver()
+        node = ProcessNode(target_func=_identity, num_threads=2, conflate=True)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        # The first input keeps the node busy until its result is handled
+        node.notify_items(range(1, 6))
+        node.stop()
+
+        self.assertEqual([1, 5], obs.calls)
+        self.assertEqual(3, node.worker.queue_stats()['conflated'])
+
+
+class PriorityTests(unittest.TestCase):
+    def setUp(self):
+        self.started = Event()
+        self.release = Event()
+
+    def _gated_identity(self, x):
+        self.started.set()
+        self.release.wait()
+        return x
+
+    def test_urgent_messages_jump_the_queue(self):
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=self._gated_identity, num_threads=1, num_priorities=2)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify('first')
+        self.started.wait()
+        node.notify_items(['bulk1', 'bulk2'])
+        node.notify('urgent', priority=0)
+        self.assertEqual([1, 2], node.worker.queue_stats()['lane_depths'])
+        self.release.set()
+        node.stop()
+
+        self.assertEqual(['first', 'urgent', 'bulk1', 'bulk2'], obs.calls)
+
+    def test_port_priority(self):
+        obs = RememberingObserver()
+        ports = [ArgInputPort(0), ArgInputPort(1, priority=0)]
+        node = ThreadNode(target_func=lambda x, y: self._gated_identity((x, y)), num_threads=1, num_priorities=2,
+                          reactive_input_ports=ports)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify(1)
+        self.started.wait()
+        node.notify(2)
+        node.notify('close', port_idx=1)
+        self.release.set()
+        node.stop()
+
+        self.assertEqual([(1, None), (2, 'close'), (2, None)], obs.calls)
+
+    def test_bulk_traffic_is_not_starved(self):
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=self._gated_identity, num_threads=1, num_priorities=2, starvation_limit=2)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify('first')
+        self.started.wait()
+        node.notify('bulk')
+        node.notify_items(range(4), priority=0)
+        self.release.set()
+        node.stop()
+
+        self.assertEqual(['first', 0, 1, 'bulk', 2, 3], obs.calls)
+
+    def test_unsupported_settings(self):
+        with self.assertRaises(ValueError):
+            ThreadNode(target_func=_identity, num_priorities=2, max_queue_size=2, overflow_policy=DROP_OLDEST)
+        with self.assertRaises(ValueError):
+            AsyncWorker(Node(_identity), async_class=Process, num_priorities=2)
+
+
+class GraphStopTests(unittest.TestCase):
+    def setUp(self):
+        self.started = Event()
+        self.release = Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def _gated_identity(self, x):
+        self.started.set()
+        self.release.wait()
+        return x
+
+    def _always_fails(self, x):
+        raise ValueError('Intentional')
+
+    def test_join_after_failed_target(self):
+        node = ThreadNode(target_func=self._always_fails, num_threads=1)
+        node.start()
+        node.notify(1)
+
+        joiner = Thread(target=node.worker.join)
+        joiner.start()
+        joiner.join(5)
+
+        self.assertFalse(joiner.is_alive())
+        node.stop()
+
+    def test_drain_passes_queued_inputs_downstream(self):
+        obs = RememberingObserver()
+        col = Graph()
+        first = col.add_thread_node(target_func=_x_plus_one, num_threads=1)
+        second = col.add_thread_node(target_func=_x_squared, node_args=first, num_threads=1)
+        second.output_port.register_observer(obs)
+        col.start()
+
+        first.notify_items(range(5))
+        report = col.stop()
+
+        self.assertEqual({1, 4, 9, 16, 25}, obs.call_set)
+        self.assertEqual({}, report['dropped'])
+        self.assertEqual([], report['timed_out'])
+
+    def test_fast_abort_drops_queued_inputs(self):
+        obs = RememberingObserver()
+        col = Graph()
+        node = col.add_thread_node(target_func=self._gated_identity, num_threads=1)
+        node.output_port.register_observer(obs)
+        col.start()
+
+        node.notify(0)
+        self.started.wait()
+        node.notify_items(range(1, 4))
+        # Let the executing input finish once stop has discarded the queue
+        Timer(0.2, self.release.set).start()
+        report = col.stop(drain=False)
+
+        self.assertEqual([0], obs.calls)
+        self.assertEqual({node: 3}, report['dropped'])
+        self.assertEqual(0, node.stats()['in_flight'])
+
+    def test_timeout_abandons_stuck_thread(self):
+        col = Graph()
+        node = col.add_thread_node(target_func=self._gated_identity, num_threads=1)
+        downstream = col.add_node(target_func=_identity, node_args=node)
+        col.start()
+
+        node.notify_items(range(3))
+        self.started.wait()
+        report = col.stop(timeout=0.2)
+
+        self.assertEqual([node], report['timed_out'])
+        self.assertEqual({node: 2}, report['dropped'])
+        self.assertLess(report['elapsed'], 2)
+        self.assertIsNone(downstream.get_value())
+
+    def test_timeout_terminates_stuck_process(self):
+        col = Graph()
+        node = col.add_process_node(target_func=_sleep, num_threads=1)
+        col.start()
+
+        node.notify(60)
+        time.sleep(0.5)
+        report = col.stop(timeout=0.5)
+
+        self.assertEqual([node], report['timed_out'])
+        self.assertLess(report['elapsed'], 5)
+        self.assertFalse(any(p.is_alive() for p in node.worker.worker_threads))
+
+
+class BatchNodeTests(unittest.TestCase):
+    def test_groups_inputs_into_batches(self):
+        batch_sizes = []
+
+        def _x_squared_batch(xs):
+            batch_sizes.append(len(xs))
+            return [x * x for x in xs]
+
+        obs = RememberingObserver()
+        node = BatchNode(target_func=_x_squared_batch, max_batch_size=4, max_batch_wait=0.5)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify_items(range(10))
+        node.stop()
+
+        self.assertEqual([4, 4, 2], batch_sizes)
+        self.assertEqual([x * x for x in range(10)], obs.calls)
+
+    def test_reactive_args_are_batched_per_argument(self):
+        batches = []
+
+        def _add_batch(xs, ys, scale=1):
+            batches.append((xs, ys, scale))
+            return [scale * (x + y) for x, y in zip(xs, ys)]
+
+        obs = RememberingObserver()
+        col = Graph()
+        xs_node = col.add_node(target_func=_identity)
+        ys_node = col.add_node(target_func=_identity)
+        batch_node = col.add_batch_node(target_func=_add_batch,
+                                        node_args=(xs_node, ys_node),
+                                        default_reactive_input_values=[0, 0],
+                                        max_batch_wait=0.2)
+        batch_node.output_port.register_observer(obs)
+        col.start()
+
+        ys_node.notify(10)
+        xs_node.notify(1)
+        xs_node.notify(2)
+        batch_node.passive_input_ports['scale'].notify(2)
+        xs_node.notify(3)
+        col.stop()
+
+        self.assertEqual([([0, 1, 2, 3], [10, 10, 10, 10], 2)], batches)
+        self.assertEqual([20, 22, 24, 26], obs.calls)
+
+    def test_wrong_number_of_results_is_not_emitted(self):
+        obs = RememberingObserver()
+        node = BatchNode(target_func=lambda xs: xs[:1], max_batch_size=2, max_batch_wait=0.5)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify_items((1, 2))
+        node.stop()
+
+        self.assertEqual([], obs.calls)
+
+
+class ProcessNodeTests(unittest.TestCase):
+    def test_results_are_handled_in_parent(self):
+        obs = RememberingObserver()
+        node = ProcessNode(target_func=_pid_and_x_squared, num_threads=2)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify(2)
+        node.notify(-1)
+        node.notify(3)
+        node.worker.stop()
+
+        pids = {pid for pid, _ in obs.calls}
+        self.assertEqual({4, 9}, {x for _, x in obs.calls})
+        self.assertNotIn(os.getpid(), pids)
+        self.assertIn(node.get_value(), obs.calls)
+
+    def test_downstream_nodes_run_in_parent(self):
+        obs = RememberingObserver()
+        col = Graph()
+        process_node = col.add_process_node(target_func=_pid_and_x_squared, num_threads=1)
+        parent_node = col.add_node(target_func=lambda x: (os.getpid(), x[1]), node_args=process_node)
+        parent_node.output_port.register_observer(obs)
+        col.start()
+
+        process_node.notify(5)
+        col.stop()
+
+        self.assertEqual([(os.getpid(), 25)], obs.calls)
+
+
+class StreamingTests(unittest.TestCase):
+    def test_items_are_passed_on_as_they_are_produced(self):
+        events = []
+
+        def pages(n):
+            for i in range(n):
+                events.append('fetched %i' % i)
+                yield i
+
+        col = Graph()
+        fetch = col.add_node(target_func=pages)
+        save = col.add_node(target_func=lambda page: events.append('saved %i' % page), node_args=fetch)
+        col.start()
+        fetch.notify(2)
+        col.stop()
+
+        self.assertEqual(['fetched 0', 'saved 0', 'fetched 1', 'saved 1'], events)
+        self.assertEqual(1, fetch.get_value())
+        self.assertEqual(1, fetch.stats()['calls'])
+        self.assertEqual(2, save.stats()['calls'])
+
+    def test_topological_graph_passes_on_every_item(self):
+        def pages(n):
+            for i in range(n):
+                yield i
+
+        obs = RememberingObserver()
+        col = Graph(topological=True)
+        fetch = col.add_node(target_func=pages)
+        save = col.add_node(target_func=_identity, node_args=fetch)
+        save.output_port.register_observer(obs)
+        col.start()
+        fetch.notify(3)
+        col.stop()
+
+        self.assertEqual([0, 1, 2], obs.calls)
+        self.assertEqual(2, save.get_value())
+
+    def test_thread_node_streams_with_backpressure(self):
+        state = {'produced': 0, 'consumed': 0, 'max_ahead': 0}
+
+        def produce(n):
+            for i in range(n):
+                state['produced'] += 1
+                state['max_ahead'] = max(state['max_ahead'], state['produced'] - state['consumed'])
+                yield i
+
+        def consume(x):
+            time.sleep(0.005)
+            state['consumed'] += 1
+
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=produce, num_threads=1, max_queue_size=1)
+        node.output_port.register_observer(obs)
+        consumer = Node(consume, node_args=node)
+        consumer.start()
+        node.start()
+
+        node.notify(20)
+        node.stop()
+        consumer.stop()
+
+        self.assertEqual(list(range(20)), obs.calls)
+        self.assertLessEqual(state['max_ahead'], 3)
+        self.assertEqual(1, node.stats()['calls'])
+
+    def test_generators_are_not_cached(self):
+        obs = RememberingObserver()
+        node = Node(target_func=_count_to, memoize=True)
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify(2)
+        node.notify(2)
+        node.stop()
+
+        self.assertEqual([0, 1, 0, 1], obs.calls)
+        self.assertEqual(2, node.stats()['calls'])
+
+    def test_process_node(self):
+        obs = RememberingObserver()
+        node = ProcessNode(target_func=_count_to, num_threads=1)
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify(3)
+        node.stop()
+
+        self.assertEqual([0, 1, 2], obs.calls)
+        self.assertEqual(1, node.stats()['calls'])
+
+    def test_async_generator(self):
+        async def ticks(n):
+            for i in range(n):
+                await asyncio.sleep(0.001)
+                yield i
+
+        obs = RememberingObserver()
+        node = AsyncioNode(target_func=ticks)
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify(3)
+        node.stop()
+
+        self.assertEqual([0, 1, 2], obs.calls)
+        self.assertEqual(2, node.get_value())
+
+    def test_asyncio_node_runs_plain_generators_in_the_executor(self):
+        obs = RememberingObserver()
+        node = AsyncioNode(target_func=_count_to)
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify(3)
+        node.stop()
+
+        self.assertEqual([0, 1, 2], obs.calls)
+
+
+class AsyncioNodeTests(unittest.TestCase):
+    def test_coroutine_target_runs_concurrently(self):
+        state = {'running': 0, 'max_running': 0}
+
+        async def _slow_x_squared(x):
+            state['running'] += 1
+            state['max_running'] = max(state['max_running'], state['running'])
+            await asyncio.sleep(0.1)
+            state['running'] -= 1
+            return x * x
+
+        obs = RememberingObserver()
+        node = AsyncioNode(target_func=_slow_x_squared, max_concurrency=50)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        start = time.time()
+        node.notify_items(range(200))
+        node.stop()
+        elapsed = time.time() - start
+
+        self.assertEqual({x * x for x in range(200)}, obs.call_set)
+        self.assertEqual(50, state['max_running'])
+        self.assertLess(elapsed, 2.0)
+
+    def test_fast_abort_cancels_pending_calls(self):
+        async def _very_slow(x):
+            await asyncio.sleep(60)
+            return x
+
+        node = AsyncioNode(target_func=_very_slow, max_concurrency=2)
+        node.start()
+        node.notify_items(range(5))
+
+        report = node.stop(drain=False, timeout=1)
+
+        self.assertEqual({'dropped': 5, 'timed_out': False}, report)
+        self.assertEqual(0, node.stats()['in_flight'])
+
+    def test_failed_submit_is_not_left_pending(self):
+        async def _async_x_squared(x):
+            return x * x
+
+        # Not started, so the call cannot be submitted to an event loop
+        node = AsyncioNode(target_func=_async_x_squared)
+        node.notify(1)
+
+        self.assertEqual(0, node.worker.num_pending)
+        self.assertTrue(node.worker.join(timeout=0))
+        self.assertEqual(0, node.stats()['in_flight'])
+
+    def test_graph_manages_event_loop(self):
+        async def _async_x_plus_one(x):
+            await asyncio.sleep(0)
+            return x + 1
+
+        obs = RememberingObserver()
+        col = Graph()
+        node1 = col.add_asyncio_node(target_func=_async_x_plus_one)
+        node2 = col.add_asyncio_node(target_func=_x_squared, node_args=node1)
+        node3 = col.add_node(target_func=_x_plus_one, node_args=node2)
+        node3.output_port.register_observer(obs)
+        col.start()
+
+        self.assertTrue(col.event_loop_thread.is_running)
+        self.assertIs(node1.worker.event_loop_thread, node2.worker.event_loop_thread)
+
+        node1.notify(1)
+        node1.worker.join()
+        node2.worker.join()
+        col.stop()
+
+        self.assertEqual([5], obs.calls)
+        self.assertFalse(col.event_loop_thread.is_running)
+
+
 if __name__ == '__main__':
     unittest.main()
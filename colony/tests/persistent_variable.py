@@ -0,0 +1,202 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+from colony.node import DictionaryNode, JournalDictionaryNode
+from colony.observer import RememberingObserver
+from colony.persistent_variable import JournalDictionary, PersistentVariable
+
+
+class PersistentVariableTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def test_set_value_recovers(self):
+        p = PersistentVariable('hello', folder=self.folder)
+        p.set_value({'hello': 'world'})
+
+        p2 = PersistentVariable('hello', folder=self.folder)
+
+        self.assertEqual({'hello': 'world'}, p2.get_value())
+        self.assertEqual(['hello'], os.listdir(self.folder))
+
+    def test_write_behind_coalesces_until_close(self):
+        p = PersistentVariable('hello', folder=self.folder, write_behind=True, flush_interval=60)
+        for i in range(1000):
+            p.set_value(i)
+
+        self.assertEqual(999, p.get_value())
+        self.assertIsNone(PersistentVariable('hello', folder=self.folder).get_value())
+
+        p.close()
+
+        self.assertEqual(999, PersistentVariable('hello', folder=self.folder).get_value())
+        self.assertEqual(['hello'], os.listdir(self.folder))
+
+    def test_write_behind_flushes_on_threshold(self):
+        p = PersistentVariable('hello', folder=self.folder, write_behind=True, flush_interval=60, flush_threshold=3)
+        p.set_value(1)
+        p.set_value(2)
+        p.set_value(3)
+
+        deadline = time.time() + 5
+        while not os.path.isfile(p.path) and time.time() < deadline:
+            time.sleep(0.01)
+        p.close()
+
+        self.assertEqual(3, PersistentVariable('hello', folder=self.folder).get_value())
+
+    def test_write_behind_flushes_on_interval(self):
+        p = PersistentVariable('hello', folder=self.folder, write_behind=True, flush_interval=0.01)
+        p.set_value('world')
+
+        deadline = time.time() + 5
+        while not os.path.isfile(p.path) and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual('world', PersistentVariable('hello', folder=self.folder).get_value())
+        p.close()
+
+    def test_write_behind_dictionary_node(self):
+        node = DictionaryNode(name='auctions', folder=self.folder, write_behind=True, flush_interval=60)
+        node.start()
+        for i in range(100):
+            node.notify(('update', {str(i): i}))
+        node.notify(('delete', '0'))
+        node.stop()
+
+        d2 = DictionaryNode(name='auctions', folder=self.folder)
+
+        self.assertEqual(99, len(d2.get_value()))
+        self.assertEqual(99, d2.get_value()['99'])
+
+
+    def test_distinct_deltas_are_all_sent(self):
+        obs = RememberingObserver()
+        node = DictionaryNode(name='auctions', folder=self.folder, distinct_until_changed=True)
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify(('update', {'a': 1}))
+        node.notify(('update', {'b': 2}))
+        node.notify(('delete', 'a'))
+        node.stop()
+
+        self.assertEqual([{'a': 1}, {'b': 2}, {}], [delta.added for delta in obs.calls])
+        self.assertEqual({'a': 1}, obs.calls[2].removed)
+
+
+class JournalDictionaryTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def test_replays_journal(self):
+        d = JournalDictionary('auctions', folder=self.folder)
+        d.update({'red': 1, 'green': 2})
+        d.update({'blue': 3})
+        d.delete('green')
+        d.close()
+
+        d2 = JournalDictionary('auctions', folder=self.folder)
+
+        self.assertEqual({'red': 1, 'blue': 3}, d2.get_value())
+        self.assertEqual(3, d2.num_records)
+        self.assertFalse(os.path.isfile(d2.path))
+
+    def test_compacts_into_snapshot(self):
+        d = JournalDictionary('auctions', folder=self.folder, compact_threshold=3)
+        d.update({'red': 1})
+        d.update({'green': 2})
+        d.update({'blue': 3})
+        d.update({'red': 4})
+        d.close()
+
+        with open(d.journal_path) as f:
+            self.assertEqual(1, len(f.readlines()))
+
+        d2 = JournalDictionary('auctions', folder=self.folder)
+        self.assertEqual({'red': 4, 'green': 2, 'blue': 3}, d2.get_value())
+
+    def test_ignores_torn_record(self):
+        d = JournalDictionary('auctions', folder=self.folder)
+        d.update({'red': 1})
+        d.close()
+        with open(d.journal_path, 'a') as f:
+            f.write('["update", {"gre')
+
+        d2 = JournalDictionary('auctions', folder=self.folder)
+        self.assertEqual({'red': 1}, d2.get_value())
+
+        d2.update({'blue': 3})
+        d2.close()
+
+        d3 = JournalDictionary('auctions', folder=self.folder)
+        self.assertEqual({'red': 1, 'blue': 3}, d3.get_value())
+
+    def test_journal_uses_the_serializer(self):
+        when = datetime.datetime(2024, 1, 2, 3, 4, 5)
+        d = JournalDictionary('auctions', folder=self.folder, serializer='pickle')
+        d.update({1: 'x', 'closes': when})
+        d.close()
+
+        d2 = JournalDictionary('auctions', folder=self.folder, serializer='pickle')
+        self.assertEqual({1: 'x', 'closes': when}, d2.get_value())
+
+        d2.compact()
+        d2.close()
+
+        d3 = JournalDictionary('auctions', folder=self.folder, serializer='pickle')
+        self.assertEqual({1: 'x', 'closes': when}, d3.get_value())
+        self.assertEqual(0, d3.num_records)
+
+    def test_journal_and_snapshot_round_trip_the_same_keys(self):
+        d = JournalDictionary('auctions', folder=self.folder)
+        d.update({1: 'x'})
+        d.close()
+        from_journal = JournalDictionary('auctions', folder=self.folder).get_value()
+
+        d.compact()
+        d.close()
+        from_snapshot = JournalDictionary('auctions', folder=self.folder).get_value()
+
+        self.assertEqual({'1': 'x'}, from_journal)
+        self.assertEqual(from_journal, from_snapshot)
+
+    def test_ignores_torn_binary_record(self):
+        d = JournalDictionary('auctions', folder=self.folder, serializer='pickle')
+        d.update({'red': 1})
+        d.update({'green': 2})
+        d.close()
+        with open(d.journal_path, 'r+b') as f:
+            f.truncate(os.path.getsize(d.journal_path) - 3)
+
+        d2 = JournalDictionary('auctions', folder=self.folder, serializer='pickle')
+        self.assertEqual({'red': 1}, d2.get_value())
+
+        d2.update({'blue': 3})
+        d2.close()
+
+        d3 = JournalDictionary('auctions', folder=self.folder, serializer='pickle')
+        self.assertEqual({'red': 1, 'blue': 3}, d3.get_value())
+
+    def test_journal_dictionary_node(self):
+        obs = RememberingObserver()
+        node = JournalDictionaryNode(name='auctions', folder=self.folder)
+        node.output_port.register_observer(obs)
+        node.start()
+        node.notify(('update', {'hello': 'world'}))
+        node.notify(('update', {'foo': 'bar'}))
+        node.notify(('delete', ['hello']))
+        node.stop()
+
+        self.assertEqual(3, node.persistent_value.num_records)
+        self.assertEqual({'foo': 'bar'}, obs.calls[1].added)
+        self.assertEqual({'hello': 'world'}, obs.calls[2].removed)
+
+        d2 = JournalDictionaryNode(name='auctions', folder=self.folder)
+        self.assertEqual({'foo': 'bar'}, d2.get_value())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import time
+import unittest
+from threading import Event
+
+from colony.node import Graph, ProcessNode, ThreadNode
+from colony.observer import RememberingObserver
+from colony.policies import CallPolicy, CallTimeoutError, CircuitBreaker, CircuitOpenError, RetryPolicy
+from colony.policies import call_with_timeout
+
+
+def _identity(x):
+    return x
+
+
+class Flaky(object):
+    """ Fails the first num_failures calls """
+
+    def __init__(self, num_failures):
+        self.num_failures = num_failures
+        self.num_calls = 0
+
+    def __call__(self, x):
+        self.num_calls += 1
+        if self.num_calls <= self.num_failures:
+            raise IOError('Intentional')
+        return x
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def test_delay_grows_exponentially_up_to_max_delay(self):
+        retry = RetryPolicy(initial_delay=1.0, multiplier=2.0, max_delay=5.0, jitter=0)
+
+        self.assertEqual([1.0, 2.0, 4.0, 5.0], [retry.delay(attempt) for attempt in range(1, 5)])
+
+    def test_jitter(self):
+        retry = RetryPolicy(initial_delay=1.0, jitter=0.5)
+        delays = [retry.delay(1) for _ in range(100)]
+
+        self.assertTrue(all(0.5 <= delay <= 1.5 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_should_retry(self):
+        retry = RetryPolicy(max_attempts=2, retry_on=(IOError, ))
+
+        self.assertTrue(retry.should_retry(1, IOError()))
+        self.assertFalse(retry.should_retry(2, IOError()))
+        self.assertFalse(retry.should_retry(1, ValueError()))
+        self.assertFalse(retry.should_retry(1, CircuitOpenError()))
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+        self.assertEqual(1, breaker.num_rejected)
+
+    def test_half_open_allows_one_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.1)
+
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        breaker.before_call()
+        self.assertRaises(CircuitOpenError, breaker.before_call)
+
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+
+        time.sleep(0.1)
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+
+class CallPolicyTests(unittest.TestCase):
+    def test_retries_until_success(self):
+        target = Flaky(2)
+        policy = CallPolicy(retry=RetryPolicy(max_attempts=3, initial_delay=0.001))
+
+        self.assertEqual(1, policy.call(target, 1))
+        self.assertEqual(2, policy.stats()['retries'])
+
+    def test_gives_up_after_max_attempts(self):
+        target = Flaky(5)
+        policy = CallPolicy(retry=RetryPolicy(max_attempts=3, initial_delay=0.001))
+
+        self.assertRaises(IOError, policy.call, target, 1)
+        self.assertEqual(3, target.num_calls)
+
+    def test_open_circuit_is_not_retried(self):
+        target = Flaky(5)
+        policy = CallPolicy(retry=RetryPolicy(max_attempts=5, initial_delay=0.001),
+                            circuit_breaker=CircuitBreaker(failure_threshold=2))
+
+        self.assertRaises(CircuitOpenError, policy.call, target, 1)
+        self.assertEqual(2, target.num_calls)
+        self.assertEqual({'retries': 2, 'timeouts': 0, 'circuit': CircuitBreaker.OPEN, 'rejected': 1},
+                         policy.stats())
+
+    def test_call_with_timeout(self):
+        self.assertEqual(3, call_with_timeout(_identity, (3, ), 1))
+        self.assertRaises(IOError, call_with_timeout, Flaky(1), (3, ), 1)
+
+        start = time.time()
+        self.assertRaises(CallTimeoutError, call_with_timeout, time.sleep, (5, ), 0.05)
+        self.assertLess(time.time() - start, 1)
+
+    def test_caps_abandoned_calls(self):
+        release = Event()
+        calls = []
+
+        def hangs(x):
+            calls.append(x)
+            release.wait()
+            return x
+
+        policy = CallPolicy(timeout=0.01, max_abandoned=2)
+        self.assertRaises(CallTimeoutError, policy.call, hangs, 1)
+        self.assertRaises(CallTimeoutError, policy.call, hangs, 2)
+        self.assertEqual(2, policy.stats()['abandoned'])
+
+        # Fails fast, without starting another thread
+        self.assertRaises(CallTimeoutError, policy.call, hangs, 3)
+        self.assertEqual([1, 2], calls)
+
+        release.set()
+        deadline = time.time() + 5
+        while policy.stats()['abandoned'] and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(0, policy.stats()['abandoned'])
+        self.assertEqual(4, policy.call(hangs, 4))
+
+
+class NodePolicyTests(unittest.TestCase):
+    def test_thread_node_retries(self):
+        obs = RememberingObserver()
+        col = Graph()
+        node = col.add_thread_node(target_func=Flaky(2), num_threads=1,
+                                   retry=RetryPolicy(max_attempts=3, initial_delay=0.001))
+        node.output_port.register_observer(obs)
+        col.start()
+
+        node.notify(1)
+        col.stop()
+
+        self.assertEqual([1], obs.calls)
+        self.assertEqual(0, node.stats()['errors'])
+        self.assertEqual(2, node.stats()['policy']['retries'])
+
+    def test_hung_call_does_not_block_worker_thread(self):
+        release = Event()
+
+        def hangs_on_zero(x):
+            if x == 0:
+                release.wait()
+            return x
+
+        obs = RememberingObserver()
+        node = ThreadNode(target_func=hangs_on_zero, num_threads=1, timeout=0.1)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify_items(range(3))
+        node.stop()
+        release.set()
+
+        self.assertEqual([1, 2], obs.calls)
+        self.assertEqual(1, node.stats()['errors'])
+        self.assertEqual(1, node.stats()['policy']['timeouts'])
+
+    def test_sync_node_circuit_breaker(self):
+        target = Flaky(100)
+        col = Graph()
+        node = col.add_node(target_func=target, circuit_breaker=CircuitBreaker(failure_threshold=3))
+        col.start()
+
+        node.notify_items(range(10))
+        col.stop()
+
+        self.assertEqual(3, target.num_calls)
+        self.assertEqual(7, node.stats()['policy']['rejected'])
+
+    def test_process_node_is_not_supported(self):
+        self.assertRaises(ValueError, ProcessNode, target_func=_identity, timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+from multiprocessing import Event, Process, Queue
+from threading import Thread
+
+from colony.node import Graph
+from colony.observer import RememberingObserver
+from colony.remote import RemoteSink, RemoteSource, recv_frame, send_frame
+from colony.serializers import JsonSerializer
+
+
+def _x_squared(x):
+    return x * x
+
+
+def _serve_squares(reply_address, port_queue, stop_event):
+    """ A subgraph in another process: squares what it receives and sends it back """
+    col = Graph(name='squares')
+    source = col.add_remote_source(('127.0.0.1', 0))
+    squares = col.add_node(target_func=_x_squared, node_args=source)
+    col.add_remote_sink(squares, reply_address)
+    col.start()
+
+    port_queue.put(source.address[1])
+    stop_event.wait()
+    col.stop()
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class FramingTests(unittest.TestCase):
+    def test_frames_round_trip(self):
+        a, b = socket.socketpair()
+
+        def send():
+            send_frame(a, b'hello')
+            send_frame(a, b'x' * 1000000)
+            a.close()
+
+        sender = Thread(target=send)
+        sender.start()
+
+        self.assertEqual(b'hello', recv_frame(b))
+        self.assertEqual(b'x' * 1000000, recv_frame(b))
+        self.assertIsNone(recv_frame(b))
+        sender.join()
+        b.close()
+
+    def test_truncated_frame(self):
+        a, b = socket.socketpair()
+        send_frame(a, b'hello')
+        b.recv(6)
+        a.close()
+
+        self.assertRaises(ConnectionError, recv_frame, b)
+        b.close()
+
+
+class RemoteTests(unittest.TestCase):
+    def test_subgraph_in_another_process(self):
+        obs = RememberingObserver()
+        col = Graph()
+        results = col.add_remote_source(('127.0.0.1', 0))
+        saved = col.add_node(target_func=lambda x: x, node_args=results)
+        saved.output_port.register_observer(obs)
+        col.start()
+
+        port_queue = Queue()
+        stop_event = Event()
+        process = Process(target=_serve_squares, args=(results.address, port_queue, stop_event))
+        process.start()
+        try:
+            port = port_queue.get(timeout=10)
+            sink = RemoteSink(('127.0.0.1', port))
+            sink.start()
+            for x in range(200):
+                sink.notify(x)
+            sink.stop()
+
+            _wait_for(lambda: len(obs.calls) == 200)
+        finally:
+            stop_event.set()
+            process.join()
+            col.stop()
+
+        self.assertEqual([x * x for x in range(200)], obs.calls)
+
+    def test_sink_reconnects_until_source_starts(self):
+        address = ('127.0.0.1', _free_port())
+        obs = RememberingObserver()
+        sink = RemoteSink(address, reconnect_delay=0.01)
+        sink.start()
+        sink.notify('a')
+        sink.notify('b')
+        time.sleep(0.1)
+
+        source = RemoteSource(address)
+        source.output_port.register_observer(obs)
+        source.start()
+        _wait_for(lambda: len(obs.calls) == 2)
+        report = sink.stop()
+        source.stop()
+
+        self.assertEqual(['a', 'b'], obs.calls)
+        self.assertEqual({'dropped': 0, 'timed_out': False}, report)
+        self.assertGreater(sink.stats()['reconnects'], 0)
+
+    def test_unsent_messages_are_dropped_on_timeout(self):
+        sink = RemoteSink(('127.0.0.1', _free_port()), reconnect_delay=0.01)
+        sink.start()
+        for x in range(3):
+            sink.notify(x)
+
+        report = sink.stop(timeout=0.2)
+
+        self.assertEqual({'dropped': 3, 'timed_out': True}, report)
+
+    def test_unix_socket_with_json(self):
+        address = os.path.join(tempfile.mkdtemp(), 'colony.sock')
+        obs = RememberingObserver()
+        source = RemoteSource(address, serializer='json')
+        source.output_port.register_observer(obs)
+        source.start()
+
+        sink = RemoteSink(address, serializer='json')
+        sink.start()
+        sink.notify({'price': 1.5})
+        sink.stop()
+        _wait_for(lambda: obs.calls)
+        source.stop()
+
+        self.assertEqual([{'price': 1.5}], obs.calls)
+        self.assertFalse(os.path.exists(address))
+
+    def test_unencodable_message_is_dropped(self):
+        address = os.path.join(tempfile.mkdtemp(), 'colony.sock')
+        obs = RememberingObserver()
+        source = RemoteSource(address)
+        source.output_port.register_observer(obs)
+        source.start()
+
+        sink = RemoteSink(address)
+        sink.start()
+        sink.notify({1, 2})
+        sink.notify('ok')
+        report = sink.stop()
+        _wait_for(lambda: obs.calls)
+        source.stop()
+
+        self.assertEqual(['ok'], obs.calls)
+        self.assertEqual({'dropped': 1, 'timed_out': False}, report)
+        self.assertEqual(1, sink.stats()['sent'])
+
+    def test_stop_does_not_wait_for_a_peer_that_stopped_reading(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+
+        sink = RemoteSink(server.getsockname(), serializer='pickle', max_batch_size=1)
+        sink.start()
+        for _ in range(50):
+            sink.notify(b'x' * 1000000)
+
+        start = time.time()
+        report = sink.stop(timeout=0.5)
+        elapsed = time.time() - start
+        server.close()
+
+        self.assertTrue(report['timed_out'])
+        self.assertGreater(report['dropped'], 0)
+        self.assertLess(elapsed, 3)
+        self.assertFalse(sink.thread.is_alive())
+
+    def test_defaults_to_json(self):
+        self.assertIsInstance(RemoteSink(('127.0.0.1', 1)).serializer, JsonSerializer)
+        self.assertIsInstance(RemoteSource(('127.0.0.1', 0)).serializer, JsonSerializer)
+
+    def test_pickle_is_opt_in(self):
+        address = os.path.join(tempfile.mkdtemp(), 'colony.sock')
+        obs = RememberingObserver()
+        source = RemoteSource(address, serializer='pickle')
+        source.output_port.register_observer(obs)
+        source.start()
+
+        sink = RemoteSink(address, serializer='pickle')
+        sink.start()
+        sink.notify(('red', 1))
+        sink.stop()
+        _wait_for(lambda: obs.calls)
+        source.stop()
+
+        self.assertEqual([('red', 1)], obs.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
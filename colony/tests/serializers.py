@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from colony.node import PersistentNode
+from colony.persistent_variable import PersistentVariable
+from colony.serializers import JsonSerializer, PickleSerializer, SerializationError, get_serializer
+from colony.serializers import msgpack, np
+
+
+def _remember(x):
+    return x
+
+
+class SerializerTests(unittest.TestCase):
+    def test_json_round_trip(self):
+        serializer = JsonSerializer()
+        value = {'red': [1, 2.5, None, 'x']}
+        self.assertEqual(value, serializer.loads(serializer.dumps(value)))
+
+    def test_pickle_round_trip(self):
+        serializer = PickleSerializer()
+        value = {'red': (1, 2), 'green': {3, 4}, 'when': datetime(2020, 1, 2)}
+        self.assertEqual(value, serializer.loads(serializer.dumps(value)))
+
+    def test_decode_error(self):
+        self.assertRaises(SerializationError, JsonSerializer().loads, '{"red"')
+        self.assertRaises(SerializationError, PickleSerializer().loads, b'not a pickle')
+
+    def test_get_serializer(self):
+        self.assertIsInstance(get_serializer(), JsonSerializer)
+        self.assertIsInstance(get_serializer('pickle'), PickleSerializer)
+        serializer = PickleSerializer(protocol=2)
+        self.assertIs(serializer, get_serializer(serializer))
+        self.assertRaises(ValueError, get_serializer, 'yaml')
+
+    @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack_round_trip(self):
+        serializer = get_serializer('msgpack')
+        value = {'red': [1, 2.5, None, 'x'], 3: b'bytes'}
+        self.assertEqual(value, serializer.loads(serializer.dumps(value)))
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_numpy_memory_maps_array(self):
+        folder = tempfile.mkdtemp()
+        p = PersistentVariable('prices', folder=folder, serializer='numpy')
+        p.set_value(np.arange(10.0))
+
+        p2 = PersistentVariable('prices', folder=folder, serializer='numpy')
+
+        self.assertIsInstance(p2.get_value(), np.memmap)
+        self.assertEqual(45.0, p2.get_value().sum())
+
+
+class PersistentVariableSerializerTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def test_pickle_persistent_variable(self):
+        p = PersistentVariable('hello', folder=self.folder, serializer='pickle')
+        p.set_value(('hello', {'world'}))
+
+        p2 = PersistentVariable('hello', folder=self.folder, serializer='pickle')
+
+        self.assertEqual(('hello', {'world'}), p2.get_value())
+
+    def test_decode_error_is_logged(self):
+        with open(os.path.join(self.folder, 'hello'), 'w') as f:
+            f.write('{"hello"')
+
+        with self.assertLogs(level='ERROR'):
+            p = PersistentVariable('hello', folder=self.folder)
+
+        self.assertIsNone(p.get_value())
+
+    def test_persistent_node_serializer(self):
+        node = PersistentNode(target_func=_remember, name='hello', folder=self.folder, serializer='pickle')
+        node.start()
+        node.notify((1, 2))
+
+        node2 = PersistentNode(target_func=_remember, name='hello', folder=self.folder, serializer='pickle')
+
+        self.assertEqual((1, 2), node2.get_value())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import unittest
+
+from colony.node import DROP_NEWEST, ProcessNode
+from colony.observer import RememberingObserver
+from colony.transport import SharedMemoryHandle, SharedMemoryTransport, np
+
+
+def _describe(data, suffix=b''):
+    return type(data).__name__, len(data), bytes(data[:3]) + suffix
+
+
+def _reverse(data):
+    return data[::-1]
+
+
+def _block_exists(name):
+    return os.path.exists(os.path.join('/dev/shm', name))
+
+
+class SharedMemoryTransportTests(unittest.TestCase):
+    def test_small_payloads_are_not_packed(self):
+        transport = SharedMemoryTransport(threshold=100)
+
+        self.assertEqual(b'abc', transport.pack(b'abc'))
+        self.assertEqual(['abc'], transport.pack(['abc']))
+        self.assertEqual(set(), transport.pending)
+
+    def test_bytes_round_trip(self):
+        sender = SharedMemoryTransport(threshold=100)
+        receiver = SharedMemoryTransport(threshold=100)
+        payload = os.urandom(1000)
+
+        handle = sender.pack(payload)
+        self.assertIsInstance(handle, SharedMemoryHandle)
+        self.assertEqual({handle.name}, sender.pending)
+
+        self.assertEqual(payload, receiver.unpack(handle))
+        self.assertEqual([handle.name], receiver.release())
+
+        sender.free([handle.name])
+        self.assertEqual(set(), sender.pending)
+        self.assertFalse(_block_exists(handle.name))
+
+    def test_memoryview_is_not_copied(self):
+        sender = SharedMemoryTransport(threshold=100)
+        receiver = SharedMemoryTransport(threshold=100)
+
+        handle = sender.pack(bytearray(1000))
+        view = receiver.unpack(handle)
+
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(1000, len(view))
+        view.release()
+        receiver.release()
+        sender.free_all()
+
+    def test_result_round_trip(self):
+        sender = SharedMemoryTransport(threshold=100)
+        receiver = SharedMemoryTransport(threshold=100)
+        payload = os.urandom(1000)
+
+        handle = sender.pack_result(payload)
+
+        self.assertEqual(set(), sender.pending)
+        self.assertEqual(payload, receiver.unpack_result(handle))
+        self.assertEqual([], receiver.attached)
+        self.assertFalse(_block_exists(handle.name))
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_array_round_trip(self):
+        sender = SharedMemoryTransport(threshold=100)
+        receiver = SharedMemoryTransport(threshold=100)
+        payload = np.arange(1000.0).reshape(10, 100)
+
+        array = receiver.unpack(sender.pack(payload))
+
+        np.testing.assert_array_equal(payload, array)
+        del array
+        sender.free(receiver.release())
+
+
+class ProcessNodeSharedMemoryTests(unittest.TestCase):
+    def test_large_arguments_and_results(self):
+        blocks_before = set(os.listdir('/dev/shm'))
+        payload = os.urandom(2 * 1024 * 1024)
+
+        obs = RememberingObserver()
+        node = ProcessNode(target_func=_reverse, num_threads=1, shared_memory_threshold=1024)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.notify(payload)
+        node.notify(bytearray(payload))
+        node.notify(b'small')
+        node.worker.stop()
+
+        self.assertEqual([payload[::-1], payload[::-1], b'llams'], [bytes(x) for x in obs.calls])
+        self.assertIsInstance(obs.calls[1], memoryview)
+        self.assertEqual(set(), node.worker.transport.pending)
+        self.assertEqual(blocks_before, set(os.listdir('/dev/shm')))
+
+    def test_arguments_travel_in_shared_memory(self):
+        node = ProcessNode(target_func=_describe, num_threads=1, shared_memory_threshold=1024)
+        transport = node.worker.transport
+        packed = []
+
+        def pack_call(args, kwargs):
+            result = SharedMemoryTransport.pack_call(transport, args, kwargs)
+            packed.append(result)
+            return result
+
+        transport.pack_call = pack_call
+        node.start()
+        node.notify(b'abcdef' * 1000)
+        node.worker.stop()
+
+        self.assertEqual(1, len(packed))
+        self.assertIsInstance(packed[0][0][0], SharedMemoryHandle)
+
+    def test_dropped_arguments_are_freed(self):
+        blocks_before = set(os.listdir('/dev/shm'))
+        node = ProcessNode(target_func=_reverse, num_threads=1, shared_memory_threshold=10, max_queue_size=1,
+                           overflow_policy=DROP_NEWEST)
+        node.start()
+        try:
+            for _ in range(6):
+                node.notify(b'x' * 1000)
+            node.worker.join()
+
+            # Freed when dropped, not only when the worker stops
+            self.assertGreater(node.worker.queue_stats()['dropped'], 0)
+            self.assertEqual(set(), node.worker.transport.pending)
+            self.assertEqual(blocks_before, set(os.listdir('/dev/shm')))
+        finally:
+            node.worker.stop()
+
+    def test_kwargs(self):
+        obs = RememberingObserver()
+        node = ProcessNode(target_func=_describe, num_threads=1, shared_memory_threshold=1024)
+        node.output_port.register_observer(obs)
+        node.start()
+
+        node.passive_input_ports['suffix'].notify(b'x' * 2048)
+        node.notify(b'abcdef' * 1000)
+        node.worker.stop()
+
+        self.assertEqual([('bytes', 6000, b'abc' + b'x' * 2048)], obs.calls)
+        self.assertEqual(set(), node.worker.transport.pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
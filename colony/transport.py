@@ -0,0 +1,196 @@
+'''
+Passing large payloads between processes through shared memory.
+
+Rather than pickling a large payload onto a multiprocessing queue, the sender
+copies it into a multiprocessing.shared_memory block and sends a small
+SharedMemoryHandle in its place. The receiver maps the same block.
+
+Lifetimes are managed explicitly: the sender of an argument frees its block
+once the receiver acknowledges that it has finished with it, and the receiver
+of a result frees its block after copying the result out.
+
+'''
+
+import os
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Python 3.13 can open blocks without registering them with the resource tracker
+_SUPPORTS_TRACK = 'track' in shared_memory.SharedMemory.__init__.__code__.co_varnames
+if os.name == 'posix' and not _SUPPORTS_TRACK:
+    from multiprocessing import resource_tracker
+else:
+    resource_tracker = None
+
+BYTES = 'bytes'
+MEMORYVIEW = 'memoryview'
+NDARRAY = 'ndarray'
+
+
+class SharedMemoryHandle(object):
+    """ Refers to a payload that has been copied into a shared memory block """
+
+    def __init__(self, name, size, kind, dtype=None, shape=None):
+        self.name = name
+        self.size = size
+        self.kind = kind
+        self.dtype = dtype
+        self.shape = shape
+
+    def __repr__(self):
+        return '<SharedMemoryHandle name="%s" size=%i kind=%s>' % (self.name, self.size, self.kind)
+
+
+class SharedMemoryTransport(object):
+    """ Moves bytes, bytearray, memoryview and NumPy payloads of at least
+    threshold bytes through shared memory. Smaller payloads, and other types,
+    are left to be pickled as usual.
+
+    memoryview and bytearray arguments are unpacked without copying, as a
+    memoryview of the block, and arrays as an array viewing the block. bytes
+    arguments are copied once into a new bytes object. Results are always
+    copied out of their block, because the graph keeps hold of them.
+    """
+
+    def __init__(self, threshold=1024 * 1024):
+        self.threshold = threshold
+
+        # Names of blocks this side created, and are waiting to be released
+        self.pending = set()
+        # Blocks this side has mapped for the duration of a call
+        self.attached = []
+
+    def pack(self, value):
+        """ Copy value into a shared memory block if it is large enough, returning its handle """
+        handle = self.pack_result(value)
+        if isinstance(handle, SharedMemoryHandle):
+            self.pending.add(handle.name)
+        return handle
+
+    def pack_result(self, value):
+        """ As pack, but ownership of the block passes to the receiver, which frees it in unpack_result """
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            kind = BYTES if isinstance(value, bytes) else MEMORYVIEW
+            view = memoryview(value)
+            if not view.c_contiguous:
+                view = memoryview(view.tobytes())
+            view = view.cast('B')
+            if view.nbytes < self.threshold:
+                return value
+            handle = SharedMemoryHandle(None, view.nbytes, kind)
+        elif np is not None and isinstance(value, np.ndarray) and not value.dtype.hasobject:
+            if value.nbytes < self.threshold:
+                return value
+            value = np.ascontiguousarray(value)
+            view = memoryview(value.reshape(-1).view(np.uint8))
+            handle = SharedMemoryHandle(None, value.nbytes, NDARRAY, dtype=value.dtype.str, shape=value.shape)
+        else:
+            return value
+
+        block = _open_block(size=max(handle.size, 1))
+        block.buf[:handle.size] = view
+        handle.name = block.name
+        block.close()
+        return handle
+
+    def pack_call(self, args, kwargs):
+        return tuple(self.pack(x) for x in args), {k: self.pack(v) for k, v in kwargs.items()}
+
+    def unpack(self, value):
+        """ Map the block behind a handle, returning a view of the payload """
+        if not isinstance(value, SharedMemoryHandle):
+            return value
+
+        block = _open_block(value.name)
+        self.attached.append(block)
+        view = block.buf[:value.size]
+        if value.kind == BYTES:
+            return view.tobytes()
+        elif value.kind == NDARRAY:
+            return np.frombuffer(view, dtype=value.dtype).reshape(value.shape)
+        else:
+            return view
+
+    def unpack_call(self, args, kwargs):
+        return tuple(self.unpack(x) for x in args), {k: self.unpack(v) for k, v in kwargs.items()}
+
+    def unpack_result(self, value):
+        """ Copy a result out of its block, and free the block """
+        if not isinstance(value, SharedMemoryHandle):
+            return value
+
+        view = self.unpack(value)
+        if value.kind == NDARRAY:
+            result = view.copy()
+        elif value.kind == MEMORYVIEW:
+            result = memoryview(bytearray(view))
+        else:
+            result = view
+        del view
+
+        block = self.attached.pop()
+        try:
+            block.close()
+        finally:
+            _unlink_block(block)
+        return result
+
+    def release(self):
+        """ Unmap the blocks attached since the last release, returning their names for acknowledgement """
+        names = []
+        still_attached = []
+        for block in self.attached:
+            names.append(block.name)
+            try:
+                block.close()
+            except BufferError:
+                # The target kept a reference to the payload, so close it later
+                still_attached.append(block)
+        self.attached = still_attached
+        return names
+
+    def free(self, names):
+        """ Destroy blocks that the receiver has acknowledged """
+        for name in names:
+            if name in self.pending:
+                self.pending.discard(name)
+                _unlink_name(name)
+
+    def free_value(self, value):
+        if isinstance(value, SharedMemoryHandle):
+            self.free((value.name,))
+
+    def free_all(self):
+        self.free(list(self.pending))
+
+
+def _open_block(name=None, size=0):
+    if _SUPPORTS_TRACK:
+        return shared_memory.SharedMemory(name=name, create=name is None, size=size, track=False)
+
+    block = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+    if resource_tracker is not None:
+        # The transport manages lifetimes, so stop the resource tracker
+        # destroying the block when this process exits
+        resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+def _unlink_block(block):
+    if resource_tracker is not None:
+        # unlink unregisters the block, so balance the earlier unregister
+        resource_tracker.register(block._name, 'shared_memory')
+    block.unlink()
+
+
+def _unlink_name(name):
+    try:
+        block = _open_block(name)
+    except FileNotFoundError:
+        return
+    block.close()
+    _unlink_block(block)
@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    """ A thread safe cache holding at most max_size items.
+
+    The least recently used item is evicted to make room. If ttl is set, items
+    expire that many seconds after they were stored.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.lock = Lock()
+        self.items = OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        """ Returns (True, value) if key is cached, otherwise (False, None) """
+        with self.lock:
+            try:
+                value, expires_at = self.items[key]
+            except KeyError:
+                self.num_misses += 1
+                return False, None
+
+            if expires_at is not None and expires_at <= time.time():
+                del self.items[key]
+                self.num_misses += 1
+                return False, None
+
+            self.items.move_to_end(key)
+            self.num_hits += 1
+            return True, value
+
+    def put(self, key, value):
+        expires_at = None if self.ttl is None else time.time() + self.ttl
+        with self.lock:
+            self.items[key] = (value, expires_at)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+                self.num_evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self.items),
+                'hits': self.num_hits,
+                'misses': self.num_misses,
+                'evictions': self.num_evictions,
+            }
+
+
+def make_key(args, kwargs):
+    """ A hashable key for a call, or None if an argument is unhashable """
+    key = (args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
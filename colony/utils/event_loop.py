@@ -0,0 +1,39 @@
+import asyncio
+from threading import Thread
+
+
+class EventLoopThread(object):
+    """ An asyncio event loop running forever on its own thread """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+
+    @property
+    def is_running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.is_running:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.is_running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+
+    def submit(self, coro):
+        """ Schedule coro on the loop from any thread, returning a concurrent.futures.Future """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
@@ -0,0 +1,63 @@
+from collections import deque
+from queue import Queue
+
+
+class LaneQueue(Queue):
+    """ A queue.Queue with num_lanes priority lanes. Lane 0 is served first.
+
+    lane_of(item) gives the lane an item is put in; by default items are
+    (lane, ...) tuples. Lane None is a final lane, served only when every
+    other lane is empty, e.g. for shutdown signals that must follow the work
+    already queued. Lanes out of range are clamped to the first or last lane.
+
+    To stop busy higher lanes starving the lower ones, a non-empty lane that
+    has been passed over starvation_limit times in a row is served next.
+    Within a lane, items are served in the order they were put.
+    """
+
+    def __init__(self, maxsize=0, num_lanes=2, starvation_limit=10, lane_of=None):
+        if num_lanes < 1:
+            raise ValueError('num_lanes must be at least 1')
+        self.num_lanes = num_lanes
+        self.starvation_limit = starvation_limit
+        self.lane_of = lane_of or _first
+        super(LaneQueue, self).__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.lanes = [deque() for _ in range(self.num_lanes)]
+        self.final_lane = deque()
+        self.num_skipped = [0] * self.num_lanes
+
+    def _qsize(self):
+        return sum(len(lane) for lane in self.lanes) + len(self.final_lane)
+
+    def _put(self, item):
+        lane = self.lane_of(item)
+        if lane is None:
+            self.final_lane.append(item)
+        else:
+            self.lanes[min(max(lane, 0), self.num_lanes - 1)].append(item)
+
+    def _get(self):
+        ready = [i for i, lane in enumerate(self.lanes) if lane]
+        if not ready:
+            return self.final_lane.popleft()
+
+        chosen = ready[0]
+        for i in ready[1:]:
+            if self.num_skipped[i] >= self.starvation_limit:
+                chosen = i
+                break
+
+        for i in ready:
+            self.num_skipped[i] = 0 if i == chosen else self.num_skipped[i] + 1
+        return self.lanes[chosen].popleft()
+
+    def lane_sizes(self):
+        """ The number of items waiting in each lane, excluding the final lane """
+        with self.mutex:
+            return [len(lane) for lane in self.lanes]
+
+
+def _first(item):
+    return item[0]
@@ -0,0 +1,38 @@
+import asyncio
+import random
+import string
+
+from colony.node import Graph
+from colony.utils.timer import Timer
+
+
+async def download_data(seed, n=10000):
+    """Dummy Downloading Coroutine"""
+    random.seed(seed)
+    await asyncio.sleep(.1)
+    result = ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(n))
+    return seed, result
+
+
+def save_data(arg):
+    """Dummy Save Data Function"""
+    seed, data = arg
+    print('Saving seed %s, data=%s...' % (seed, data[:10]))
+
+
+if __name__ == '__main__':
+
+    col = Graph()
+
+    # One event loop thread handles all of the concurrent downloads
+    download_node = col.add_asyncio_node(target_func=download_data, max_concurrency=1000)
+    saving_node = col.add_thread_node(target_func=save_data, num_threads=1, node_args=download_node)
+
+    col.start()
+
+    with Timer('downloading'):
+        download_node.notify_items(range(1000))
+
+        col.stop()
+
+    print('Finished')
@@ -0,0 +1,65 @@
+import time
+from multiprocessing import Event, Process
+
+from colony.node import Graph
+
+# On separate machines, use each host's own address
+TRAINING_ADDRESS = ('127.0.0.1', 9700)
+RESULTS_ADDRESS = ('127.0.0.1', 9701)
+
+# Messages are sent as JSON, so the (seed, values) tuples arrive as lists.
+# Pass serializer='pickle' to the remote sources and sinks to send any
+# picklable value, but only if every host that can connect is trusted
+
+
+def generate_data(seed):
+    """Dummy data generation, run on the main host"""
+    return seed, [seed * i for i in range(1000)]
+
+
+def train_model(data):
+    """Dummy CPU-heavy training, run on the training host"""
+    seed, values = data
+    fitted = sum(v * v for v in values for _ in range(100))
+    return seed, fitted
+
+
+def save_model(result):
+    seed, fitted = result
+    print('Saving model %s: %s' % (seed, fitted))
+
+
+def run_training_host(stop_event):
+    """ The training subgraph, receiving data from the main host and sending back fitted models """
+    col = Graph(name='training')
+    data = col.add_remote_source(TRAINING_ADDRESS)
+    train = col.add_process_node(target_func=train_model, node_args=data, num_threads=4)
+    col.add_remote_sink(train, RESULTS_ADDRESS)
+    col.start()
+
+    stop_event.wait()
+    col.stop()
+
+
+if __name__ == '__main__':
+
+    # Here the training host is another process, on loopback
+    stop_event = Event()
+    training_host = Process(target=run_training_host, args=(stop_event, ))
+    training_host.start()
+
+    col = Graph(name='main')
+    data = col.add_node(target_func=generate_data)
+    col.add_remote_sink(data, TRAINING_ADDRESS)
+    results = col.add_remote_source(RESULTS_ADDRESS)
+    save = col.add_node(target_func=save_model, node_args=results)
+    col.start()
+
+    # The sink reconnects until the training host is listening
+    data.notify_items(range(10))
+    while save.stats()['calls'] < 10:
+        time.sleep(0.1)
+
+    stop_event.set()
+    training_host.join()
+    col.stop()
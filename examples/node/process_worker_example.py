@@ -1,8 +1,6 @@
-from colony.node import Graph, Node, AsyncWorker
+from colony.node import Graph, Node, ProcessWorker
 from colony.observer import RememberingObserver
 import time
-from multiprocessing import Process
-from threading import Thread
 
 
 def _x_squared(x):
@@ -15,8 +13,7 @@ if __name__ == '__main__':
     col = Graph()
 
     node = col.add(Node,
-                   node_worker_class=AsyncWorker,
-                   node_worker_class_args = (Process,),
+                   node_worker_class=ProcessWorker,
                    target_func=_x_squared, )
     node.output_port.register_observer(obs)
     node.start()